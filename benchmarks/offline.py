@@ -0,0 +1,44 @@
+"""
+Permite importar os módulos do GEEDaR sem acesso ao Earth Engine.
+
+Os benchmarks medem somente as partes do pipeline executadas localmente
+(no cliente), portanto o pacote 'ee' é substituído por um objeto inerte
+antes da importação de 'utils' e 'geedar'. Nenhuma chamada ao servidor é
+feita.
+"""
+import os
+import sys
+import types
+
+PACKAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "geedar_lib")
+
+
+# Inert object: any attribute access or call returns another inert object.
+class _Inert:
+    def __init__(self, name = "ee"):
+        self._name = name
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return _Inert(self._name + "." + name)
+
+    def __call__(self, *args, **kwargs):
+        return _Inert(self._name + "()")
+
+    def __repr__(self):
+        return "<offline " + self._name + ">"
+
+
+class _OfflineEE(types.ModuleType):
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return _Inert("ee." + name)
+
+
+# Install the offline 'ee' stand-in and make the GEEDaR modules importable.
+def installOfflineEE():
+    sys.modules["ee"] = _OfflineEE("ee")
+    if PACKAGE_DIR not in sys.path:
+        sys.path.insert(0, PACKAGE_DIR)
@@ -0,0 +1,186 @@
+"""
+Microbenchmarks das partes do GEEDaR executadas no cliente.
+
+Cada caso é medido para tamanhos de entrada crescentes e o expoente de
+escala (inclinação de log(tempo) x log(tamanho)) é estimado, de forma que
+trechos que passem a crescer de forma quadrática sejam detectados.
+
+Uso:
+    python benchmarks/run.py [--quick] [--repeat N] [--only CASO ...]
+                             [--json ARQUIVO] [--max-exponent X]
+"""
+import os
+import sys
+import json
+import math
+import argparse
+import tempfile
+from time import perf_counter
+
+from offline import installOfflineEE
+
+installOfflineEE()
+
+import pandas as pd
+
+import utils
+import geedar
+import kmlreader
+
+# Keep the parsed-polygon cache of the benchmarks out of the user's cache.
+kmlreader.KML_CACHE_DIR = tempfile.mkdtemp(prefix="geedar_bench_cache_")
+
+
+# unfoldProcessingCode with thousands of codes.
+def setupUnfoldProcessingCode(n):
+    baseCodes = [10110001, 10210001, 30109001, 30209001, 30309001, 20109001]
+    codes = "[" + ", ".join(str(baseCodes[i % len(baseCodes)]) for i in range(n)) + "]"
+    return lambda: utils.unfoldProcessingCode(codes)
+
+
+# toSpecificDatesDF with a date range of 'n' days for each of ten sites.
+def setupToSpecificDatesDF(n):
+    endDate = (pd.Timestamp("2001-01-01") + pd.Timedelta(n - 1, "day")).strftime("%Y-%m-%d")
+    inputDF = pd.DataFrame({
+        "id": ["site_" + str(i) for i in range(10)],
+        "start_date": ["2001-01-01"] * 10,
+        "end_date": [endDate] * 10
+        })
+    return lambda: geedar.toSpecificDatesDF(inputDF)
+
+
+# Time window expansion (2 days before and after) of 'n' input rows.
+def setupExpandTimeWindow(n):
+    inputDF = pd.DataFrame({
+        "date": [(pd.Timestamp("2020-01-01") + pd.Timedelta(i, "day")).date() for i in range(n)],
+        "id": ["site_" + str(i % 20) for i in range(n)]
+        })
+    validRows = [*range(n)]
+    return lambda: geedar.expandTimeWindow(inputDF, validRows, 0, 2)
+
+
+# Assembly of the result frame from synthetic 'reduction()' output: one site,
+# 'n' dates, two processing codes.
+def setupResultAssembly(n):
+    dates = [(pd.Timestamp("2020-01-01") + pd.Timedelta(i, "day")).strftime("%Y-%m-%d") for i in range(n)]
+    template = pd.DataFrame({"date": dates, "id": ["site"] * n})
+    bandNames = ["sur_refl_b0" + str(i) for i in range(1, 8)]
+    result = {d: {**{b + "_median": 0.1 for b in bandNames},
+                  "img_time": "10:30", "n_selected_pixels": 10, "qual_flag": 1}
+              for d in dates}
+    dayRows = geedar.groupRows(geedar.toDayNumbers(template["date"]), [*range(n)])
+
+    def run():
+        resultDFs_dictio = {}
+        for code in [10110001, 10210001]:
+            resultDFs_dictio[code] = geedar.ResultBuffer(n)
+            geedar.storeResult(resultDFs_dictio[code], result, dayRows,
+                               str(code) + "_")
+        return geedar.consolidateResults(resultDFs_dictio, template.copy())
+    return run
+
+
+# polygonFromKML on a polygon with 'n' vertices (parsing, without the cache).
+def setupPolygonFromKML(n, cache = False):
+    coords = " ".join(
+        str(-45 + 0.1 * math.cos(2 * math.pi * i / n)) + ","
+        + str(-15 + 0.1 * math.sin(2 * math.pi * i / n)) + ",0" for i in range(n))
+    kmlText = ('<?xml version="1.0" encoding="UTF-8"?>'
+        '<kml xmlns="http://www.opengis.net/kml/2.2"><Document><Placemark>'
+        '<name>site</name><Polygon><outerBoundaryIs><LinearRing><coordinates>'
+        + coords +
+        '</coordinates></LinearRing></outerBoundaryIs></Polygon></Placemark></Document></kml>')
+    kmlFile = os.path.join(tempfile.mkdtemp(prefix="geedar_bench_"), "site.kml")
+    with open(kmlFile, "w", encoding="utf-8") as f:
+        f.write(kmlText)
+    if cache:
+        utils.polygonFromKML(kmlFile)
+    return lambda: utils.polygonFromKML(kmlFile, cache = cache)
+
+
+# polygonFromKML on a polygon with 'n' vertices, read from the warm cache.
+def setupPolygonFromKMLCached(n):
+    return setupPolygonFromKML(n, cache = True)
+
+
+# getSpectralBands called 'n' times over all products.
+def setupGetSpectralBands(n):
+    products = utils.AVAILABLE_PRODUCTS
+    return lambda: [geedar.getSpectralBands(products[i % len(products)]) for i in range(n)]
+
+
+# Benchmark cases: name -> (setup function, input sizes, quick input sizes).
+CASES = {
+    "unfoldProcessingCode": (setupUnfoldProcessingCode, [1000, 2000, 4000, 8000], [500, 1000]),
+    "toSpecificDatesDF": (setupToSpecificDatesDF, [1000, 2000, 4000, 8000], [500, 1000]),
+    "expandTimeWindow": (setupExpandTimeWindow, [100, 200, 400, 800], [50, 100]),
+    "resultAssembly": (setupResultAssembly, [50, 100, 200, 400], [25, 50]),
+    "polygonFromKML": (setupPolygonFromKML, [1000, 4000, 16000, 64000], [500, 1000]),
+    "polygonFromKML (cached)": (setupPolygonFromKMLCached, [1000, 4000, 16000, 64000], [500, 1000]),
+    "getSpectralBands": (setupGetSpectralBands, [1000, 4000, 16000, 64000], [500, 1000])
+}
+
+
+# Best-of-'repeat' execution time of a callable.
+def timeit(fn, repeat):
+    best = math.inf
+    for _ in range(repeat):
+        start = perf_counter()
+        fn()
+        best = min(best, perf_counter() - start)
+    return best
+
+
+# Least-squares slope of log(time) against log(size).
+def scalingExponent(sizes, times):
+    xs = [math.log(s) for s in sizes]
+    ys = [math.log(max(t, 1e-9)) for t in times]
+    xMean = sum(xs) / len(xs)
+    yMean = sum(ys) / len(ys)
+    den = sum((x - xMean) ** 2 for x in xs)
+    if den == 0:
+        return math.nan
+    return sum((x - xMean) * (y - yMean) for x, y in zip(xs, ys)) / den
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="GEEDaR client-side microbenchmarks.")
+    parser.add_argument("--quick", action="store_true", help="use small input sizes")
+    parser.add_argument("--repeat", type=int, default=3, help="repetitions per size (best time is kept)")
+    parser.add_argument("--only", nargs="*", default=None, help="cases to run")
+    parser.add_argument("--json", default="", help="save the results to a JSON file")
+    parser.add_argument("--max-exponent", type=float, default=None,
+                        help="fail if any scaling exponent exceeds this value")
+    args = parser.parse_args(argv)
+
+    results = {}
+    failed = []
+    for name, (setup, sizes, quickSizes) in CASES.items():
+        if args.only and name not in args.only:
+            continue
+        if args.quick:
+            sizes = quickSizes
+        times = []
+        print(name)
+        for n in sizes:
+            t = timeit(setup(n), args.repeat)
+            times.append(t)
+            print("  n = {:>7}  {:>10.4f} s  {:>10.2f} us/item".format(n, t, t / n * 1e6))
+        exponent = scalingExponent(sizes, times)
+        print("  scaling exponent: {:.2f}".format(exponent))
+        results[name] = {"sizes": sizes, "seconds": times, "exponent": exponent}
+        if args.max_exponent is not None and exponent > args.max_exponent:
+            failed.append(name)
+
+    if args.json != "":
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if failed:
+        print("(!) Scaling exponent above " + str(args.max_exponent) + ": " + ", ".join(failed))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+
+from server import SERVER_WORKERS, makeWorkerPool, retrieveSiteCode
+
+logger = logging.getLogger("geedar")
+
+
+# Available dates of a product at a site (run in a worker process).
+def availableDates(site:dict, productID:int, dates:list, aoi_mode:str = "radius",
+                   aoi_radius:int = 1000, input_dir:str = "") -> list:
+    """
+    Executa 'getAvailableDates' em um processo de trabalho, com a área de
+    interesse do local (ver 'siteGeometry').
+    """
+    import geedar
+    geedar.aoi = geedar.siteGeometry(site, aoi_mode, aoi_radius, input_dir)
+    return geedar.getAvailableDates(productID, dates)
+
+
+# Full retrieval of an input data frame (run in a worker process).
+def retrieveInput(inputDF, time_window:int = 0, kwargs:dict = None):
+    """
+    Executa 'specificDatesRetrieval' em um processo de trabalho, com
+    'inputDF' como entrada e os demais argumentos em 'kwargs'.
+    """
+    import geedar
+    geedar.input_df = inputDF
+    geedar.time_window = time_window
+    return geedar.specificDatesRetrieval(**(kwargs or {}))
+
+
+# Asyncio interface to the retrieval, run in worker processes.
+class AsyncRetriever:
+    """
+    Versões 'async' da consulta de datas disponíveis, da recuperação de um
+    local e código de processamento e da recuperação completa. As chamadas
+    (bloqueantes) ao Earth Engine são executadas em processos de trabalho
+    (como no serviço, ver 'RetrievalService'), de modo que o laço de eventos
+    não é bloqueado e várias recuperações podem ser reunidas com
+    'asyncio.gather'. No máximo 'max_running' chamadas são executadas ao
+    mesmo tempo; as demais aguardam sem ocupar o pool. Cancelar uma chamada
+    que aguarda a libera imediatamente; uma chamada já em execução termina
+    no seu processo e o resultado é descartado.
+
+    Args:
+        workers: Número de processos de trabalho.
+        executor: Executor alternativo (por exemplo, um 'ThreadPoolExecutor'
+            em testes). Se 'None', usa um pool de processos.
+        max_running: Número máximo de chamadas simultâneas. Se 'None', igual
+            a 'workers'.
+        retrieve: Função da recuperação completa (ver 'retrieveInput').
+        qps: Requisições por segundo ao Earth Engine, divididas entre os
+            processos. Se 'None', usa o padrão de cada processo.
+        concurrency: Requisições simultâneas, divididas entre os processos.
+
+    Examples:
+        >>> async def main(entradas):
+        ...     async with AsyncRetriever(workers=4) as retriever:
+        ...         return await asyncio.gather(*[
+        ...             retriever.retrieve(df, running_mode=1, aoi_mode="radius")
+        ...             for df in entradas])
+    """
+    def __init__(self, workers:int = SERVER_WORKERS, executor = None,
+                 max_running:int = None, retrieve = retrieveInput,
+                 qps:float = None, concurrency:int = None):
+        if executor is None:
+            executor = makeWorkerPool(workers, qps, concurrency, configure_logging=False)
+        self.executor = executor
+        self.max_running = max_running if max_running is not None else workers
+        self.retrieve_fn = retrieve
+        self._slots = None
+
+    async def _run(self, fn, *args):
+        # The semaphore is created in the running loop (Python 3.9 binds it
+        # to the loop at creation).
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_running)
+        async with self._slots:
+            return await asyncio.wrap_future(self.executor.submit(fn, *args))
+
+    async def availableDates(self, site:dict, productID:int, dates:list,
+                             aoi_mode:str = "radius", aoi_radius:int = 1000,
+                             input_dir:str = "") -> list:
+        """
+        Datas ('yyyy-mm-dd'), entre as informadas, com imagens do produto
+        sobre a área de interesse do local (argumentos como em 'reduceSite').
+        """
+        return await self._run(availableDates, site, productID, dates,
+                               aoi_mode, aoi_radius, input_dir)
+
+    async def reduceSite(self, site:dict, processingCode:int, dates:list,
+                         aoi_mode:str = "radius", aoi_radius:int = 1000,
+                         input_dir:str = "") -> dict:
+        """
+        Processa e reduz as imagens de um local para um código de
+        processamento (ver 'retrieveSiteCode').
+
+        Returns:
+            Dicionário {data: {variável: valor}}.
+        """
+        return await self._run(retrieveSiteCode, site, processingCode, dates,
+                               aoi_mode, aoi_radius, input_dir)
+
+    async def retrieve(self, input_df, time_window:int = 0, **kwargs):
+        """
+        Recuperação completa ('specificDatesRetrieval', com os mesmos
+        argumentos) de 'input_df'. Argumentos que não podem ser enviados a
+        outro processo (como 'result_sink') não são aceitos.
+        """
+        return await self._run(self.retrieve_fn, input_df, time_window, kwargs)
+
+    async def shutdown(self):
+        """
+        Cancela as chamadas que ainda não começaram e encerra o executor, sem
+        bloquear o laço de eventos.
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            None, lambda: self.executor.shutdown(wait=True, cancel_futures=True))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.shutdown()
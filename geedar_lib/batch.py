@@ -0,0 +1,195 @@
+import uuid
+import logging
+import itertools
+from time import sleep
+from concurrent.futures import ThreadPoolExecutor
+
+import ee
+
+from diagnostics import tracedGetInfo
+from metrics import incrementCounter, setGauge
+
+logger = logging.getLogger("geedar")
+
+# Default number of export tasks running at the same time.
+MAX_CONCURRENT_TASKS = 10
+
+# Default interval (seconds) between two checks of the task states.
+TASK_POLL_INTERVAL = 30
+
+# Number of features read per request when downloading an exported table.
+EXPORT_PAGE_SIZE = 5000
+
+# Task states after which a task will not change anymore.
+TERMINAL_STATES = ["COMPLETED", "FAILED", "CANCELLED"]
+
+
+# Earth Engine export tasks, writing to table assets.
+class EETaskService:
+    """
+    Executa as exportações como tarefas do Earth Engine
+    ('ee.batch.Export.table.toAsset') e lê as tabelas resultantes, que são
+    apagadas depois da leitura (a menos que 'delete_assets' seja falso). Os
+    nomes das tabelas incluem um identificador da execução ('run_id'), de
+    modo que execuções simultâneas (por exemplo, de partições diferentes) ou
+    repetidas (com tabelas que não foram apagadas) não usam o mesmo asset.
+
+    Args:
+        asset_root: Pasta (ou projeto) de assets onde as tabelas são criadas,
+            por exemplo 'projects/meu-projeto/assets/geedar'.
+        delete_assets: Se as tabelas devem ser apagadas após a leitura.
+        run_id: Identificador da execução. Se 'None', um aleatório.
+    """
+    def __init__(self, asset_root:str, delete_assets:bool = True, run_id:str = None):
+        if asset_root == "":
+            raise Exception("An asset folder is required to run export tasks.")
+        self.asset_root = asset_root.rstrip("/")
+        self.delete_assets = delete_assets
+        self.run_id = run_id if run_id is not None else uuid.uuid4().hex[:12]
+        self._tasks = {}
+
+    def submit(self, collection:ee.FeatureCollection, description:str) -> str:
+        assetId = self.asset_root + "/" + description + "_" + self.run_id
+        task = ee.batch.Export.table.toAsset(
+            collection=collection, description=description, assetId=assetId)
+        task.start()
+        self._tasks[task.id] = (task, assetId)
+        return task.id
+
+    def status(self, task_id:str) -> dict:
+        return self._tasks[task_id][0].status()
+
+    def download(self, task_id:str) -> list:
+        assetId = self._tasks[task_id][1]
+        table = ee.FeatureCollection(assetId)
+        rows = []
+        for offset in itertools.count(0, EXPORT_PAGE_SIZE):
+            features = tracedGetInfo(table.toList(EXPORT_PAGE_SIZE, offset),
+                                     "batch.download", task_id=task_id, offset=offset)
+            rows.extend(f["properties"] for f in features)
+            if len(features) < EXPORT_PAGE_SIZE:
+                break
+        if self.delete_assets:
+            try:
+                ee.data.deleteAsset(assetId)
+            except Exception as e:
+                logger.warning("(!) Could not delete the asset '" + assetId + "': " + str(e))
+        return rows
+
+
+# Local stand-in for the Earth Engine task service.
+class LocalTaskService:
+    """
+    Serviço de tarefas local, com a mesma interface de 'EETaskService', em que
+    cada tarefa é executada em uma thread pela função 'runner', que recebe a
+    coleção submetida e retorna a lista de linhas (dicionários) da tabela.
+    Usado em testes e em execuções sem acesso ao Earth Engine.
+    """
+    def __init__(self, runner, workers:int = 2):
+        self.runner = runner
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix="geedar-task")
+        self._futures = {}
+        self._ids = itertools.count(1)
+
+    def submit(self, collection, description:str) -> str:
+        taskID = "LOCAL_" + str(next(self._ids)) + "_" + description
+        self._futures[taskID] = self._executor.submit(self.runner, collection)
+        return taskID
+
+    def status(self, task_id:str) -> dict:
+        future = self._futures[task_id]
+        if future.running():
+            return {"id": task_id, "state": "RUNNING"}
+        if not future.done():
+            return {"id": task_id, "state": "READY"}
+        if future.cancelled():
+            return {"id": task_id, "state": "CANCELLED"}
+        if future.exception() is not None:
+            return {"id": task_id, "state": "FAILED",
+                    "error_message": str(future.exception())}
+        return {"id": task_id, "state": "COMPLETED"}
+
+    def download(self, task_id:str) -> list:
+        return list(self._futures[task_id].result())
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+# Run export jobs with bounded concurrency and collect their tables.
+def runTasks(service, jobs:list, max_concurrent:int = MAX_CONCURRENT_TASKS,
+             poll_interval:float = TASK_POLL_INTERVAL, on_done = None) -> dict:
+    """
+    Submete as exportações a um serviço de tarefas, mantendo no máximo
+    'max_concurrent' tarefas em execução, acompanha seus estados e lê as
+    tabelas das tarefas concluídas.
+
+    Args:
+        service: Serviço de tarefas ('EETaskService' ou 'LocalTaskService').
+        jobs: Lista de tuplas (chave, coleção, descrição).
+        max_concurrent: Número máximo de tarefas simultâneas.
+        poll_interval: Intervalo, em segundos, entre as verificações.
+        on_done: Função chamada com a chave de cada tarefa assim que ela
+            termina (com sucesso ou não).
+
+    Returns:
+        Dicionário {chave: linhas da tabela}, com 'None' para as tarefas que
+        falharam.
+    """
+    pending = list(jobs)
+    active = {}
+    results = {}
+
+    while pending or active:
+        while pending and len(active) < max_concurrent:
+            key, collection, description = pending.pop(0)
+            try:
+                taskID = service.submit(collection, description)
+            except Exception as e:
+                logger.warning("(!) Failed to submit the task '" + description + "': " + str(e))
+                incrementCounter("failures", caller="runTasks")
+                results[key] = None
+                if on_done is not None:
+                    on_done(key)
+                continue
+            incrementCounter("tasks", state="SUBMITTED")
+            logger.info("Task '" + description + "' submitted (" + taskID + ").")
+            active[taskID] = (key, description)
+        setGauge("batch_tasks_active", len(active))
+        setGauge("batch_tasks_pending", len(pending))
+
+        finished = []
+        for taskID, (key, description) in active.items():
+            status = service.status(taskID)
+            state = status.get("state", "")
+            if not state in TERMINAL_STATES:
+                continue
+            finished.append(taskID)
+            incrementCounter("tasks", state=state)
+            if state == "COMPLETED":
+                try:
+                    results[key] = service.download(taskID)
+                    logger.info("Task '" + description + "' completed: "
+                                + str(len(results[key])) + " rows.")
+                except Exception as e:
+                    logger.warning("(!) Failed to download the table of the task '"
+                                   + description + "': " + str(e))
+                    incrementCounter("failures", caller="runTasks")
+                    results[key] = None
+            else:
+                logger.warning("(!) Task '" + description + "' " + state.lower() + ": "
+                               + str(status.get("error_message", "")))
+                incrementCounter("failures", caller="runTasks")
+                results[key] = None
+            if on_done is not None:
+                on_done(key)
+        for taskID in finished:
+            active.pop(taskID)
+
+        if active and finished == []:
+            sleep(poll_interval)
+
+    setGauge("batch_tasks_active", 0)
+    setGauge("batch_tasks_pending", 0)
+    return results
@@ -0,0 +1,220 @@
+import numpy as np
+import pandas as pd
+
+# Type of the result columns by statistic suffix (see 'REDUCTION_SPECS').
+## Reduced values are kept in float64, so that the written values are the
+## ones returned by the server, unless the buffer is created with
+## 'float_dtype="float32"' (half the memory, about 7 significant digits).
+STAT_DTYPES = {
+    "median": "float64",
+    "mean": "float64",
+    "stdDev": "float64",
+    "min": "float64",
+    "max": "float64",
+    "sum": "float64",
+    "count": "int32"
+}
+
+# Type of the result columns by variable name (image properties).
+VAR_DTYPES = {
+    "qual_flag": "int8",
+    "n_selected_pixels": "int32"
+}
+
+
+# Type of a result column, from its name and its first value.
+def columnDtype(column:str, value, float_dtype:str = "float64") -> str:
+    """
+    Retorna o tipo (NumPy) de uma coluna de resultados: 'int8' para
+    'qual_flag', 'int32' para contagens ('count'), 'object' para textos e
+    'float_dtype' para as estatísticas reduzidas (por exemplo,
+    'sur_refl_b01_median') e nos demais casos. O nome pode incluir o
+    prefixo do código de processamento.
+
+    Examples:
+        >>> columnDtype("10110001_qual_flag", 2), columnDtype("chla_surf_mean", 3.5)
+        ('int8', 'float64')
+        >>> columnDtype("sur_refl_b01_count", 12)
+        'int32'
+        >>> columnDtype("img_time", "10:30"), columnDtype("SolarZenith", 31.2)
+        ('object', 'float64')
+        >>> columnDtype("chla_surf_mean", 3.5, "float32")
+        'float32'
+    """
+    if isinstance(value, str):
+        return "object"
+    for name, dtype in VAR_DTYPES.items():
+        if column == name or column.endswith("_" + name):
+            return dtype
+    suffix = column.rsplit("_", 1)[-1]
+    dtype = STAT_DTYPES.get(suffix, "float64")
+    return float_dtype if dtype == "float64" else dtype
+
+
+# Typed, preallocated columns of the results of a processing code.
+class ResultBuffer:
+    """
+    Colunas de resultados de um código de processamento, cada uma alocada
+    uma única vez (com 'nrows' linhas e o tipo de 'columnDtype') quando
+    recebe o primeiro valor. Colunas inteiras guardam uma máscara dos valores
+    ausentes. O data frame é construído somente no final ('toDataFrame').
+    Valores que não cabem no tipo da coluna a convertem para 'float64' ou
+    'object'.
+
+    Args:
+        nrows: Número de linhas do resultado.
+        float_dtype: Tipo das colunas de estatísticas e variáveis estimadas:
+            'float64' (padrão, os valores retornados pelo servidor) ou
+            'float32' (metade da memória, com cerca de 7 dígitos
+            significativos).
+
+    Examples:
+        >>> buffer = ResultBuffer(3)
+        >>> buffer.set([0, 2], "qual_flag", 1)
+        >>> buffer.set([1], "red_median", 0.25)
+        >>> buffer.toDataFrame().dtypes.astype(str).tolist()
+        ['Int8', 'float64']
+    """
+    def __init__(self, nrows:int, float_dtype:str = "float64"):
+        if not float_dtype in ["float64", "float32"]:
+            raise Exception("'float_dtype' must be 'float64' or 'float32'.")
+        self.nrows = nrows
+        self.float_dtype = float_dtype
+        self._values = {}
+        self._masks = {}
+
+    @property
+    def columns(self) -> list:
+        return [*self._values]
+
+    def _allocate(self, column:str, dtype:str):
+        if dtype == "object":
+            self._values[column] = np.full(self.nrows, None, dtype=object)
+        elif dtype.startswith("int"):
+            self._values[column] = np.zeros(self.nrows, dtype=dtype)
+            self._masks[column] = np.ones(self.nrows, dtype=bool)
+        else:
+            self._values[column] = np.full(self.nrows, np.nan, dtype=dtype)
+
+    def _promote(self, column:str, dtype:str):
+        values = self._values[column]
+        mask = self._masks.pop(column, None)
+        promoted = values.astype(dtype)
+        if mask is not None:
+            promoted[mask] = None if dtype == "object" else np.nan
+        self._values[column] = promoted
+
+    def set(self, rows:list, column:str, value):
+        """
+        Atribui o valor às linhas 'rows' da coluna, criando-a se necessário.
+        """
+        if not column in self._values:
+            self._allocate(column, columnDtype(column, value, self.float_dtype))
+        values = self._values[column]
+        if value is None:
+            if column in self._masks:
+                self._masks[column][rows] = True
+            else:
+                values[rows] = None if values.dtype == object else np.nan
+            return
+        if values.dtype != object:
+            if not isinstance(value, (int, float)):
+                self._promote(column, "object")
+            elif column in self._masks:
+                info = np.iinfo(values.dtype)
+                if ((isinstance(value, float) and not value.is_integer())
+                    or not info.min <= value <= info.max):
+                    self._promote(column, "float64")
+        values = self._values[column]
+        values[rows] = value
+        if column in self._masks:
+            self._masks[column][rows] = False
+
+    def toDataFrame(self) -> pd.DataFrame:
+        """
+        Constrói o data frame de resultados (inteiros com valores ausentes
+        como tipos 'Int8'/'Int32' do pandas).
+        """
+        data = {}
+        for column, values in self._values.items():
+            if column in self._masks:
+                data[column] = pd.arrays.IntegerArray(values, self._masks[column].copy())
+            else:
+                data[column] = values
+        return pd.DataFrame(data, index=range(self.nrows))
+
+
+# Columns of the long (tidy) result format.
+LONG_COLUMNS = ["site", "date", "processing_code", "variable", "statistic", "value"]
+
+
+# Split a result key into the variable and the statistic (reducer suffix).
+def splitStatistic(key:str, suffixes:list) -> tuple:
+    """
+    Separa o nome de uma variável de resultado no nome da variável e no
+    sufixo do redutor. Propriedades das imagens não têm sufixo.
+
+    Examples:
+        >>> splitStatistic("sur_refl_b01_stdDev", ["mean", "stdDev"])
+        ('sur_refl_b01', 'stdDev')
+        >>> splitStatistic("img_time", ["mean", "stdDev"])
+        ('img_time', '')
+    """
+    for suffix in suffixes:
+        if suffix != "" and key.endswith("_" + suffix):
+            return key[:-len(suffix) - 1], suffix
+    return key, ""
+
+
+# Results in the long format, appended as they arrive.
+class LongResultBuffer:
+    """
+    Resultados no formato longo (uma linha por local, data, código de
+    processamento, variável e estatística), acrescentados à medida que são
+    recuperados. Valores ausentes não são guardados, de modo que a memória é
+    proporcional aos dados efetivamente recuperados.
+
+    Examples:
+        >>> buffer = LongResultBuffer()
+        >>> buffer.append(["site_1"], 10110001, {"2020-01-01": {"sur_refl_b01_median": 0.1,
+        ...               "img_time": "10:30", "qual_flag": None}}, ["median"])
+        >>> buffer.toDataFrame().values.tolist()
+        [['site_1', '2020-01-01', 10110001, 'sur_refl_b01', 'median', 0.1], ['site_1', '2020-01-01', 10110001, 'img_time', '', '10:30']]
+    """
+    def __init__(self):
+        self._columns = {c: [] for c in LONG_COLUMNS}
+
+    def __len__(self) -> int:
+        return len(self._columns["value"])
+
+    def append(self, sites:list, processingCode:int, result:dict, suffixes:list,
+               bandRenaming:list = None):
+        """
+        Acrescenta o resultado {data: {variável: valor}} de um código de
+        processamento a cada um dos locais informados (locais com a mesma
+        área de interesse). 'bandRenaming' tem o mesmo papel que em
+        'storeResult'.
+        """
+        for date, values in result.items():
+            for key, value in values.items():
+                if value is None:
+                    continue
+                variable, statistic = splitStatistic(key, suffixes)
+                variables = [variable]
+                if bandRenaming is not None:
+                    variables = [common for real, common in bandRenaming
+                                 if real == variable] or variables
+                for site in sites:
+                    for v in variables:
+                        self._columns["site"].append(site)
+                        self._columns["date"].append(date)
+                        self._columns["processing_code"].append(processingCode)
+                        self._columns["variable"].append(v)
+                        self._columns["statistic"].append(statistic)
+                        self._columns["value"].append(value)
+
+    def toDataFrame(self) -> pd.DataFrame:
+        """
+        Constrói o data frame de resultados no formato longo.
+        """
+        return pd.DataFrame(self._columns, columns=LONG_COLUMNS)
@@ -1,5 +1,7 @@
 import os
 import sys
+from contextlib import nullcontext
+from typing import List
 from shutil import copyfile
 
 import typer
@@ -9,7 +11,17 @@ from rich.console import Console
 import pandas as pd
 
 from utils import unfoldProcessingCode
+import geedar
 from geedar import specificDatesRetrieval, loadInputDF
+from sharding import parseShard, selectShard, saveEmptyShard, mergeShards
+from planner import formatPlanReport
+from progress import (progressDisplay, startProgressFile, stopProgressFile, 
+                      PROGRESS_INTERVAL)
+from metrics import (stageTimer, exportMetrics, 
+                     startPeriodicExport, stopPeriodicExport)
+from logs import setupLogging, LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT
+from ratelimit import configureRateLimit, DEFAULT_QPS, DEFAULT_CONCURRENCY
+from server import serve as runService, SERVER_HOST, SERVER_PORT, SERVER_WORKERS
 
 app = typer.Typer()
 
@@ -29,9 +41,37 @@ def main(input_path:str,
          aoi_radius:int=1000, 
          append_mode='', 
          time_window:int=2, 
-         processing_code=list[int]):
+         processing_code=list[int],
+         shard:str='',
+         graph_report:str='',
+         simplify_aoi:bool=False,
+         site_order:str='input',
+         execution_mode:str='interactive',
+         asset_root:str='',
+         sites_per_task:int=50,
+         max_tasks:int=10,
+         share_processing:bool=True,
+         fuse_reducers:bool=True,
+         merge_families:bool=False,
+         columns:str='',
+         dry_run:bool=False,
+         output_format:str='wide',
+         single_precision:bool=False,
+         progress:bool=True,
+         progress_file:str='',
+         progress_interval:int=PROGRESS_INTERVAL,
+         max_qps:float=DEFAULT_QPS,
+         max_concurrent_requests:int=DEFAULT_CONCURRENCY,
+         metrics:str='',
+         metrics_interval:int=0,
+         log_level:str='INFO',
+         log_file:str=LOG_FILE,
+         log_max_bytes:int=LOG_MAX_BYTES,
+         log_backups:int=LOG_BACKUP_COUNT):
 
     os.chdir(os.path.realpath(sys.path[0]))
+    logger = setupLogging(level=log_level, log_file=log_file, 
+                          max_bytes=log_max_bytes, backup_count=log_backups)
 
     if running_mode == "":
         if (not input_path[-3:] == ".db") and (not input_path[-4:] == ".csv") and (not input_path[-4:] == ".kml"):
@@ -67,8 +107,9 @@ def main(input_path:str,
     ### Determine the running mode.
     if running_mode == "":
         if (not input_path[-3:] == ".db") and (not input_path[-4:] == ".csv") and (not input_path[-4:] == ".kml"):
-            print("!")
-            raise Exception("For the running mode to be automatically determined, the input file's extension must be '.csv' (running mode 1 or 2), '.kml' (running mode 2) or '.db' (running mode 3).")
+            message = "For the running mode to be automatically determined, the input file's extension must be '.csv' (running mode 1 or 2), '.kml' (running mode 2) or '.db' (running mode 3)."
+            logger.error("(!) " + message)
+            raise Exception(message)
         if input_path[-3:] == ".db":
             running_mode = 3
         else:
@@ -78,21 +119,27 @@ def main(input_path:str,
         try:
             running_mode = int(running_mode)
         except:
-            print("!")
-            raise Exception("Running mode must be an integer. Available modes: ".join(running_modes))
+            message = "Running mode must be an integer. Available modes: ".join(running_modes)
+            logger.error("(!) " + message)
+            raise Exception(message)
 
 
     if running_mode < 3:
         # Confirm the existence of the input file.
         if not os.path.isfile(input_path) and input_file != "*.kml":
-            print("!")
-            raise Exception("File not found: '" + input_path + "'.")
+            message = "File not found: '" + input_path + "'."
+            logger.error("(!) " + message)
+            raise Exception(message)
 
         ## Unfold the processing code into the IDs of the product, the image processing algorithm, estimation algorithm and reducer.
         processing_codes, product_ids, img_proc_algos, estimation_algos, reducers = unfoldProcessingCode(processing_code)
-        print(processing_codes, product_ids, img_proc_algos, estimation_algos, reducers)
+        logger.debug(str((processing_codes, product_ids, img_proc_algos, estimation_algos, reducers)))
         nProcCodes = len(processing_codes)
 
+        ## Shard of the sites processed by this run ('i/N'):
+        if shard != "":
+            shard_i, n_shards = parseShard(shard)
+
         output_path = output
 
         if output_path == "":
@@ -101,6 +148,8 @@ def main(input_path:str,
                 output_file = "kml_result.csv"
             else:
                 output_file = input_file[:-4] + "_result.csv"
+            if shard != "":
+                output_file = output_file[:-4] + ".shard" + str(shard_i) + "of" + str(n_shards) + ".csv"
             output_path = os.path.join(output_dir, output_file)
         else:
             try:
@@ -108,65 +157,174 @@ def main(input_path:str,
                 output_dir = splittedPath[0]
                 output_file = splittedPath[1]
             except:
-                print("!")
-                raise Exception("Unrecognized output file path: '" + output_path + "'.")  
+                message = "Unrecognized output file path: '" + output_path + "'."
+                logger.error("(!) " + message)
+                raise Exception(message)
             if output_dir == "":
                 output_dir = input_dir #"./"
                 output_path = os.path.join(output_dir, output_file)
             elif not os.path.exists(output_dir):
-                print("!")
-                raise Exception("Directory not found: '" + output_dir + "'.")
+                message = "Directory not found: '" + output_dir + "'."
+                logger.error("(!) " + message)
+                raise Exception(message)
+        # The cube output is a directory (see 'CubeWriter').
+        if output_format == "cube" and output_path[-4:] == ".csv":
+            output_path = output_path[:-4] + ".cube"
         # Check for preexisting file:
         if os.path.isfile(output_path):
             copyfile(output_path, output_path + ".bkp")
-            print("(!) Output file already existed, so a backup was created: '" + output_file + ".bkp'.")
+            logger.warning("(!) Output file already existed, so a backup was created: '" + output_file + ".bkp'.")
         
         ## Area of Interest (AOI) method:
-        if aoi_radius != "":
+        aoi_mode = "radius"
+        aoi_dir = input_dir
+        if input_file[-4:] in [".kml", ".kmz"]:
+            aoi_mode = "kml"
+        elif not aoi_path in ["", "False", "0"]:
+            aoi_mode = "kml"
+            aoi_dir = aoi_path
+        if aoi_mode != "kml" and aoi_radius != "":
             try:
                 aoi_radius = int(aoi_radius)
             except:
-                print("!")
-                raise Exception("The 'aoi_radius' must be a number greater than zero.")
+                message = "The 'aoi_radius' must be a number greater than zero."
+                logger.error("(!) " + message)
+                raise Exception(message)
             if aoi_radius <= 0:
-                print("!")
-                raise Exception("The 'aoi_radius' must be a number greater than zero.")
-        elif not aoi_path in ["", "False", "0"]:
-            aoi_mode = "kml" 
+                message = "The 'aoi_radius' must be a number greater than zero."
+                logger.error("(!) " + message)
+                raise Exception(message)
         
         ## Time window parameter:
         try:
             time_window = int(time_window)
         except:
-            print("!")
-            raise Exception("The 'time window' must be an integer greater or equal to zero.")
+            message = "The 'time window' must be an integer greater or equal to zero."
+            logger.error("(!) " + message)
+            raise Exception(message)
         if time_window < 0:
-            print("!")
-            raise Exception("The 'time window' must be an integer greater or equal to zero.")
+            message = "The 'time window' must be an integer greater or equal to zero."
+            logger.error("(!) " + message)
+            raise Exception(message)
         
         ## Append mode:
         if not append_mode in ["", "False", "0"]:
             append_mode = True
+        else:
+            append_mode = False
+
+    ## Limits of the Earth Engine requests:
+    configureRateLimit(max_qps, max_concurrent_requests)
+
+    ## Metrics export (JSON and Prometheus textfile), at the end of the run and, optionally, periodically:
+    if metrics != "" and metrics_interval > 0:
+        startPeriodicExport(metrics + ".json", metrics + ".prom", metrics_interval)
 
     # Retrieve data according to the running mode:
     if running_mode < 3:
-        loadInputDF(running_mode=running_mode, input_file=input_file, input_path=input_path, input_dir=input_dir)
-        resultDF = specificDatesRetrieval()
-        if resultDF is None:
-            print("No results to be saved.")
+        with stageTimer("input_load"):
+            running_mode = loadInputDF(running_mode=running_mode, input_file=input_file, input_path=input_path, input_dir=input_dir)
+        if shard != "":
+            geedar.input_df = selectShard(geedar.input_df, shard_i, n_shards)
+        geedar.time_window = time_window
+    if running_mode < 3 and shard != "" and geedar.input_df.shape[0] == 0:
+        # Nothing to retrieve; the (empty) output is still written for 'merge'.
+        if not dry_run and output_format != "cube":
+            saveEmptyShard(geedar.input_df, output_path)
+    elif running_mode < 3:
+        ## Progress display and progress file (e.g. for an orchestrator):
+        if progress_file != "" and not dry_run:
+            startProgressFile(progress_file, progress_interval)
+        try:
+            with progressDisplay(console) if progress and not dry_run else nullcontext():
+                resultDF = specificDatesRetrieval(running_mode=running_mode, 
+                                                  input_dir=aoi_dir, 
+                                                  aoi_mode=aoi_mode, 
+                                                  append_mode=append_mode, 
+                                                  aoi_radius=aoi_radius, 
+                                                  processing_codes=processing_codes, 
+                                                  product_ids=product_ids, 
+                                                  img_proc_algos=img_proc_algos, 
+                                                  estimation_algos=estimation_algos, 
+                                                  reducers=reducers, 
+                                                  graph_report_path=graph_report, 
+                                                  simplify_aoi=simplify_aoi, 
+                                                  site_order=site_order, 
+                                                  execution_mode=execution_mode, 
+                                                  batch_asset_root=asset_root, 
+                                                  sites_per_task=sites_per_task, 
+                                                  max_concurrent_tasks=max_tasks, 
+                                                  share_processing=share_processing, 
+                                                  fuse_reducers=fuse_reducers, 
+                                                  merge_families=merge_families, 
+                                                  columns=[c.strip() for c in columns.split(",")] 
+                                                      if columns != "" else None, 
+                                                  dry_run=dry_run, 
+                                                  output_format=output_format, 
+                                                  single_precision=single_precision, 
+                                                  cube_path=output_path if output_format == "cube" else "")
+        finally:
+            if progress_file != "" and not dry_run:
+                stopProgressFile()
+        if dry_run:
+            console.print(formatPlanReport(resultDF))
+        elif resultDF is None:
+            logger.info("No results to be saved.")
+        elif output_format == "cube":
+            # Already written during the retrieval.
+            pass
         else:
             # Save results.
-            print("Saving...")
+            logger.info("Saving...")
             try:
                 resultDF.to_csv(output_path, index = False)
             except Exception as e:
-                print("(!) Failed to save the results to '" + output_path + "'.")
-                print(e)
+                logger.error("(!) Failed to save the results to '" + output_path + "'.")
+                logger.error(e)
             else:
-                print("Results saved to file '" + output_path + "'.")
+                logger.info("Results saved to file '" + output_path + "'.")
     elif running_mode in [3,4,5]:
         #databaseUpdate()
-        print("Modo ainda não suportado")
+        logger.info("Modo ainda não suportado")
+
+    if metrics != "":
+        stopPeriodicExport()
+        try:
+            exportMetrics(metrics + ".json", metrics + ".prom")
+        except Exception as e:
+            logger.error("(!) Failed to save the metrics to '" + metrics + ".json' and '" + metrics + ".prom'.")
+            logger.error(e)
+        else:
+            logger.info("Metrics saved to files '" + metrics + ".json' and '" + metrics + ".prom'.")
+
+
+@app.command()
+def merge(shard_outputs:List[str], 
+          output:str=typer.Option(..., help="Merged output file."), 
+          keep_input_row:bool=False):
+    """
+    Junta os resultados das partições ('--shard') na ordem da entrada original.
+    """
+    resultDF = mergeShards(shard_outputs, keep_input_row)
+    resultDF.to_csv(output, index = False)
+    console.print("Merged " + str(len(shard_outputs)) + " shard outputs ("
+                  + str(resultDF.shape[0]) + " rows) into '" + output + "'.")
+
+
+@app.command()
+def serve(host:str=SERVER_HOST, 
+          port:int=SERVER_PORT, 
+          workers:int=SERVER_WORKERS,
+          max_qps:float=DEFAULT_QPS,
+          max_concurrent_requests:int=DEFAULT_CONCURRENCY,
+          log_level:str='INFO',
+          log_file:str=LOG_FILE):
+    """
+    Inicia o serviço de recuperação (API HTTP/JSON local).
+    """
+    os.chdir(os.path.realpath(sys.path[0]))
+    setupLogging(level=log_level, log_file=log_file)
+    runService(host, port, workers, max_qps, max_concurrent_requests)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,214 @@
+import os
+import re
+import json
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from metrics import _atomicWrite
+from buffers import splitStatistic
+from indexing import dateToDay, dayToDate
+
+# Index file of a cube and type of its arrays.
+CUBE_INDEX = "index.json"
+CUBE_DTYPE = "float32"
+# Default chunk shape (sites, dates).
+CUBE_CHUNK = (64, 256)
+# Chunks kept open (memory-mapped) while writing.
+MAX_OPEN_CHUNKS = 256
+
+
+# Directory of a cube variable.
+def variableDirName(variable:str) -> str:
+    """
+    Examples:
+        >>> variableDirName("10110001_sur_refl_b01_median")
+        '10110001_sur_refl_b01_median'
+        >>> variableDirName("10110001_a/b")
+        '10110001_a_b'
+    """
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", variable)
+
+
+# File of a chunk (block of sites, block of dates) of a variable.
+def chunkFileName(siteBlock:int, dayBlock:int) -> str:
+    """
+    Examples:
+        >>> chunkFileName(0, 3)
+        '0.3.npy'
+    """
+    return str(siteBlock) + "." + str(dayBlock) + ".npy"
+
+
+# Results written into an on-disk, chunked site x date array per variable.
+class CubeWriter:
+    """
+    Escreve os resultados em um cubo local × data × variável em disco. Cada
+    variável é um diretório de blocos ('chunks') de 'chunk_sites' locais ×
+    'chunk_days' datas, arquivos '.npy' ('float32', mapeados em memória e
+    preenchidos com NaN). Um bloco só é criado quando recebe o primeiro
+    valor, de modo que regiões vazias do cubo (locais e datas sem dados) não
+    ocupam disco. O índice JSON ('index.json') guarda os locais, as datas, o
+    formato dos blocos e os diretórios das variáveis, e é atualizado a cada
+    nova variável, de modo que um cubo incompleto pode ser lido. Valores não
+    numéricos (por exemplo, 'img_time') não são guardados.
+
+    Args:
+        path: Diretório do cubo (criado se não existir).
+        sites: Locais (linhas do cubo).
+        days: Números dos dias (colunas do cubo; ver 'toDayNumbers').
+        chunk_sites, chunk_days: Formato dos blocos.
+
+    Examples:
+        >>> import tempfile
+        >>> path = tempfile.mkdtemp()
+        >>> cube = CubeWriter(path, ["a", "b"], [18262, 18263])
+        >>> cube.append(["b"], 10110001, {"2020-01-02": {"red_median": 0.5}}, ["median"])
+        >>> cube.close()
+        >>> openCube(path).siteSeries("b")["10110001_red_median"].tolist()
+        [nan, 0.5]
+    """
+    def __init__(self, path:str, sites:list, days, chunk_sites:int = CUBE_CHUNK[0],
+                 chunk_days:int = CUBE_CHUNK[1]):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.sites = [*sites]
+        self.days = sorted(int(d) for d in days)
+        self.chunks = (chunk_sites, chunk_days)
+        self._siteIndex = {site: i for i, site in enumerate(self.sites)}
+        self._dayIndex = {day: i for i, day in enumerate(self.days)}
+        self._variables = []
+        self._created = set()
+        self._open = OrderedDict()
+        self._writeIndex()
+
+    def _writeIndex(self):
+        index = {"dtype": CUBE_DTYPE, "sites": self.sites,
+                 "dates": [dayToDate(d) for d in self.days], "chunks": [*self.chunks],
+                 "variables": {v: variableDirName(v) for v in self._variables}}
+        _atomicWrite(os.path.join(self.path, CUBE_INDEX), json.dumps(index))
+
+    def _chunk(self, variable:str, siteBlock:int, dayBlock:int) -> np.memmap:
+        key = (variable, siteBlock, dayBlock)
+        if key in self._open:
+            self._open.move_to_end(key)
+            return self._open[key]
+        if not variable in self._variables:
+            os.makedirs(os.path.join(self.path, variableDirName(variable)), exist_ok=True)
+            self._variables.append(variable)
+            self._writeIndex()
+        chunkFile = os.path.join(self.path, variableDirName(variable),
+                                 chunkFileName(siteBlock, dayBlock))
+        if key in self._created:
+            chunk = np.load(chunkFile, mmap_mode="r+")
+        else:
+            # Chunks at the end of the cube are smaller.
+            shape = (min(self.chunks[0], len(self.sites) - siteBlock * self.chunks[0]),
+                     min(self.chunks[1], len(self.days) - dayBlock * self.chunks[1]))
+            chunk = np.lib.format.open_memmap(chunkFile, mode="w+", dtype=CUBE_DTYPE,
+                                              shape=shape)
+            chunk[:] = np.nan
+            self._created.add(key)
+        self._open[key] = chunk
+        if len(self._open) > MAX_OPEN_CHUNKS:
+            _, oldest = self._open.popitem(last=False)
+            oldest.flush()
+        return chunk
+
+    def append(self, sites:list, processingCode:int, result:dict, suffixes:list,
+               bandRenaming:list = None):
+        """
+        Escreve o resultado {data: {variável: valor}} de um código de
+        processamento nas linhas dos locais informados. Os argumentos são os
+        de 'LongResultBuffer.append'; as variáveis do cubo são nomeadas
+        'código_variável_estatística'. Datas fora do cubo são ignoradas.
+        """
+        rows = [self._siteIndex[site] for site in sites if site in self._siteIndex]
+        nSites, nDays = self.chunks
+        for date, values in result.items():
+            col = self._dayIndex.get(dateToDay(date))
+            if col is None or rows == []:
+                continue
+            for key, value in values.items():
+                if value is None or isinstance(value, (str, bool)):
+                    continue
+                variable, statistic = splitStatistic(key, suffixes)
+                variables = [variable]
+                if bandRenaming is not None:
+                    variables = [common for real, common in bandRenaming
+                                 if real == variable] or variables
+                for v in variables:
+                    name = (str(processingCode) + "_" + v
+                            + ("_" + statistic if statistic != "" else ""))
+                    for row in rows:
+                        chunk = self._chunk(name, row // nSites, col // nDays)
+                        chunk[row % nSites, col % nDays] = value
+
+    def flush(self):
+        """
+        Grava em disco os valores escritos até o momento.
+        """
+        for chunk in self._open.values():
+            chunk.flush()
+
+    def close(self):
+        self.flush()
+        self._writeIndex()
+        self._open = OrderedDict()
+
+
+# Random-access reader of a cube written by 'CubeWriter'.
+class CubeReader:
+    """
+    Leitura de um cubo gravado por 'CubeWriter'. Ler a série de um local
+    mapeia em memória somente os blocos dos locais vizinhos a ele, sem
+    carregar o restante do cubo. Blocos inexistentes correspondem a NaN.
+    """
+    def __init__(self, path:str):
+        with open(os.path.join(path, CUBE_INDEX), encoding="utf-8") as f:
+            index = json.load(f)
+        self.path = path
+        self.sites = index["sites"]
+        self.dates = index["dates"]
+        self.chunks = tuple(index["chunks"])
+        self.variables = [*index["variables"]]
+        self._dirs = index["variables"]
+        self._siteIndex = {site: i for i, site in enumerate(self.sites)}
+
+    def _chunk(self, variable:str, siteBlock:int, dayBlock:int):
+        chunkFile = os.path.join(self.path, self._dirs[variable],
+                                 chunkFileName(siteBlock, dayBlock))
+        if not os.path.isfile(chunkFile):
+            return None
+        return np.load(chunkFile, mmap_mode="r")
+
+    def _series(self, variable:str, row:int) -> np.ndarray:
+        nSites, nDays = self.chunks
+        values = np.full(len(self.dates), np.nan, dtype=CUBE_DTYPE)
+        for dayBlock in range(-(-len(self.dates) // nDays)):
+            chunk = self._chunk(variable, row // nSites, dayBlock)
+            if chunk is not None:
+                values[dayBlock * nDays:dayBlock * nDays + chunk.shape[1]] = chunk[row % nSites]
+        return values
+
+    def read(self, variable:str) -> np.ndarray:
+        """
+        Matriz locais × datas completa da variável (carregada em memória).
+        """
+        return np.array([self._series(variable, i) for i in range(len(self.sites))],
+                        dtype=CUBE_DTYPE).reshape(len(self.sites), len(self.dates))
+
+    def siteSeries(self, site:str, variables:list = None) -> pd.DataFrame:
+        """
+        Série temporal de um local: um data frame indexado pelas datas, com
+        uma coluna por variável (todas, se 'variables' for 'None').
+        """
+        i = self._siteIndex[site]
+        data = {v: self._series(v, i) for v in (variables or self.variables)}
+        return pd.DataFrame(data, index=pd.Index(pd.to_datetime(self.dates), name="date"))
+
+
+# Open a cube for reading.
+def openCube(path:str) -> CubeReader:
+    return CubeReader(path)
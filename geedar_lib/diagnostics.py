@@ -0,0 +1,217 @@
+import json
+import logging
+from collections import deque
+from time import perf_counter
+
+from metrics import incrementCounter, observe
+from ratelimit import getRateLimiter, isThrottlingError
+
+# Thresholds above which a request is reported as potentially problematic.
+## size: length (characters) of the serialized expression;
+## nodes: number of nodes in the expression graph;
+## loops: number of 'iterate' and 'map' invocations in the graph;
+## latency: time (seconds) spent waiting for the server response.
+GRAPH_THRESHOLDS = {
+    "size": 1000000,
+    "nodes": 20000,
+    "loops": 100,
+    "latency": 120
+}
+
+# Keys that identify a value node in a serialized (Cloud API format) expression.
+GRAPH_NODE_KEYS = {"constantValue", "integerValue", "bytesValue", "arrayValue",
+                   "dictionaryValue", "functionDefinitionValue",
+                   "functionInvocationValue", "argumentReference",
+                   "valueReference"}
+
+# Maximum number of request records kept in the run report.
+REPORT_MAX_REQUESTS = 100000
+
+logger = logging.getLogger("geedar")
+
+# Records of the requests issued in the current run. They are collected only
+# while the report is enabled (see 'enableRunReport').
+run_report = deque(maxlen=REPORT_MAX_REQUESTS)
+report_enabled = False
+
+
+# Count the nodes of a serialized (Cloud API format) Earth Engine expression.
+def graphStatsFromJSON(graph:dict) -> dict:
+    """
+    Retorna o número de nós e de invocações de 'iterate' e 'map' de uma
+    expressão do Earth Engine serializada.
+
+    Args:
+        graph: Expressão serializada (JSON já decodificado).
+
+    Returns:
+        Um dicionário com o número de nós, de laços ('iterate' e 'map') e das
+        funções invocadas.
+
+    Examples:
+        >>> graphStatsFromJSON({"result": "0", "values": {"0": {"functionInvocationValue": {"functionName": "Collection.map", "arguments": {"collection": {"valueReference": "1"}}}}, "1": {"constantValue": 1}}})
+        {'nodes': 3, 'loops': 1, 'functions': {'Collection.map': 1}}
+    """
+    nodes = 0
+    loops = 0
+    functions = {}
+    pending = [graph]
+
+    while pending:
+        item = pending.pop()
+        if isinstance(item, list):
+            pending.extend(item)
+            continue
+        if not isinstance(item, dict):
+            continue
+        if not GRAPH_NODE_KEYS.isdisjoint(item):
+            nodes = nodes + 1
+        invocation = item.get("functionInvocationValue")
+        if isinstance(invocation, dict) and "functionName" in invocation:
+            name = invocation["functionName"]
+            functions[name] = functions.get(name, 0) + 1
+            if name.endswith(".iterate") or name.endswith(".map"):
+                loops = loops + 1
+        pending.extend(item.values())
+
+    return {"nodes": nodes, "loops": loops, "functions": functions}
+
+
+# Get the size and complexity of the expression behind an Earth Engine object.
+def graphStats(eeObject) -> dict:
+    """
+    Retorna o tamanho da expressão serializada de um objeto do Earth Engine,
+    o número de nós e o número de invocações de 'iterate' e 'map'.
+    """
+    serialized = eeObject.serialize()
+    stats = graphStatsFromJSON(json.loads(serialized))
+    stats["size"] = len(serialized)
+    return stats
+
+
+# Request the value of an Earth Engine object, recording the request graph
+# statistics, the latency and the outcome in the run report.
+def tracedGetInfo(eeObject, caller:str, **context):
+    """
+    Executa o 'getInfo()' de um objeto do Earth Engine, respeitando o
+    limitador de requisições compartilhado, e, se o relatório estiver
+    habilitado (ver 'enableRunReport'), registra nele o tamanho e a
+    complexidade da expressão, a latência e o resultado da requisição.
+
+    Args:
+        eeObject: Objeto do Earth Engine a ser computado.
+        caller: Nome da função que originou a requisição.
+        context: Informações adicionais (produto, redutor, etc.) a registrar.
+
+    Returns:
+        O resultado do 'getInfo()'. Exceções são registradas e repassadas.
+    """
+    record = {"caller": caller, "context": context, "size": None,
+              "nodes": None, "loops": None, "latency": None,
+              "outcome": None, "error": None}
+    # Serializing the expression has a cost; only done for the report.
+    if report_enabled:
+        try:
+            stats = graphStats(eeObject)
+        except Exception as e:
+            record["error"] = "Could not serialize the expression: " + str(e)
+        else:
+            record["size"] = stats["size"]
+            record["nodes"] = stats["nodes"]
+            record["loops"] = stats["loops"]
+
+    # Wait for the rate limiter before starting the latency measurement.
+    limiter = getRateLimiter()
+    limiter.acquire()
+    throttled = False
+    start = perf_counter()
+    incrementCounter("requests", caller=caller)
+    try:
+        result = eeObject.getInfo()
+    except Exception as e:
+        throttled = isThrottlingError(e)
+        record["outcome"] = "error"
+        record["error"] = str(e)
+        incrementCounter("failures", caller=caller)
+        raise
+    else:
+        record["outcome"] = "success"
+        return result
+    finally:
+        limiter.release(throttled)
+        record["latency"] = perf_counter() - start
+        observe("request_seconds", record["latency"], caller=caller)
+        if report_enabled:
+            run_report.append(record)
+        checkThresholds(record)
+
+
+# Warn about requests whose statistics exceed the configured thresholds.
+def checkThresholds(record:dict) -> list:
+    """
+    Verifica se as estatísticas de uma requisição excedem os limites de
+    'GRAPH_THRESHOLDS' e emite um aviso para cada limite excedido.
+    """
+    exceeded = [k for k in GRAPH_THRESHOLDS
+                if record.get(k) is not None and record[k] > GRAPH_THRESHOLDS[k]]
+    for k in exceeded:
+        logger.warning("(!) Request from '" + record["caller"] + "' " + str(record["context"])
+              + " exceeded the '" + k + "' threshold: " + str(record[k])
+              + " > " + str(GRAPH_THRESHOLDS[k]) + ".")
+    return exceeded
+
+
+# Enable or disable the collection of the run report.
+def enableRunReport(enabled:bool = True):
+    """
+    Habilita (ou desabilita) o registro das requisições no relatório da
+    execução. Desabilitado por padrão, de modo que processos de longa
+    duração (como os do serviço) não acumulam registros nem serializam as
+    expressões sem necessidade. No máximo 'REPORT_MAX_REQUESTS' registros
+    são mantidos (os mais recentes).
+    """
+    global report_enabled
+    report_enabled = enabled
+
+
+# Clear the records of the current run.
+def resetRunReport():
+    """
+    Limpa os registros de requisições da execução atual.
+    """
+    run_report.clear()
+
+
+# Summarize the requests of the current run by caller.
+def getRunReport() -> dict:
+    """
+    Retorna o relatório da execução atual: os registros de cada requisição e
+    um resumo (quantidade, falhas, latência, maiores tamanho, número de nós e
+    de laços) por função de origem.
+    """
+    summary = {}
+    for record in run_report:
+        callerSummary = summary.setdefault(record["caller"], {
+            "requests": 0, "failures": 0, "total_latency": 0.0,
+            "max_latency": 0.0, "max_size": 0, "max_nodes": 0, "max_loops": 0
+            })
+        callerSummary["requests"] = callerSummary["requests"] + 1
+        if record["outcome"] != "success":
+            callerSummary["failures"] = callerSummary["failures"] + 1
+        callerSummary["total_latency"] = callerSummary["total_latency"] + record["latency"]
+        callerSummary["max_latency"] = max(callerSummary["max_latency"], record["latency"])
+        for k in ["size", "nodes", "loops"]:
+            if record[k] is not None:
+                callerSummary["max_" + k] = max(callerSummary["max_" + k], record[k])
+
+    return {"thresholds": dict(GRAPH_THRESHOLDS), "summary": summary,
+            "requests": list(run_report)}
+
+
+# Save the report of the current run as a JSON file.
+def saveRunReport(path:str):
+    """
+    Salva o relatório da execução atual em um arquivo JSON.
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(getRunReport(), f, indent=2, default=str)
@@ -3,30 +3,56 @@ import os
 import math
 from time import sleep
 import sqlite3
+import queue
+import threading
 import pandas as pd
 from shutil import copyfile
-from fastkml import kml
+import logging
 import ee
 
-from utils import (which, writeToLogFile, 
-                              polygonFromKML, unfoldProcessingCode)
+from utils import (which, polygonFromKML, unfoldProcessingCode)
+
+from diagnostics import (tracedGetInfo, enableRunReport, resetRunReport, saveRunReport)
+from metrics import stageTimer, incrementCounter
+from logs import bindLogContext, resetLogContext
+from progress import startProgress, advanceProgress, trackGroup, finishProgress
+from buffers import ResultBuffer, LongResultBuffer
+from indexing import (toDayNumbers, dateToDay, dayToDate, siteCodes, groupRows, 
+                      groupSitesByDays, selectResultDays)
+from cube import CubeWriter, openCube
+from geometry import (SIMPLIFY_FACTOR, simplifyPolygons, countVertices, polygonsArea, 
+                      pointAOIKey, polygonAOIKey)
+from scheduler import scheduleSites, polygonsBoundingBox
+from sharding import INPUT_ROW_COL
+from planner import (planProcessing, splitResult, fusedStatistics, 
+                     selectStatistics, familyRuns, splitFamilyResult, 
+                     projectColumns, productColumns, estimateRetrieval, 
+                     FAMILY_KEY_SEPARATOR)
+from batch import (EETaskService, runTasks, 
+                   MAX_CONCURRENT_TASKS, TASK_POLL_INTERVAL)
 
 from utils import (PRODUCT_SPECS, AVAILABLE_PRODUCTS,
                               IMG_PROC_ALGO_SPECS, IMG_PROC_ALGO_LIST,
                               ESTIMATION_ALGO_SPECS, ESTIMATION_ALGO_LIST,
-                              REDUCTION_SPECS)
+                              REDUCTION_SPECS, PRODUCT_FAMILIES)
 
 ee.Initialize()
 
+logger = logging.getLogger("geedar")
+
 # Global objects used among functions.
 image_collection = ee.ImageCollection(ee.Image())
 aoi = None
 ee_reducer = ee.Reducer.median()
 bands = {}
 input_df = pd.DataFrame()
+# Days before and after each input date (see 'expandTimeWindow').
+time_window = 0
 user_df = pd.DataFrame()
 export_vars = []
 export_bands = []
+# Output columns requested by the user (None: all of them).
+output_columns = None
 log_file = "GEEDaR_log.txt"
 anyError = False
 
@@ -220,10 +246,61 @@ def qaMask_collection(productID:int, imageCollection:ee.ImageCollection, addBand
     return ee.ImageCollection(imageCollection).map(qaMask)
 
 
+# Merge same-date images into a single (mean) mosaic per date.
+def dailyMosaic(imageCollection:ee.ImageCollection, refBand:str) -> ee.ImageCollection:
+    """
+    Retorna uma coleção com uma única imagem por data ("img_date"). As imagens 
+    de mesma data são agrupadas por um join e combinadas pela média, sem 
+    converter a coleção em lista.
+
+    Args:
+        imageCollection: Coleção de imagens com a propriedade "img_date".
+        refBand: Banda cuja projeção é atribuída ao mosaico.
+    
+    Returns:
+        Uma coleção de imagens com uma imagem por data.
+    """
+    imageCollection = ee.ImageCollection(imageCollection)
+    matchesKey = "same_date_imgs"
+    joinedCollection = ee.Join.saveAll(matchesKey).apply(
+        primary=imageCollection.distinct("img_date").sort("img_date"), 
+        secondary=imageCollection, 
+        condition=ee.Filter.equals(leftField="img_date", rightField="img_date")
+        )
+
+    # Function to be mapped to the joined collection (one element per date).
+    def mosaicSameDate(image):
+        # Sorted by 'system:index' (unique), so that the representative image 
+        # (properties and projection of the mosaic) does not depend on the 
+        # order of the join's matches.
+        sameDateImgs = ee.ImageCollection.fromImages(
+            ee.Image(image).get(matchesKey)).sort("system:index")
+        # The matched images are the original ones, so they do not carry the join property.
+        firstImg = ee.Image(sameDateImgs.first())
+        properties = firstImg.toDictionary(
+                firstImg.propertyNames()
+            ).remove(["system:footprint"], True)
+        proj = firstImg.select(refBand).projection()
+        #mosaic = ee.Image(qaMask_collection(productID, sameDateImgs, True).qualityMosaic("qa_mask").setMulti(properties)).setDefaultProjection(proj).select(firstImg.bandNames())
+        mosaic = ee.Image(sameDateImgs.reduce(
+            ee.Reducer.mean()).setMulti(
+                properties)).setDefaultProjection(proj).rename(
+                    firstImg.bandNames()
+                    )
+        return ee.Image(
+            ee.Algorithms.If(sameDateImgs.size().gt(1), mosaic, firstImg)
+            )
+
+    return ee.ImageCollection(
+        joinedCollection.map(mosaicSameDate)
+        ).copyProperties(imageCollection)
+
+
 # Get the dates of the images in the collection which match AOI and user dates.
 def getAvailableDates(productID:int, dateList:list) -> list:
     """
-    Retorna um array de valores da propriedade "img_date" de cada imagem da coleção de imagens.
+    Retorna um array de valores da propriedade "img_date" de cada imagem da coleção de imagens
+    que intersecta a área de interesse atual ('aoi').
     
     Args:
         productID: Identificação do produto espectral.
@@ -236,7 +313,6 @@ def getAvailableDates(productID:int, dateList:list) -> list:
         >>> getAvailableDates(101, ['2020-01-01'])
         
     """
-    aoi = None
     dateMin = dateList[0]
     dateMax = (pd.Timestamp(dateList[-1]) 
                + pd.Timedelta(1, "day")).strftime("%Y-%m-%d")
@@ -246,7 +322,101 @@ def getAvailableDates(productID:int, dateList:list) -> list:
         .map(lambda image: image.set(
             "img_date", ee.Image(image).date().format("YYYY-MM-dd"))) \
         .filter(ee.Filter.inList("img_date", dateList))
-    return imageCollection.aggregate_array("img_date").getInfo()
+    return tracedGetInfo(imageCollection.aggregate_array("img_date"), 
+                         "getAvailableDates", product_id=productID, 
+                         n_dates=len(dateList))
+
+
+# Get the available dates of each product of a family in a single request.
+def getFamilyAvailableDates(productIDs:list, dateList:list) -> dict:
+    """
+    Como 'getAvailableDates', mas para vários produtos (de uma família) de
+    uma só vez.
+
+    Returns:
+        Dicionário {produto: datas disponíveis}.
+    """
+    dateMin = dateList[0]
+    dateMax = (pd.Timestamp(dateList[-1]) 
+               + pd.Timedelta(1, "day")).strftime("%Y-%m-%d")
+    imageCollection = None
+    for productID in productIDs:
+        productCollection = ee.ImageCollection(getCollection(productID)) \
+            .filterBounds(aoi) \
+            .filterDate(dateMin, dateMax) \
+            .map(lambda image: image.set(
+                "img_date", ee.Image(image).date().format("YYYY-MM-dd"))) \
+            .map(familyKeySetter(productID))
+        if imageCollection is None:
+            imageCollection = productCollection
+        else:
+            imageCollection = imageCollection.merge(productCollection)
+    imageCollection = imageCollection.filter(ee.Filter.inList("img_date", dateList))
+    keys = tracedGetInfo(imageCollection.aggregate_array("img_key"), 
+                         "getAvailableDates", product_id=productIDs, 
+                         n_dates=len(dateList))
+    availableDates = {productID: [] for productID in productIDs}
+    for key in keys:
+        date, productID = key.rsplit(FAMILY_KEY_SEPARATOR, 1)
+        availableDates[int(productID)].append(date)
+    return availableDates
+
+
+# Function setting the family key ('date/product') of an image.
+def familyKeySetter(productID:int):
+    """
+    Retorna a função, a ser mapeada em uma coleção do produto (com a
+    propriedade 'img_date'), que define as propriedades 'img_key'
+    ('data/produto'), 'product_id' e 'scale_ref_band' de cada imagem.
+    """
+    def setFamilyKey(image):
+        image = ee.Image(image)
+        return image.set(
+            "img_key", ee.String(image.get("img_date")).cat(
+                FAMILY_KEY_SEPARATOR + str(productID)), 
+            "product_id", productID, 
+            "scale_ref_band", PRODUCT_SPECS[productID]["scaleRefBand"])
+    return setFamilyKey
+
+
+# Process the images of the products of a family and merge them.
+def familyProcessing(members:list, memberDates:dict, dateList:list, codesLabel:str = ""):
+    """
+    Aplica o processamento de imagens e a estimação a cada produto de uma
+    família (grupos de 'planProcessing' reunidos por 'familyRuns') e une as
+    coleções processadas em 'image_collection', com as imagens identificadas
+    pela propriedade 'img_key' ('data/produto'). 'bands', 'export_vars' e
+    'export_bands' passam a ser a união das de todos os produtos.
+    """
+    global image_collection, bands, export_vars, export_bands
+
+    mergedCollection = None
+    mergedBands = {}
+    mergedVars = []
+    mergedExportBands = []
+    for procGroup in members:
+        productID = procGroup["product_id"]
+        productDateSet = set(memberDates[productID])
+        productDates = [d for d in dateList if d in productDateSet]
+        if productDates == []:
+            continue
+        with stageTimer("image_processing", processing_code=codesLabel):
+            imageProcessing(procGroup["img_proc_algo"], productID, productDates)
+        with stageTimer("estimation", processing_code=codesLabel):
+            estimation(procGroup["estimation_algos"], productID)
+        productCollection = image_collection.map(familyKeySetter(productID))
+        if mergedCollection is None:
+            mergedCollection = productCollection
+        else:
+            mergedCollection = mergedCollection.merge(productCollection)
+        mergedBands.update({v: v for v in bands.values()})
+        mergedVars.extend(v for v in export_vars if not v in mergedVars)
+        mergedExportBands.extend(b for b in export_bands if not b in mergedExportBands)
+
+    image_collection = mergedCollection
+    bands = mergedBands
+    export_vars = mergedVars
+    export_bands = mergedExportBands
 
 # Apply an image processing algorithm to the image collection to get spectral data.
 def imageProcessing(algo, productID, dateList, clip = True):
@@ -307,39 +477,7 @@ def imageProcessing(algo, productID, dateList, clip = True):
     image_collection = image_collection.filter(
         ee.Filter.inList("img_date", dateList)
         )
-    sortedCollection = image_collection.sort("img_date")
-    imageCollection_list = sortedCollection.toList(5000)
-    imgDates = ee.List(sortedCollection.aggregate_array("img_date"))
-    distinctDates = imgDates.distinct()
-    dateFreq = distinctDates.map(lambda d: imgDates.frequency(d))
-    # Function to be mapped to the image list and mosaic same-date images.
-    def oneImgPerDate(freq, imgList):
-        freq = ee.Number(freq)
-        localImgList = ee.List(imgList).slice(0, freq)
-        firstImg = ee.Image(localImgList.get(0))
-        properties = firstImg.toDictionary(
-                firstImg.propertyNames()
-            ).remove(["system:footprint"], True)
-        proj = firstImg.select(refBand).projection()
-        #mosaic = ee.Image(qaMask_collection(productID, ee.ImageCollection(localImgList), True).qualityMosaic("qa_mask").setMulti(properties)).setDefaultProjection(proj).select(firstImg.bandNames())
-        mosaic = ee.Image(ee.ImageCollection(localImgList).reduce(
-            ee.Reducer.mean()).setMulti(
-                properties)).setDefaultProjection(proj).rename(
-                    firstImg.bandNames()
-                    )
-        singleImg = ee.Image(
-            ee.Algorithms.If(freq.gt(1), mosaic, firstImg)
-            )        
-        return ee.List(imgList).splice(0, freq).add(singleImg)
-    mosaicImgList = ee.List(dateFreq.iterate(
-        oneImgPerDate, imageCollection_list)
-        )
-    mosaicCollection = ee.ImageCollection(
-        mosaicImgList).copyProperties(image_collection)
-    image_collection = ee.ImageCollection(
-        ee.Algorithms.If(imgDates.length().gt(distinctDates.length()), 
-            mosaicCollection, image_collection)
-            )
+    image_collection = dailyMosaic(image_collection, refBand)
     
     # Clip the images.
     if clip:
@@ -1339,19 +1477,19 @@ def estimation(algos:int, productID:int, demandIDs = [-1], running_mode:int = 1)
         requiredBands = ESTIMATION_ALGO_SPECS[algo]["requiredBands"]
 
         if not all(band in list(bands.keys()) for band in requiredBands):
-            msg = "(!) The product #" 
+            msg = ("(!) The product #" 
             + str(productID) 
             + " does not contain all the bands required to run the estimation algorithm #" 
             + str(algo) + ": " 
-            + str(requiredBands) + "."
+            + str(requiredBands) + ".")
 
             if running_mode < 3:
-                print(msg)
+                logger.warning(msg)
 
             elif running_mode >= 3:
                 anyError = True
-                print("[DEMANDID " + str(demandIDs[algo_i]) + "] " + msg)
-                writeToLogFile(msg, "Error", "DEMANDID " + str(demandIDs[algo_i]))
+                logger.error("[DEMANDID " + str(demandIDs[algo_i]) + "] " + msg, 
+                             extra={"demand_id": demandIDs[algo_i]})
 
             continue
     
@@ -1498,17 +1636,33 @@ def estimation(algos:int, productID:int, demandIDs = [-1], running_mode:int = 1)
 def reduction(reducer, productID, aoi=None):
     """
     Essa função reduz o valor de cada imagem previamente mascadara em
-    uma coletação aplicando o redutor predefinido
+    uma coletação aplicando o redutor predefinido. Se 'productID' for uma
+    lista (coleção unida de uma família, ver 'familyProcessing'), os
+    resultados são identificados por 'data/produto'.
     """
     global image_collection
     global ee_reducer
     
-    # Parameters to include in the result data frame:
-    paramList = ee.List(export_vars)   
+    # Parameters and bands to include in the result data frame:
+    if isinstance(reducer, list):
+        suffixes = fusedStatistics([REDUCTION_SPECS[r]["sufix"] for r in reducer])
+    else:
+        suffixes = REDUCTION_SPECS[reducer]["sufix"]
+    selectedVars, selectedBands = projectColumns(
+        output_columns, export_vars, list({*bands.values()}) + export_bands, suffixes)
+    paramList = ee.List(selectedVars)   
+
+    # Result key and scale reference band of each image.
+    if isinstance(productID, list):
+        keyProperty = "img_key"
+        refBand = lambda image: ee.String(ee.Image(image).get("scale_ref_band"))
+    else:
+        keyProperty = "img_date"
+        refBand = lambda image: PRODUCT_SPECS[productID]["scaleRefBand"]
 
     def getParamVals(image, result):
         return ee.Dictionary(result).set(
-            ee.Image(image).get("img_date"), ee.Dictionary.fromLists(
+            ee.Image(image).get(keyProperty), ee.Dictionary.fromLists(
                 paramList, paramList.map(
                     lambda paramName: ee.Image(image).get(ee.String(paramName))
                     )
@@ -1518,37 +1672,20 @@ def reduction(reducer, productID, aoi=None):
     paramDict = ee.Dictionary(
         ee.ImageCollection(image_collection).iterate(getParamVals, first))
   
-    if reducer == 0:
-        return paramDict
-
-    else:
-        if reducer == 1:
-            ee_reducer = ee.Reducer.median()
-
-        elif reducer == 2:
-            ee_reducer = ee.Reducer.mean()
-
-        elif reducer == 3:
-            ee_reducer = ee.Reducer.mean().combine(
-                reducer2=ee.Reducer.stdDev(),sharedInputs=True
-                )
-
-        elif reducer == 4:
-            ee_reducer = ee.Reducer.minMax()
-
-        elif reducer == 5:
-            ee_reducer = ee.Reducer.count()
+    if reducer == 0 or selectedBands == []:
+        # Only image properties (e.g. 'img_time', 'qual_flag') are requested.
+        try:
+            return tracedGetInfo(paramDict, "reduction", product_id=productID, 
+                                 reducer=reducer)
+        except Exception as e:
+            logger.warning("(!) " + str(e))
+            return None
 
-        elif reducer == 6:
-            ee_reducer = ee.Reducer.sum()
+    elif isinstance(reducer, list):
+        ee_reducer = fusedReducer(reducer)
 
-        elif reducer == 7:
-            ee_reducer = ee.Reducer.median() \
-                .combine(reducer2 = ee.Reducer.mean(), sharedInputs = True) \
-                .combine(reducer2 = ee.Reducer.stdDev(), sharedInputs = True) \
-                .combine(reducer2 = ee.Reducer.minMax(), sharedInputs = True)
-       
-    band = PRODUCT_SPECS[productID]["scaleRefBand"]
+    else:
+        ee_reducer = getReducer(reducer)
        
     # Combine the dictionaries of parameters and of band values.
     def combDicts(key, subDict):
@@ -1561,11 +1698,13 @@ def reduction(reducer, productID, aoi=None):
     tileScale = 1
 
     for c in range(3):
+        if c > 0:
+            incrementCounter("retries", caller="reduction")
         
         def reduce(image, result):
-            scale = image.select(band).projection().nominalScale()
+            scale = image.select(refBand(image)).projection().nominalScale()
             return ee.Dictionary(result).set(
-                ee.Image(image).get("img_date"), ee.Image(image).reduceRegion(
+                ee.Image(image).get(keyProperty), projectBands(image, selectedBands).reduceRegion(
                     reducer=ee.Reducer(ee_reducer), geometry = aoi, 
                     scale=scale, bestEffort = True, 
                     tileScale=tileScale
@@ -1577,24 +1716,27 @@ def reduction(reducer, productID, aoi=None):
             )
         
         try:
-            result = bandDict.map(combDicts).getInfo()
+            result = tracedGetInfo(bandDict.map(combDicts), "reduction", 
+                                   product_id=productID, reducer=reducer, 
+                                   tile_scale=tileScale)
             successful = True
             #if c > 0:
             #print("Successful retrieval.")
             break
         
         except Exception as e:
-            print("(!)")
-            print(e)
+            logger.warning("(!) " + str(e))
             if str(e) == "Computation timed out.":
                 if c < 2:
-                    print("Trying again...")                    
+                    logger.info("Trying again...")
                 timeoutcounts = timeoutcounts + 1
                 if(timeoutcounts >= 2):
                     # On the second failure for computation timeout, process images one by one:
-                    localDateList = image_collection.aggregate_array("img_date").getInfo()
+                    localDateList = tracedGetInfo(
+                        image_collection.aggregate_array("img_date"), 
+                        "reduction", product_id=productID, reducer=reducer)
                     if len(localDateList) > 1:
-                        print("This time processing images one by one:")                    
+                        logger.info("This time processing images one by one:")
                         result = ee.Dictionary()
                         for localDate in localDateList:
                             localImageCollection = image_collection.filterDate(
@@ -1610,32 +1752,125 @@ def reduction(reducer, productID, aoi=None):
                                 ee.ImageCollection(localImageCollection).iterate(reduce, first)
                                 )
                             localResult = bandDict.map(combDicts)
-                            print(localDate + ": ", end = '')
                             try:
-                                result = ee.Dictionary(result).combine(localResult).getInfo()
-                                print("successful retrieval.")
+                                result = tracedGetInfo(
+                                    ee.Dictionary(result).combine(localResult), 
+                                    "reduction", product_id=productID, 
+                                    reducer=reducer, date=localDate)
+                                logger.info(localDate + ": successful retrieval.")
                                 successful = True
                             except:
-                                print("Failed.")
+                                logger.warning(localDate + ": failed.")
                         break
             elif str(e)[:40] == "Output of image computation is too large":
                 if c < 2:
-                    print("Trying with a different tileScale parameter: " 
+                    logger.info("Trying with a different tileScale parameter: " 
                           + str(tileScale) + "...")
                     tileScale = tileScale * 2
                 else:
-                    print("Failed.")
+                    logger.warning("Failed.")
             else:
                 if c < 2:
-                    print("Trying again in 30 seconds...")
+                    logger.info("Trying again in 30 seconds...")
                     sleep(30)
                 else:
-                    print("Failed.")
+                    logger.warning("Failed.")
                     
     if not successful:
         return
         
-    reducedBands = list({*bands.values()}) + export_bands
+    #print("Successful retrieval.")
+    if isinstance(reducer, list):
+        # The outputs of a combined reducer are already named 'band_statistic'.
+        return result
+    return renameReducedBands(result, reducer, list({*bands.values()}) + export_bands)
+
+
+# Keep only the bands needed for the output columns.
+def projectBands(image:ee.Image, selectedBands:list) -> ee.Image:
+    """
+    Seleciona, da imagem, as bandas necessárias para as colunas de saída
+    solicitadas (ver 'projectColumns'). Sem colunas solicitadas, a imagem é
+    mantida. Bandas ausentes na imagem (por exemplo, de outro produto da
+    mesma família) são ignoradas.
+    """
+    image = ee.Image(image)
+    if output_columns is None:
+        return image
+    return image.select(image.bandNames().filter(ee.Filter.inList("item", selectedBands)))
+
+
+# Earth Engine reducer corresponding to a GEEDaR reducer code.
+def getReducer(reducer:int) -> ee.Reducer:
+    """
+    Retorna o redutor do Earth Engine correspondente ao código de redução
+    (ver 'REDUCTION_SPECS'), ou 'None' para o código 0 (sem redução).
+    """
+    if reducer == 1:
+        return ee.Reducer.median()
+
+    elif reducer == 2:
+        return ee.Reducer.mean()
+
+    elif reducer == 3:
+        return ee.Reducer.mean().combine(
+            reducer2=ee.Reducer.stdDev(),sharedInputs=True
+            )
+
+    elif reducer == 4:
+        return ee.Reducer.minMax()
+
+    elif reducer == 5:
+        return ee.Reducer.count()
+
+    elif reducer == 6:
+        return ee.Reducer.sum()
+
+    elif reducer == 7:
+        return ee.Reducer.median() \
+            .combine(reducer2 = ee.Reducer.mean(), sharedInputs = True) \
+            .combine(reducer2 = ee.Reducer.stdDev(), sharedInputs = True) \
+            .combine(reducer2 = ee.Reducer.minMax(), sharedInputs = True)
+
+
+# Single Earth Engine reducer computing the statistics of several GEEDaR reducers.
+def fusedReducer(reducers:list) -> ee.Reducer:
+    """
+    Retorna um único redutor do Earth Engine, combinado com 
+    'sharedInputs=True', que calcula todas as estatísticas dos códigos de
+    redução informados (ver 'fusedStatistics'). As saídas são nomeadas
+    'banda_estatística' (por exemplo, 'sur_refl_b01_median').
+    """
+    statReducers = {
+        "median": ee.Reducer.median, 
+        "mean": ee.Reducer.mean, 
+        "stdDev": ee.Reducer.stdDev, 
+        "min": ee.Reducer.minMax, 
+        "max": ee.Reducer.minMax, 
+        "count": ee.Reducer.count, 
+        "sum": ee.Reducer.sum
+        }
+    combined = None
+    added = []
+    for stat in fusedStatistics([REDUCTION_SPECS[r]["sufix"] for r in reducers]):
+        makeReducer = statReducers[stat]
+        if makeReducer in added:
+            continue
+        added.append(makeReducer)
+        if combined is None:
+            combined = makeReducer()
+        else:
+            combined = combined.combine(reducer2 = makeReducer(), sharedInputs = True)
+    return combined
+
+
+# Add the reducer suffix to the names of the reduced bands.
+def renameReducedBands(result:dict, reducer:int, reducedBands:list) -> dict:
+    """
+    Acrescenta o sufixo do redutor (por exemplo, '_median') ao nome das
+    bandas reduzidas de um resultado {data: {variável: valor}}. Redutores com
+    mais de um sufixo já nomeiam as bandas dessa forma.
+    """
     sufix = REDUCTION_SPECS[reducer]["sufix"][0]
 
     if len(REDUCTION_SPECS[reducer]["sufix"]) == 1:
@@ -1643,38 +1878,74 @@ def reduction(reducer, productID, aoi=None):
             for k2 in [*result[k1]]:
                 if k2 in reducedBands:
                     result[k1][k2 + "_" + sufix] = result[k1].pop(k2)
-    #print("Successful retrieval.")
     return result
 
+
+# Reduction of the processed images of a site as a table, for export tasks.
+def reductionTable(reducer:int, productID:int, site:str) -> ee.FeatureCollection:
+    """
+    Reduz as imagens processadas de um local, como 'reduction', mas retorna
+    uma tabela (uma feição sem geometria por imagem, com as propriedades
+    'site' e 'img_date') em vez de executar a requisição, para que ela seja
+    exportada por uma tarefa em lote.
+    """
+    selectedVars, selectedBands = projectColumns(
+        output_columns, export_vars, list({*bands.values()}) + export_bands, 
+        REDUCTION_SPECS[reducer]["sufix"])
+    paramList = ee.List(selectedVars)
+    band = PRODUCT_SPECS[productID]["scaleRefBand"]
+    eeReducer = getReducer(reducer) if selectedBands != [] else None
+
+    def toFeature(image):
+        image = ee.Image(image)
+        props = ee.Dictionary.fromLists(
+            paramList, paramList.map(lambda paramName: image.get(ee.String(paramName)))
+            ).set("site", site).set("img_date", image.get("img_date"))
+        if eeReducer is not None:
+            scale = image.select(band).projection().nominalScale()
+            props = projectBands(image, selectedBands).reduceRegion(
+                reducer=eeReducer, geometry=aoi, scale=scale, 
+                bestEffort=True).combine(props)
+        return ee.Feature(None, props)
+
+    return ee.FeatureCollection(ee.ImageCollection(image_collection).map(toFeature))
+
 def loadInputDF(running_mode, input_file, input_path, input_dir):       
+    """
+    Lê o arquivo de entrada (CSV ou KML) para o data frame global
+    'input_df' e retorna o modo de execução, que é determinado pelas
+    colunas do arquivo quando igual a 0.
+    """
+    global input_df, user_df
+
     if running_mode < 3:
         # If a kml was pointed as input file...
-        if input_file[-4:] == ".kml":
-            print("Building input data frame...")
+        if input_file[-4:] in [".kml", ".kmz"]:
+            logger.info("Building input data frame...")
             aoi_mode = "kml"
             running_mode = 2
             
             if input_file == "*.kml":
-                kmlFiles = [f for f in os.listdir(input_dir) if os.path.isfile(os.path.join(input_dir, f)) and f[-4:] == ".kml"]
+                kmlFiles = [f for f in os.listdir(input_dir) if os.path.isfile(os.path.join(input_dir, f)) and f[-4:] in [".kml", ".kmz"]]
             else:
                 kmlFiles = [input_file]
             user_df = pd.DataFrame(columns = ["id","start_date","end_date"])
             nKmlFiles = len(kmlFiles)
             if nKmlFiles == 0:
-                print("(!) No kml file was found in the folder '" + input_dir + "'.")
+                logger.error("(!) No kml file was found in the folder '" + input_dir + "'.")
                 sys.exit(1)
             for i in range(nKmlFiles):
                 siteID = kmlFiles[i][:-4]
                 user_df.loc[i] = [siteID, "auto", None]
         else:
-            print("Opening the input file...")
+            logger.info("Opening the input file...")
             # Read the CSV file.
             try:
                 user_df = pd.read_csv(input_path)
-                print(user_df.dtypes)
+                logger.debug(user_df.dtypes)
 
             except Exception as e:
-                print("(!) Could not read the input file.")
+                logger.error("(!) Could not read the input file.")
                 raise Exception(e)
         input_df = user_df.copy()
         colnames = [c.lower() for c in [*input_df.columns]]
@@ -1683,6 +1954,8 @@ def loadInputDF(running_mode, input_file, input_path, input_dir):
         elif running_mode == 0:
             running_mode = 1
 
+    return running_mode
+
 # Convert a 'date-ranges' to a 'specific-dates' data frame.
 def toSpecificDatesDF(input_df):
     """
@@ -1692,15 +1965,14 @@ def toSpecificDatesDF(input_df):
     colnames = [c.lower() for c in [*input_df.columns]]
 
     for i in colnames:
-        print(i, type(i))
+        logger.debug(str(i) + " " + str(type(i)))
 
     
-    if (all(col in colnames for col in ["lat", "long", 
+    if not (all(col in colnames for col in ["lat", "long", 
                                         "start_date", "end_date"]
         ) or all(col in colnames for col in ["id", "start_date", 
                                              "end_date"])
         ):
-        print("(!)")
         raise Exception(
             "The input CSV file should have the columns 'start_date', 'end_date' and 'id' or 'lat' and 'long'."
             )
@@ -1727,6 +1999,10 @@ def toSpecificDatesDF(input_df):
     else:
         exportColumns.extend([lat_col, long_col])
 
+    # Position in the original input (sharded runs):
+    if INPUT_ROW_COL in colnames:
+        exportColumns.append(colnames.index(INPUT_ROW_COL))
+
     nrows = input_df.shape[0]
     tmpList = []
 
@@ -1758,7 +2034,7 @@ def toSpecificDatesDF(input_df):
             pass
 
         if not nDates > 0:
-            print("(!) Could not interpret the date range defined by 'start_date' and 'end_date' in row #" 
+            logger.warning("(!) Could not interpret the date range defined by 'start_date' and 'end_date' in row #" 
                   + str(row_i + 1) + " of the input CSV file. The row was ignored.")
             continue
         
@@ -1767,7 +2043,423 @@ def toSpecificDatesDF(input_df):
             tmpDF[input_df.columns[c]] = input_df.iloc[row_i, c]
         tmpList.append(tmpDF)
     
-    input_df = pd.concat(tmpList)
+    return pd.concat(tmpList, ignore_index=True)
+
+
+# Repeat each valid row for the adjacent dates defined by the time window.
+def expandTimeWindow(template_df:pd.DataFrame, validRows:list, date_col:int, time_window:int):
+    """
+    Expande o data frame de entrada repetindo cada linha válida para as datas
+    adjacentes definidas pela janela temporal. A coluna "img_date", com a data
+    de cada repetição, é inserida logo após a coluna de data.
+
+    Args:
+        template_df: Data frame de entrada.
+        validRows: Índices das linhas válidas.
+        date_col: Índice da coluna de data.
+        time_window: Número de dias antes e depois de cada data.
+    
+    Returns:
+        Uma tupla com o data frame expandido e os índices das suas linhas válidas.
+    """
+    nrows = template_df.shape[0]
+    window_size = 1 + (time_window * 2)
+    nrows_tmp = len(validRows) * window_size + (nrows - len(validRows))
+    tmpDF = pd.DataFrame(index=range(nrows_tmp), columns=template_df.columns)
+    imgDate = pd.Series(index=range(nrows_tmp), name="img_date", dtype="float64")
+    row_j = 0
+    validRows_new = []
+
+    for row_i in range(nrows):
+        if row_i in validRows:
+            date_j = pd.Timestamp(
+                template_df.iloc[row_i, date_col]
+                ) - pd.Timedelta(time_window, "day")
+        
+            for window_i in range(window_size):
+                validRows_new.append(row_j)
+                tmpDF.iloc[row_j] = template_df.iloc[row_i]
+                imgDate[row_j] = date_j.date()
+                date_j = date_j + pd.Timedelta(1, "day")
+                row_j = row_j + 1
+
+        else:            
+            tmpDF.iloc[row_j] = template_df.iloc[row_i]
+            row_j = row_j + 1
+
+    tmpDF.insert(date_col + 1, "img_date", imgDate)
+    return tmpDF, validRows_new
+
+
+# Save the data retrieved by 'reduction' in a result data frame.
+def storeResult(resultBuffer:ResultBuffer, result:dict, dayRows:dict, 
+                prefix:str = "", bandRenaming:list = None):
+    """
+    Copia os valores retornados por 'reduction' (um dicionário por data) para
+    as linhas dos resultados com a mesma data.
+
+    Args:
+        resultBuffer: Colunas de resultados de um código de processamento.
+        result: Dicionário {data: {variável: valor}} retornado por 'reduction'.
+        dayRows: Dicionário {número do dia: índices das linhas} do site 
+            processado (ver 'groupRows').
+        prefix: Prefixo adicionado ao nome das colunas (código de processamento).
+        bandRenaming: Pares (banda do produto, nome comum) para o modo 'append'.
+    """
+    for date in [*result]:
+        sameDateRows = dayRows.get(dateToDay(date), [])
+        
+        for band in [*result[date]]:
+            colNames = []
+            if bandRenaming is not None:
+                for realBandName, commonBandName in bandRenaming:
+                    if realBandName + "_" in band:
+                        colNames.append(band.replace(realBandName, commonBandName))
+            elif prefix != "":
+                colNames = [prefix + band]
+            if len(colNames) == 0:
+                colNames = [band]
+            for colName in colNames:
+                resultBuffer.set(sameDateRows, colName, result[date][band])
+
+
+# Add a result to a long-format output (or cube), each site receiving only 
+# the dates requested for it.
+def appendSiteResults(target, siteDays:list, processingCode:int, result:dict, 
+                      suffixes:list, bandRenaming:list = None):
+    """
+    Acrescenta o resultado de uma área de interesse a 'target' (um
+    'LongResultBuffer' ou 'CubeWriter'). A redução cobre a união das datas
+    dos locais com a mesma área de interesse; cada grupo de locais de
+    'siteDays' (ver 'groupSitesByDays') recebe somente as suas datas.
+    """
+    for sites, days in siteDays:
+        target.append(sites, processingCode, selectResultDays(result, days), 
+                      suffixes, bandRenaming)
+
+
+# Join the result data frames of the processing codes.
+def consolidateResults(resultDFs_dictio:dict, resultDF_template:pd.DataFrame, 
+                       append_mode:bool = False, running_mode:int = 1) -> pd.DataFrame:
+    """
+    Junta o data frame de entrada e os resultados de cada código de
+    processamento. No modo 'append', os resultados são empilhados (uma linha
+    por código); caso contrário, são colocados lado a lado.
+
+    Args:
+        resultDFs_dictio: Dicionário {código de processamento: resultados
+            ('ResultBuffer' ou data frame)}.
+        resultDF_template: Data frame de entrada (já expandido).
+        append_mode: Se os resultados devem ser empilhados.
+        running_mode: Modo de execução. No modo 2, linhas sem dados são removidas.
+    
+    Returns:
+        O data frame final de resultados.
+    """
+    nrows_result = resultDF_template.shape[0]
+    resultDF_template.reset_index(inplace = True, drop = True)
+    resultDFs_dictio = {k: v.toDataFrame() if isinstance(v, ResultBuffer) else v 
+                        for k, v in resultDFs_dictio.items()}
+
+    if append_mode:
+        # Get all column names.
+        cols = []
+        for k in resultDFs_dictio:
+            cols.extend([*resultDFs_dictio[k].columns])
+        cols = set(cols)
+        commonBandNames = [*PRODUCT_SPECS[101]["commonBands"].keys()]
+        # Reorder columns.
+
+        for k in resultDFs_dictio:
+            tmpDF = pd.DataFrame()
+            for col in cols:
+                wosuffix = col.split("_")[0]                    
+                if not wosuffix in commonBandNames:
+                    if col in [*resultDFs_dictio[k].columns]:
+                        tmpDF[col] = resultDFs_dictio[k][col]
+                    else:
+                        tmpDF[col] = math.nan
+            tmpDF = tmpDF.reindex(sorted(tmpDF.columns), axis=1)
+
+            for band in commonBandNames:
+                matches = [col for col in cols if (band + "_") in col]
+                for col in matches:
+                    if col in [*resultDFs_dictio[k].columns]:
+                        tmpDF[col] = resultDFs_dictio[k][col]
+                    else:
+                        tmpDF[col] = math.nan
+            dataColNames = tmpDF.columns
+            resultDFs_dictio[k] = tmpDF
+            prodID = int(str(k)[0:3])
+            sensor = PRODUCT_SPECS[prodID]["sensor"]
+            resultDFs_dictio[k] = pd.concat([
+                pd.DataFrame({"ProcCode": [k] * nrows_result, 
+                              "Source": [sensor] * nrows_result}), 
+                              resultDFs_dictio[k]], axis = 1, sort = False)
+            resultDFs_dictio[k] = pd.concat([
+                resultDF_template, resultDFs_dictio[k]], 
+                axis = 1, sort = False)
+        
+            if(running_mode == 2):
+                resultDFs_dictio[k].dropna(
+                    subset = dataColNames, how = "all", inplace = True)
+        resultDF = pd.concat([*resultDFs_dictio.values()], sort = False)
+    else:
+        dataDF = pd.concat([*resultDFs_dictio.values()], axis = 1, sort = False)
+        resultDF = pd.concat([resultDF_template, dataDF], axis = 1, sort = False)
+        # Remove empty rows (if in running mode 2):
+        if(running_mode == 2):
+            resultDF.dropna(subset = dataDF.columns, how = "all", inplace = True)
+    
+    return resultDF
+
+
+# Names of the variables produced by an estimation algorithm.
+def estimationVarNames(algo:int) -> list:
+    """
+    Retorna os nomes das variáveis (bandas) produzidas por um algoritmo de
+    estimação.
+    """
+    varName = ESTIMATION_ALGO_SPECS[algo]["paramName"]
+    if not isinstance(varName, list):
+        varName = [varName]
+    return [v for v in varName if v != ""]
+
+
+# Variables estimated in a processing group for codes other than the given one.
+def groupExcludedVars(procGroup:dict, processingCode:int) -> list:
+    """
+    Retorna as variáveis estimadas no grupo de processamento (ver
+    'planProcessing') por algoritmos de outros códigos, que devem ser
+    removidas do resultado do código informado.
+    """
+    ownAlgo = procGroup["code_estimation_algos"][processingCode]
+    return [v for a in procGroup["estimation_algos"] if a != ownAlgo 
+            for v in estimationVarNames(a)]
+
+
+# Pairs (product band, common band name) used to rename the results in append mode.
+def commonBandRenaming(productID:int) -> list:
+    """
+    Retorna os pares (banda do produto, nome comum), como ('sur_refl_b01',
+    'red'), usados para renomear as colunas de resultados no modo 'append'.
+    """
+    commonBandNames = [k for k,v in PRODUCT_SPECS[productID][
+        "commonBands"].items() if v >= 0]
+    commonBandInds = [PRODUCT_SPECS[productID][
+        "commonBands"][k] for k in commonBandNames]
+    realBandNames = [PRODUCT_SPECS[productID][
+        "bandList"][i] for i in commonBandInds]
+    return list(zip(realBandNames, commonBandNames))
+
+
+# Run the site tables of each processing code as export tasks.
+def batchRetrieval(batchTables:dict, task_service, sites_per_task:int = 50, 
+                   max_concurrent_tasks:int = MAX_CONCURRENT_TASKS, 
+                   poll_interval:float = TASK_POLL_INTERVAL, 
+                   on_site_done = None) -> dict:
+    """
+    Agrupa as tabelas dos locais (ver 'reductionTable') em lotes de
+    'sites_per_task' locais, exporta cada lote (por código de processamento)
+    como uma tarefa e converte as tabelas exportadas de volta para o formato
+    de 'reduction'.
+
+    Args:
+        batchTables: Dicionário {código de processamento: lista de tuplas
+            (local, tabela, redutor, bandas reduzidas, variáveis de outros
+            códigos)}.
+        task_service: Serviço de tarefas ('EETaskService' ou 'LocalTaskService').
+        sites_per_task: Número de locais por tarefa.
+        max_concurrent_tasks: Número máximo de tarefas simultâneas.
+        poll_interval: Intervalo, em segundos, entre as verificações das tarefas.
+        on_site_done: Função chamada com cada local assim que terminam 
+            (com sucesso ou não) todas as tarefas que o incluem.
+
+    Returns:
+        Dicionário {código de processamento: {local: {data: {variável: valor}}}}.
+        Locais de tarefas que falharam não são incluídos.
+    """
+    jobs = []
+    chunkInfo = {}
+    for processingCode, tables in batchTables.items():
+        for chunk_i in range(math.ceil(len(tables) / sites_per_task)):
+            chunk = tables[chunk_i * sites_per_task:(chunk_i + 1) * sites_per_task]
+            key = (processingCode, chunk_i)
+            chunkInfo[key] = {t[0]: (t[2], t[3], t[4]) for t in chunk}
+            collection = ee.FeatureCollection([t[1] for t in chunk]).flatten()
+            jobs.append((key, collection, 
+                         "geedar_" + str(processingCode) + "_" + str(chunk_i)))
+
+    # Number of unfinished tasks of each site.
+    remainingTasks = {}
+    for info in chunkInfo.values():
+        for site in info:
+            remainingTasks[site] = remainingTasks.get(site, 0) + 1
+
+    def taskDone(key):
+        for site in chunkInfo[key]:
+            remainingTasks[site] = remainingTasks[site] - 1
+            if remainingTasks[site] == 0 and on_site_done is not None:
+                on_site_done(site)
+
+    logger.info("Running " + str(len(jobs)) + " export tasks...")
+    tables = runTasks(task_service, jobs, max_concurrent_tasks, poll_interval, 
+                      on_done=taskDone)
+
+    results = {}
+    for (processingCode, chunk_i), rows in tables.items():
+        if rows is None:
+            continue
+        siteResults = results.setdefault(processingCode, {})
+        for site in chunkInfo[(processingCode, chunk_i)]:
+            siteResults.setdefault(site, {})
+        for row in rows:
+            row = dict(row)
+            site = str(row.pop("site"))
+            siteResults.setdefault(site, {})[row.pop("img_date")] = row
+        for site, (reducer, reducedBands, excludedVars) in chunkInfo[(processingCode, chunk_i)].items():
+            siteResults[site] = splitResult(
+                renameReducedBands(siteResults[site], reducer, reducedBands), 
+                excludedVars, REDUCTION_SPECS[reducer]["sufix"])
+    return results
+
+
+# Find the KML/KMZ file of a site.
+def findSiteKML(input_dir:str, site:str) -> str:
+    """
+    Procura o arquivo KML (ou KMZ) de um local no diretório de entrada e em
+    sua subpasta 'KML'. Retorna uma string vazia se não for encontrado.
+    """
+    searchPaths = [os.path.join(input_dir, site + ".kml"), 
+                   os.path.join(input_dir, "KML", site + ".kml"), 
+                   os.path.join(input_dir, site + ".kmz"), 
+                   os.path.join(input_dir, "KML", site + ".kmz")]
+    for searchPath in searchPaths:
+        if os.path.isfile(searchPath):
+            return searchPath
+    return ""
+
+
+# Area of interest of a single site, from its KML file or its coordinates.
+def siteGeometry(site:dict, aoi_mode:str = "radius", aoi_radius:int = 1000, 
+                 input_dir:str = "") -> ee.Geometry:
+    """
+    Área de interesse de um local fora de 'specificDatesRetrieval' (por
+    exemplo, nos processos de trabalho da API assíncrona): o polígono do seu
+    arquivo KML, no modo 'kml', ou o círculo de raio 'aoi_radius' (metros)
+    em torno das suas coordenadas.
+
+    Args:
+        site: Dicionário com 'id' e, fora do modo 'kml', 'lat' e 'long'.
+    """
+    if aoi_mode == "kml":
+        kmlFile = findSiteKML(input_dir, str(site.get("id")))
+        polygons = polygonFromKML(kmlFile) if kmlFile != "" else []
+        if polygons == []:
+            raise Exception("No area of interest was found for the site '" 
+                            + str(site.get("id")) + "'.")
+        return ee.Geometry.MultiPolygon(polygons)
+    return ee.Geometry.Point(coords = [site["long"], site["lat"]]).buffer(aoi_radius)
+
+
+# Define the area of interest of each site, grouping sites with identical AOIs.
+def defineSiteAOIs(siteList:list, siteRows:dict, aoi_mode:str, input_dir:str, 
+                   resultDF_template:pd.DataFrame, lat_col:int, long_col:int, 
+                   aoi_radius:int, simplify_tolerance:float = None, 
+                   min_area:float = None) -> dict:
+    """
+    Define a área de interesse (AOI) de cada local, a partir do seu arquivo
+    KML ou das suas coordenadas e do raio, e agrupa os locais cujas AOIs são
+    idênticas (coordenadas arredondadas e raio, ou hash do polígono), para
+    que cada AOI seja processada uma única vez. Locais sem AOI válida são
+    ignorados.
+
+    Args:
+        siteList: Locais, na ordem de processamento.
+        siteRows: Dicionário {local: índices das linhas do local}.
+        aoi_mode: 'kml' ou outro valor (ponto e raio).
+        input_dir: Diretório dos arquivos KML.
+        resultDF_template: Data frame de entrada (já expandido).
+        lat_col, long_col: Índices das colunas de latitude e longitude.
+        aoi_radius: Raio, em metros, das AOIs circulares.
+        simplify_tolerance: Tolerância (metros) da simplificação dos polígonos.
+            Se 'None', os polígonos não são simplificados.
+        min_area: Área mínima (m²) das partes dos polígonos simplificados.
+
+    Returns:
+        Dicionário {chave da AOI: {"sites", "rows", "polygons", "point"}}, na
+        ordem dos locais.
+    """
+    siteAOIs = {}
+    for site in siteList:
+        polygons = None
+        point = None
+        if aoi_mode == "kml":
+            kmlFile = findSiteKML(input_dir, site)
+            if kmlFile == "":
+                logger.warning("(!) File " 
+                      + site + ".kml was not found. The site was ignored.")
+                continue
+            polygons = polygonFromKML(kmlFile)
+            if simplify_tolerance is not None and polygons != []:
+                nVertices = countVertices(polygons)
+                polygons = simplifyPolygons(polygons, simplify_tolerance, 
+                                            min_area = min_area)
+                logger.debug("AOI simplified from " + str(nVertices) 
+                             + " to " + str(countVertices(polygons)) + " vertices.")
+            if polygons == []:
+                logger.warning("(!) A polygon could not be extracted from the file " 
+                      + kmlFile + ". The site was ignored.")
+                continue
+            key = polygonAOIKey(polygons)
+        else:
+            # Check if lat/long coordinates are the same for the site.
+            lats = [*resultDF_template.iloc[siteRows[site], lat_col]]
+            firstLat = lats[0]
+            longs = [*resultDF_template.iloc[siteRows[site], long_col]]
+            firstLong = longs[0]
+
+            if (not all(i == firstLat for i in lats)
+                ) or (not all(i == firstLong for i in longs)):
+                logger.warning("(!) Coordinates of the site " + str(site) 
+                               + " were not all the same. The first pair was used.")
+            point = [firstLong, firstLat]
+            key = pointAOIKey(firstLat, firstLong, aoi_radius)
+
+        siteAOI = siteAOIs.setdefault(
+            key, {"sites": [], "rows": [], "polygons": polygons, "point": point})
+        siteAOI["sites"].append(site)
+        siteAOI["rows"].extend(siteRows[site])
+
+    for siteAOI in siteAOIs.values():
+        siteAOI["rows"].sort()
+    nDuplicates = sum(len(a["sites"]) - 1 for a in siteAOIs.values())
+    if nDuplicates > 0:
+        logger.info(str(nDuplicates) + " sites share the area of interest of another site.")
+        incrementCounter("deduplicated_sites", nDuplicates)
+    return siteAOIs
+
+
+# Order the areas of interest by acquisition tile and spatial proximity.
+def spatialSiteOrder(siteAOIs:dict, productID:int) -> dict:
+    """
+    Reordena as áreas de interesse (ver 'defineSiteAOIs') de modo que as que
+    estão no mesmo tile da grade de aquisição do produto sejam processadas em
+    sequência. Usa os polígonos já carregados (ou o ponto) de cada AOI, sem
+    ler os arquivos KML novamente.
+    """
+    boxes = {}
+    for key, siteAOI in siteAOIs.items():
+        if siteAOI["polygons"] is not None:
+            boxes[key] = polygonsBoundingBox(siteAOI["polygons"])
+        else:
+            long, lat = siteAOI["point"]
+            boxes[key] = (long, lat, long, lat)
+
+    schedule = scheduleSites(boxes, productID)
+    logger.info(str(len(boxes)) + " areas of interest grouped in " 
+                + str(len(schedule)) + " tiles.")
+    return {key: siteAOIs[key] for _, keys in schedule for key in keys}
 
 
 # Retrieve data in the 'speficic-dates' mode.
@@ -1790,10 +2482,41 @@ def specificDatesRetrieval(
         product_ids:list = [101,102,301,
                             302,303,201], 
         processing_codes:list = [10110001,10210001,30109001,
-                                                  30209001,30309001,20109001]
+                                                  30209001,30309001,20109001],
+        graph_report_path:str = "",
+        simplify_aoi:bool = False,
+        site_order:str = "input",
+        execution_mode:str = "interactive",
+        batch_asset_root:str = "",
+        sites_per_task:int = 50,
+        max_concurrent_tasks:int = MAX_CONCURRENT_TASKS,
+        task_service = None,
+        share_processing:bool = True,
+        fuse_reducers:bool = True,
+        merge_families:bool = False,
+        columns:list = None,
+        dry_run:bool = False,
+        output_format:str = "wide",
+        single_precision:bool = False,
+        result_sink = None,
+        cube_path:str = "",
+        stop_event = None
         ):
     """
-    Recupera dados no modo específico de datas
+    Recupera dados no modo específico de datas. Com 'dry_run', as imagens não
+    são consultadas e o retorno é a estimativa de 'estimateRetrieval'. Com
+    'output_format' igual a 'long', o retorno tem uma linha por local, data,
+    código de processamento, variável e estatística (ver 'LongResultBuffer'),
+    sem as colunas da entrada. Com 'output_format' igual a 'cube', os 
+    resultados são escritos, à medida que chegam, no cubo em disco 
+    'cube_path' (ver 'CubeWriter'), e o retorno é o cubo aberto para leitura
+    ('openCube'). Com 'single_precision', as estatísticas do formato 'wide'
+    são guardadas em 'float32' (ver 'ResultBuffer'). Se 'result_sink' for
+    informado, cada resultado (local e código de processamento) é passado a
+    ele como um data frame no formato longo assim que é recuperado, sem ser
+    acumulado, e o retorno é 'None' (ver 'iterResults'). Se 'stop_event' (um
+    'threading.Event') for sinalizado, a recuperação é interrompida antes do
+    próximo local ou grupo de datas, com a exceção 'RetrievalCancelled'.
     """
 
     #global image_collection
@@ -1801,395 +2524,623 @@ def specificDatesRetrieval(
     global aoi, export_bands, export_vars
     global input_df
     global time_window
+    global output_columns
 
-    nProcCodes = len(processing_codes)
-    export_bands = []
-    export_vars = []
-
-    if running_mode == 2:
-        time_window = 0
-        print("Converting the date-range format to the specific-dates format...")
-        toSpecificDatesDF()
+    logToken = bindLogContext()
+    # Cleaned up in 'finally', also when the retrieval fails or is cancelled.
+    cube = None
+    progressStarted = False
+    try:
+        if not site_order in ["input", "spatial"]:
+            raise Exception("'site_order' must be 'input' or 'spatial'.")
+        if not execution_mode in ["interactive", "batch"]:
+            raise Exception("'execution_mode' must be 'interactive' or 'batch'.")
+        if not output_format in ["wide", "long", "cube"]:
+            raise Exception("'output_format' must be 'wide', 'long' or 'cube'.")
+        if output_format == "cube" and cube_path == "":
+            raise Exception("The 'cube' output format requires 'cube_path'.")
+
+        nProcCodes = len(processing_codes)
+        # Polygon simplification tolerance (meters) and minimum part area (m²),
+        # based on the finest product requested.
+        finestScale = min(PRODUCT_SPECS[p]["roughScale"] for p in product_ids)
+        simplifyTolerance = SIMPLIFY_FACTOR * finestScale
+        export_bands = []
+        export_vars = []
+        output_columns = columns
+        if columns is not None and append_mode:
+            # The output columns use the common band names (e.g. 'red_median'),
+            # but the projection is done on the product bands.
+            output_columns = productColumns(
+                columns, [pair for p in product_ids for pair in commonBandRenaming(p)])
+        resetRunReport()
+        enableRunReport(graph_report_path != "")
+
+        if running_mode == 2:
+            time_window = 0
+            logger.info("Converting the date-range format to the specific-dates format...")
+            with stageTimer("date_expansion"):
+                input_df = toSpecificDatesDF(input_df)
     
-    print("Checking data in the input file...")
+        logger.info("Checking data in the input file...")
     
-    # Data frame attributes:
-    colnames = [c.lower() for c in [*input_df.columns]]
-    nrows = input_df.shape[0]
-    ncols = input_df.shape[1]
+        # Data frame attributes:
+        colnames = [c.lower() for c in [*input_df.columns]]
+        nrows = input_df.shape[0]
+        ncols = input_df.shape[1]
 
-    # Check if the data frame has enough rows and columns:
-    if nrows < 1:
-        print("(!)")
-        raise Exception(
-            "The input CSV file must have a header row and at least one data row.")
+        # Check if the data frame has enough rows and columns:
+        if nrows < 1:
+            raise Exception(
+                "The input CSV file must have a header row and at least one data row.")
     
-    if ncols < 3 and aoi_mode != "kml":
-        print("(!)")
-        raise Exception(
-            "The input CSV file must have a header and at least three columns "
-            + "(date, lat, long), unless you are defining your sites trough KML "
-            + "files (option -k), in which case the minimum required columns are"
-            + " 'date' and 'id'.")
+        if ncols < 3 and aoi_mode != "kml":
+            raise Exception(
+                "The input CSV file must have a header and at least three columns "
+                + "(date, lat, long), unless you are defining your sites trough KML "
+                + "files (option -k), in which case the minimum required columns are"
+                + " 'date' and 'id'.")
     
-    if ncols < 2 and aoi_mode == "kml":
-        print("(!)")
-        raise Exception(
-            "If you choose to define the regions of interest trough KML files,"
-            + "the input CSV file must include, at least, the columns 'date'"
-            +" and 'id'. The KML files' names must be equal to the corresponding"
-            +" 'id' plus the extension '.kml' and the files must be in the same "
-            + "folder as the CSV file.")
+        if ncols < 2 and aoi_mode == "kml":
+            raise Exception(
+                "If you choose to define the regions of interest trough KML files,"
+                + "the input CSV file must include, at least, the columns 'date'"
+                +" and 'id'. The KML files' names must be equal to the corresponding"
+                +" 'id' plus the extension '.kml' and the files must be in the same "
+                + "folder as the CSV file.")
     
-    # Update, if possible, the index of the "date" column.
-    try:
-        date_col = colnames.index("date")
-    except ValueError:
-        pass
+        # Update, if possible, the index of the "date" column.
+        try:
+            date_col = colnames.index("date")
+        except ValueError:
+            pass
     
-    # Check the date values:
-    try:
-        pdDates = pd.to_datetime(input_df.iloc[:,date_col])
-        input_df.iloc[:, date_col] = pd.Series(pdDates).dt.date
-    except:
-        print("(!)")
-        raise Exception(
-            "The date column in the input file must have valid date values "
-            + "in the format yyyy-mm-dd.")
-        
-    # Update, if possible, the index of the (site) "id" column.
-    try:
-        id_col = colnames.index("id")
-    except ValueError:
-        if ncols < 4 and aoi_mode != "kml":
-            id_col = -1
-            lat_col = lat_col - 1
-            long_col = long_col - 1
-    else:
-        if ncols < 4 and aoi_mode != "kml":
-            print("(!)")
+        # Check the date values:
+        try:
+            pdDates = pd.to_datetime(input_df.iloc[:,date_col])
+            input_df.iloc[:, date_col] = pd.Series(pdDates).dt.date
+        except:
             raise Exception(
-                "The input CSV file must include, at least, the columns "
-                + " 'date', 'lat' and 'long', unless you define your sites "
-                + "of interest through kml files (option -k), in which case the"
-                + "'date' and 'id' columns are enough.") 
+                "The date column in the input file must have valid date values "
+                + "in the format yyyy-mm-dd.")
+        
+        # Update, if possible, the index of the (site) "id" column.
+        try:
+            id_col = colnames.index("id")
+        except ValueError:
+            if ncols < 4 and aoi_mode != "kml":
+                id_col = -1
+                lat_col = lat_col - 1
+                long_col = long_col - 1
+        else:
+            if ncols < 4 and aoi_mode != "kml":
+                raise Exception(
+                    "The input CSV file must include, at least, the columns "
+                    + " 'date', 'lat' and 'long', unless you define your sites "
+                    + "of interest through kml files (option -k), in which case the"
+                    + "'date' and 'id' columns are enough.") 
     
-    # Update, if possible, the index of the lat column.
-    try:
-        lat_col = colnames.index("lat")
-    except ValueError:
-        if aoi_mode == "kml":
-            lat_col = -1
+        # Update, if possible, the index of the lat column.
+        try:
+            lat_col = colnames.index("lat")
+        except ValueError:
+            if aoi_mode == "kml":
+                lat_col = -1
         
-    # Update, if possible, the index of the long column.
-    try:
-        long_col = colnames.index("long")
-    except ValueError:
+        # Update, if possible, the index of the long column.
+        try:
+            long_col = colnames.index("long")
+        except ValueError:
+            if aoi_mode == "kml":
+                long_col = -1
+
+        # Unknown id column?
+        if id_col == date_col or id_col == lat_col or id_col == long_col:
+            if aoi_mode == "kml":
+                raise Exception(
+                    "The column containing the sites' name could not be identified." 
+                    + " Please, name it as 'id'.")
+            else:
+                id_col = -1
+
+        # Check the lat/long values:
+        if aoi_mode != "kml":
+            if (not pd.api.types.is_numeric_dtype(input_df.iloc[:, lat_col])
+                ) or ((not pd.api.types.is_numeric_dtype(input_df.iloc[:, long_col]))):
+                raise Exception(
+                    "'lat' and 'long' values in the input file must be in decimal degrees.")
+    
+        # Get the indices of the valid rows (no NaN nor None):
         if aoi_mode == "kml":
-            long_col = -1
+            validIDs = input_df.iloc[:,id_col].notna()
+            validLats = True
+            validLongs = True
 
-    # Unknown id column?
-    if id_col == date_col or id_col == lat_col or id_col == long_col:
-        if aoi_mode == "kml":
-            print("(!)")
-            raise Exception(
-                "The column containing the sites' name could not be identified." 
-                + " Please, name it as 'id'.")
         else:
-            id_col = -1
-
-    # Check the lat/long values:
-    if aoi_mode != "kml":
-        if (not pd.api.types.is_numeric_dtype(input_df.iloc[:, lat_col])
-            ) or ((not pd.api.types.is_numeric_dtype(input_df.iloc[:, long_col]))):
-            print("(!)")
-            raise Exception(
-                "'lat' and 'long' values in the input file must be in decimal degrees.")
-    
-    # Get the indices of the valid rows (no NaN nor None):
-    if aoi_mode == "kml":
-        validIDs = input_df.iloc[:,id_col].notna()
-        validLats = True
-        validLongs = True
+            validIDs = True
+            validLats = input_df.iloc[:,lat_col].notna()
+            validLongs = input_df.iloc[:,long_col].notna()
 
-    else:
-        validIDs = True
-        validLats = input_df.iloc[:,lat_col].notna()
-        validLongs = input_df.iloc[:,long_col].notna()
-
-    validRows = which(input_df.iloc[:,date_col].notna() 
-                      & validLats & validLongs & validIDs)
+        validRows = which(input_df.iloc[:,date_col].notna() 
+                          & validLats & validLongs & validIDs)
     
-    if len(validRows) < 1:
-        print("(!)")
-        raise Exception(
-            "The input CSV file has no valid rows (rows with no missing data).")
-
-    # Results' data frame template:
-    resultDF_template = input_df.copy()
-    # Add the adjacents dates according to the time window.
-    nrows_result = nrows
-
-    if time_window != 0:
-        print("Expanding the input data to meet the time_window parameter (" 
-              + str(time_window) + ")...")
-        window_size = 1 + (time_window * 2)
-        nrows_tmp = len(validRows) * window_size + (nrows - len(validRows))
-        tmpDF = pd.DataFrame(index=range(nrows_tmp), columns=resultDF_template.columns)
-        imgDate = pd.Series(index=range(nrows_tmp), name="img_date", dtype="float64")
-        row_j = 0
-        validRows_new = []
-
-        for row_i in range(nrows):
-            if row_i in validRows:
-                date_j = pd.Timestamp(
-                    resultDF_template.iloc[row_i, date_col]
-                    ) - pd.Timedelta(time_window, "day")
-                
-                for window_i in range(window_size):
-                    validRows_new.append(row_j)
-                    tmpDF.iloc[row_j] = resultDF_template.iloc[row_i]
-                    imgDate[row_j] = date_j.date()
-                    date_j = date_j + pd.Timedelta(1, "day")
-                    row_j = row_j + 1
-
-            else:            
-                tmpDF.iloc[row_j] = resultDF_template.iloc[row_i]
-                row_j = row_j + 1
-
-        tmpDF.insert(date_col + 1, "img_date", imgDate)
-        ncols = ncols + 1
-        date_col = date_col + 1
-
-        if date_col <= id_col:
-            id_col = id_col + 1
-
-        if date_col <= lat_col:
-            lat_col = lat_col + 1
-
-        if date_col <= long_col:
-            long_col = long_col + 1   
-
-        resultDF_template = tmpDF.copy()        
-        nrows_result = nrows_tmp
-        validRows = validRows_new
+        if len(validRows) < 1:
+            raise Exception(
+                "The input CSV file has no valid rows (rows with no missing data).")
+
+        # Results' data frame template:
+        resultDF_template = input_df.copy()
+        # Add the adjacents dates according to the time window.
+        nrows_result = nrows
+
+        with stageTimer("date_expansion"):
+            if time_window != 0:
+                logger.info("Expanding the input data to meet the time_window parameter (" 
+                      + str(time_window) + ")...")
+                tmpDF, validRows_new = expandTimeWindow(
+                    resultDF_template, validRows, date_col, time_window)
+                ncols = ncols + 1
+                date_col = date_col + 1
+
+                if date_col <= id_col:
+                    id_col = id_col + 1
+
+                if date_col <= lat_col:
+                    lat_col = lat_col + 1
+
+                if date_col <= long_col:
+                    long_col = long_col + 1   
+
+                resultDF_template = tmpDF
+                nrows_result = tmpDF.shape[0]
+                validRows = validRows_new
     
-    # Get the unique site IDs:
-    if id_col >= 0:
-        siteSeries = resultDF_template.iloc[:,id_col].astype(str)
+        # Get the unique site IDs:
+        if id_col >= 0:
+            siteSeries = resultDF_template.iloc[:,id_col].astype(str)
 
-    else:
-        siteSeries = pd.Series(
-            [str([*resultDF_template.iloc[:, lat_col]][i]) 
-            + str([*resultDF_template.iloc[:, long_col]][i]) 
-            for i in range(nrows_result)]
-            )
+        else:
+            siteSeries = (resultDF_template.iloc[:, lat_col].astype(str) 
+                          + resultDF_template.iloc[:, long_col].astype(str))
     
-    siteList = siteSeries.iloc[validRows].unique().tolist()
-
-    # Result dictionary.
-    resultDFs_dictio = {}
-
-    for code_i in range(nProcCodes):
-        processingCode = processing_codes[code_i]
-        resultDFs_dictio[processingCode] = pd.DataFrame(
-            data=None, index=range(nrows_result))
+        # Sites as categorical codes and dates as day numbers; the rows of each 
+        # site and of each date are looked up in these maps instead of comparing 
+        # strings. Dates are formatted ('yyyy-mm-dd') only for the requests.
+        siteCodeList, siteList = siteCodes(siteSeries.iloc[validRows])
+        siteRows = {siteList[code]: rows for code, rows 
+                    in groupRows(siteCodeList, validRows).items()}
+        dayNumbers = toDayNumbers(resultDF_template.iloc[:, date_col])
+
+        # Result dictionary.
+        resultDFs_dictio = {}
+
+        for code_i in range(nProcCodes):
+            processingCode = processing_codes[code_i]
+            if output_format == "wide":
+                resultDFs_dictio[processingCode] = ResultBuffer(
+                    nrows_result, "float32" if single_precision else "float64")
+        # Results in the long format, appended as they arrive.
+        longResults = LongResultBuffer()
                  
-    # Data retrieval grouped by GEEDaR product and by site.
-    print("Processing started at " + str(pd.Timestamp.now()) + ".")
-    dataRetrieved = False
+        # Processing codes that share the image processing.
+        executionPlan = planProcessing(
+            processing_codes, product_ids, img_proc_algos, estimation_algos, reducers, 
+            {a: estimationVarNames(a) for a in set(estimation_algos)}, share_processing)
+        # Groups of products of the same family, reduced together.
+        executionRuns = familyRuns(executionPlan, PRODUCT_FAMILIES if merge_families else None)
+
+        # Site tables and result rows of the batch execution mode.
+        batchTables = {}
+        batchRows = {}
+        batchSites = {}
+        batchDays = {}
+
+        # Data retrieval grouped by GEEDaR product and by site.
+        logger.info("Processing started at " + str(pd.Timestamp.now()) + ".")
+        dataRetrieved = False
     
-    for site in siteList:
-        print("")
-        print("[Site] " + str(site))
-        targetRows = [i for i in which(siteSeries == site) if i in validRows]
-        dateList = [*pd.to_datetime(
-            resultDF_template.iloc[targetRows, date_col].sort_values()
-            ).dt.strftime("%Y-%m-%d").unique()]
-        aoi = None
-
-        if aoi_mode == "kml":
-            kmlFile = ""
-            searchPath1 = os.path.join(input_dir, site + ".kml")
-            searchPath2 = os.path.join(input_dir, "KML", site + ".kml")
-
-            if os.path.isfile(searchPath1):
-                kmlFile = searchPath1
-
-            elif os.path.isfile(searchPath2):
-                kmlFile = searchPath2
-                
-            if kmlFile == "":
-                print("(!) File " 
-                      + kmlFile + " was not found. The site was ignored.")
-                
-            else:
-                coords = polygonFromKML(kmlFile)
-                if coords != []:
-                    aoi = ee.Geometry.MultiPolygon(coords)
+        # Areas of interest of the sites. Sites with identical AOIs (e.g. the same
+        # station under different IDs) are processed only once.
+        with stageTimer("aoi_definition"):
+            siteAOIs = defineSiteAOIs(
+                siteList, siteRows, aoi_mode, input_dir, resultDF_template, 
+                lat_col, long_col, aoi_radius, 
+                simplifyTolerance if simplify_aoi else None, finestScale ** 2)
+
+        # Process neighbouring sites (same scenes) in sequence.
+        if site_order == "spatial":
+            with stageTimer("scheduling"):
+                siteAOIs = spatialSiteOrder(siteAOIs, product_ids[0])
+
+        if dry_run:
+            # Estimate the requests locally, assuming all dates are available.
+            aoiSizes = []
+            for siteAOI in siteAOIs.values():
+                if siteAOI["polygons"] is not None:
+                    area = polygonsArea(siteAOI["polygons"])
                 else:
-                    print("(!) A polygon could not be extracted from the file " 
-                          + kmlFile + ". The site was ignored.")
-        
-        else:                
-            # Check if lat/long coordinates are the same for the site.
-            lats = [*resultDF_template.iloc[targetRows, lat_col]]
-            firstLat = lats[0]
-            longs = [*resultDF_template.iloc[targetRows, long_col]]
-            firstLong = longs[0]
+                    area = math.pi * aoi_radius ** 2
+                aoiSizes.append({
+                    "sites": len(siteAOI["sites"]), 
+                    "dates": len(set(dayNumbers[siteAOI["rows"]].tolist())), 
+                    "area": area})
+            report = estimateRetrieval(
+                aoiSizes, executionRuns, 
+                {p: PRODUCT_SPECS[p]["roughScale"] for p in product_ids}, 
+                {a: IMG_PROC_ALGO_SPECS[a]["nSimImgs"] for a in img_proc_algos}, 
+                {a: IMG_PROC_ALGO_SPECS[a]["applicableTo"] for a in img_proc_algos}, 
+                max_n_proc_pixels, fuse_reducers, execution_mode, sites_per_task)
+            return report
+
+        # On-disk site x date x variable cube, filled as the results arrive.
+        if output_format == "cube":
+            cube = CubeWriter(cube_path, siteList, set(dayNumbers[validRows].tolist()))
+
+        startProgress(sum(len(siteAOI["sites"]) for siteAOI in siteAOIs.values()))
+        progressStarted = True
+
+        for siteAOI in siteAOIs.values():
+            checkCancelled(stop_event)
+            site = siteAOI["sites"][0]
+            bindLogContext(site=site, processing_code=None)
+            if len(siteAOI["sites"]) == 1:
+                logger.info("[Site] " + str(site))
+            else:
+                logger.info("[Site] " + str(site) + " (same area of interest as: " 
+                            + ", ".join(siteAOI["sites"][1:]) + ")")
+            targetRows = siteAOI["rows"]
+            dayRows = groupRows(dayNumbers[targetRows], targetRows)
+            dateList = [dayToDate(day) for day in dayRows]
+            siteDays = groupSitesByDays(siteAOI["sites"], siteRows, dayNumbers)
+            incrementCounter("sites", len(siteAOI["sites"]))
+            incrementCounter("dates", len(dateList))
 
-            if (not all(i == firstLat for i in lats)
-                ) or (not all(i == firstLong for i in longs)):
-                print("(!) Coordinates were not all the same. The first pair was used.")
             # Define the region of interest.
-            aoi = ee.Geometry.Point(coords = [firstLong, firstLat]).buffer(aoi_radius)
+            if siteAOI["polygons"] is not None:
+                aoi = ee.Geometry.MultiPolygon(siteAOI["polygons"])
+            else:
+                aoi = ee.Geometry.Point(coords = siteAOI["point"]).buffer(aoi_radius)
         
-        if not aoi is None:
-            # If more than one processing code was provided, run one by one.
-            for code_i in range(nProcCodes):
-                processingCode = processing_codes[code_i]
-                productID = product_ids[code_i]
-                imgProcAlgo = img_proc_algos[code_i]
-                estimationAlgo = estimation_algos[code_i]
-                reducer = reducers[code_i]
-                print("\n(" + str(processingCode) + ")")
+            if not aoi is None:
+                # Run the processing codes grouped by product and image processing 
+                # algorithm (see 'planProcessing') and, if 'merge_families', by 
+                # product family (see 'familyRuns').
+                for run in executionRuns:
+                    runCodes = [c for procGroup in run for c in procGroup["codes"]]
+                    codesLabel = ",".join(str(c) for c in runCodes)
+                    bindLogContext(processing_code=codesLabel)
+                    logger.info("(" + ", ".join(str(c) for c in runCodes) + ")")
                 
-                if not productID in IMG_PROC_ALGO_SPECS[
-                    imgProcAlgo]["applicableTo"]:
-                    print("(!) The image processing algorithm #" 
-                          + str(imgProcAlgo) 
-                          + " is not applicable to the product " 
-                          + str(productID) 
-                          + ". This data demand was ignored.")
-                    continue
-
-                # Get the available dates.
-                tmpDateList = getAvailableDates(productID, dateList)
-                availableDates = [d for d in dateList if d in tmpDateList]                
-                #if not len(availableDates) == 0:
-                #    availableDates = list(set(availableDates.sort()))
-                nAvailableDates = len(availableDates)
-                if nAvailableDates == 0:
-                    print("No available data.")
-                elif append_mode:
-                    # Get common band names (e.g. 'red', 'blue', etc.).
-                    commonBandNames = [k for k,v in PRODUCT_SPECS[productID][
-                        "commonBands"].items() if v >= 0]
-                    commonBandInds = [PRODUCT_SPECS[productID][
-                        "commonBands"][k] for k in commonBandNames]
-                    realBandNames = [PRODUCT_SPECS[productID][
-                        "bandList"][i] for i in commonBandInds]
+                    members = []
+                    for procGroup in run:
+                        if not procGroup["product_id"] in IMG_PROC_ALGO_SPECS[
+                            procGroup["img_proc_algo"]]["applicableTo"]:
+                            logger.warning("(!) The image processing algorithm #" 
+                                  + str(procGroup["img_proc_algo"]) 
+                                  + " is not applicable to the product " 
+                                  + str(procGroup["product_id"]) 
+                                  + ". This data demand was ignored.")
+                            continue
+                        members.append(procGroup)
+                    if members == []:
+                        continue
+                    runCodes = [c for procGroup in members for c in procGroup["codes"]]
+                    imgProcAlgo = members[0]["img_proc_algo"]
+                    productIDs = [procGroup["product_id"] for procGroup in members]
+                    codeGroups = {c: procGroup for procGroup in members 
+                                  for c in procGroup["codes"]}
+
+                    if execution_mode == "batch":
+                        # Only build the site's tables here; the export tasks are 
+                        # submitted once all sites are prepared.
+                        for procGroup in members:
+                            productID = procGroup["product_id"]
+                            with stageTimer("image_processing", processing_code=codesLabel):
+                                imageProcessing(imgProcAlgo, productID, dateList)
+                            with stageTimer("estimation", processing_code=codesLabel):
+                                estimation(procGroup["estimation_algos"], productID)
+                            reducedBands = list({*bands.values()}) + export_bands
+                            for processingCode in procGroup["codes"]:
+                                reducer = procGroup["code_reducers"][processingCode]
+                                batchTables.setdefault(processingCode, []).append(
+                                    (site, reductionTable(reducer, productID, site), reducer, 
+                                     reducedBands, groupExcludedVars(procGroup, processingCode)))
+                        batchRows[site] = dayRows
+                        batchSites[site] = siteAOI["sites"]
+                        batchDays[site] = siteDays
+                        continue
+
+                    # Get the available dates (of each product).
+                    with stageTimer("availability", processing_code=codesLabel):
+                        if len(members) == 1:
+                            memberDates = {productIDs[0]: getAvailableDates(productIDs[0], dateList)}
+                        else:
+                            memberDates = getFamilyAvailableDates(productIDs, dateList)
+                    availableDateSet = set().union(*memberDates.values())
+                    availableDates = [d for d in dateList if d in availableDateSet]
+                    #if not len(availableDates) == 0:
+                    #    availableDates = list(set(availableDates.sort()))
+                    nAvailableDates = len(availableDates)
+                    if nAvailableDates == 0:
+                        logger.info("No available data.")
+                        continue
                     #commonBandsDictio = {PRODUCT_SPECS[productID]["bandList"][v]:k for k,v in PRODUCT_SPECS[productID]["commonBands"].items() if v >= 0 and k in commonBandNames}
 
-                # Divide the request in groups to avoid exceeding GEE capacity.
-                # First, calculate the number of pixels in the region of interest.
-                # Then determine the number of images which correspond to a total of 100 000 pixels.
-                nPixelsInAoI = aoi.area().divide(math.pow(
-                    PRODUCT_SPECS[productID]["roughScale"], 2)).getInfo()
-                maxNImgs = math.ceil(max_n_proc_pixels/nPixelsInAoI)
-                group_len = min(maxNImgs, IMG_PROC_ALGO_SPECS[imgProcAlgo]["nSimImgs"])
-                nGroups = math.ceil(nAvailableDates / group_len)
-
-                for g in range(nGroups):
-                    dateSublist_inds = range(g * group_len, min(
-                        g * group_len + group_len, nAvailableDates))
-                    dateSublist = [availableDates[i] for i in dateSublist_inds]
-                    print("Requesting data for days " 
-                          + str(g * group_len + 1) 
-                          + "-" + str(min(g * group_len + group_len, nAvailableDates)) 
-                          + "/" + str(nAvailableDates) + "...")
-                    # Image processing, parameter estimation and reduction.
-                    imageProcessing(imgProcAlgo, productID, dateSublist)
-                    estimation(estimationAlgo, productID)
-                    result = reduction(reducer, productID)
-
-                    if result is None:
-                        print("(!) Failed to retrieve data.")
-
-                    elif result == {}:
-                        print("No data retrieved.")
-
-                    else:
-                        dataRetrieved = True
-                        # Save the retrieved data in the result data frame.
-
-                        for date in [*result]:
-                            sameDateRows = [i for i in which(
-                                resultDF_template.iloc[:,date_col
-                                                       ].astype("str") == date) if i in targetRows]
-                            
-                            for band in [*result[date]]:
-                                colNames = []
-                                if append_mode:
-                                    for i in range(len(commonBandNames)):
-                                        if realBandNames[i] + "_" in band:
-                                            colNames.append(band.replace(
-                                                realBandNames[i], commonBandNames[i]))
-                                elif nProcCodes > 1:
-                                    colNames = [str(processingCode) + "_" + band]
-                                if len(colNames) == 0:
-                                    colNames = [band]
-                                for row_i in sameDateRows:
-                                    for colName in colNames:
-                                        resultDFs_dictio[processingCode].loc[row_i, colName] = result[date][band]
-                        print("Data successfully retrieved.")
-
-    print("Processing finished at " + str(pd.Timestamp.now()) + ".")
-
-    if dataRetrieved:
-        print("Consolidating results...")
-        resultDF_template.reset_index(inplace = True, drop = True)
-
-        if append_mode:
-            # Get all column names.
-            cols = []
-            for k in resultDFs_dictio:
-                cols.extend([*resultDFs_dictio[k].columns])
-            cols = set(cols)
-            commonBandNames = [*PRODUCT_SPECS[101]["commonBands"].keys()]
-            # Reorder columns.
-
-            for k in resultDFs_dictio:
-                tmpDF = pd.DataFrame()
-                for col in cols:
-                    wosuffix = col.split("_")[0]                    
-                    if not wosuffix in commonBandNames:
-                        if col in [*resultDFs_dictio[k].columns]:
-                            tmpDF[col] = resultDFs_dictio[k][col]
-                        else:
-                            tmpDF[col] = math.nan
-                tmpDF = tmpDF.reindex(sorted(tmpDF.columns), axis=1)
-
-                for band in commonBandNames:
-                    matches = [col for col in cols if (band + "_") in col]
-                    for col in matches:
-                        if col in [*resultDFs_dictio[k].columns]:
-                            tmpDF[col] = resultDFs_dictio[k][col]
-                        else:
-                            tmpDF[col] = math.nan
-                dataColNames = tmpDF.columns
-                resultDFs_dictio[k] = tmpDF
-                prodID = int(str(k)[0:3])
-                sensor = PRODUCT_SPECS[prodID]["sensor"]
-                resultDFs_dictio[k] = pd.concat([
-                    pd.DataFrame({"ProcCode": [k] * nrows_result, 
-                                  "Source": [sensor] * nrows_result}), 
-                                  resultDFs_dictio[k]], axis = 1, sort = False)
-                resultDFs_dictio[k] = pd.concat([
-                    resultDF_template, resultDFs_dictio[k]], 
-                    axis = 1, sort = False)
-                
-                if(running_mode == 2):
-                    resultDFs_dictio[k].dropna(
-                        subset = dataColNames, how = "all", inplace = True)
-            resultDF = pd.concat([*resultDFs_dictio.values()], sort = False)
+                    # Divide the request in groups to avoid exceeding GEE capacity.
+                    # First, calculate the number of pixels in the region of interest.
+                    # Then determine the number of images which correspond to a total of 100 000 pixels.
+                    nPixelsInAoI = tracedGetInfo(aoi.area().divide(math.pow(
+                        min(PRODUCT_SPECS[p]["roughScale"] for p in productIDs), 2)), 
+                        "specificDatesRetrieval", site=site, 
+                        processing_code=codesLabel)
+                    maxNImgs = math.ceil(max_n_proc_pixels/nPixelsInAoI)
+                    group_len = min(maxNImgs, IMG_PROC_ALGO_SPECS[imgProcAlgo]["nSimImgs"])
+                    nGroups = math.ceil(nAvailableDates / group_len)
+
+                    for g in range(nGroups):
+                        checkCancelled(stop_event)
+                        with trackGroup():
+                            dateSublist_inds = range(g * group_len, min(
+                                g * group_len + group_len, nAvailableDates))
+                            dateSublist = [availableDates[i] for i in dateSublist_inds]
+                            logger.info("Requesting data for days " 
+                                  + str(g * group_len + 1) 
+                                  + "-" + str(min(g * group_len + group_len, nAvailableDates)) 
+                                  + "/" + str(nAvailableDates) + "...")
+                            # Image processing and parameter estimation (all the 
+                            # estimation algorithms of the group at once).
+                            if len(members) == 1:
+                                with stageTimer("image_processing", processing_code=codesLabel):
+                                    imageProcessing(imgProcAlgo, productIDs[0], dateSublist)
+                                with stageTimer("estimation", processing_code=codesLabel):
+                                    estimation(members[0]["estimation_algos"], productIDs[0])
+                            else:
+                                familyProcessing(members, memberDates, dateSublist, codesLabel)
+
+                            # Reduction: once per distinct reducer of the run or, if 
+                            # 'fuse_reducers', once for all of them (except 0, which 
+                            # does not reduce the images).
+                            runReducers = []
+                            for processingCode in runCodes:
+                                if not codeGroups[processingCode]["code_reducers"][processingCode] in runReducers:
+                                    runReducers.append(codeGroups[processingCode]["code_reducers"][processingCode])
+                            reductionRuns = [(r, [c for c in runCodes 
+                                                  if codeGroups[c]["code_reducers"][c] == r]) 
+                                             for r in runReducers]
+                            fusable = [r for r in runReducers if r != 0]
+                            if fuse_reducers and len(fusable) > 1:
+                                reductionRuns = [rr for rr in reductionRuns if rr[0] == 0] + [
+                                    (fusable, [c for c in runCodes 
+                                               if codeGroups[c]["code_reducers"][c] != 0])]
+                            reducedBands = list({*bands.values()}) + export_bands
+
+                            for runReducer, reducerCodes in reductionRuns:
+                                with stageTimer("reduction", processing_code=codesLabel):
+                                    result = reduction(runReducer, 
+                                                       productIDs[0] if len(members) == 1 else productIDs)
+
+                                if result is None:
+                                    incrementCounter("failures", caller="specificDatesRetrieval")
+                                    logger.warning("(!) Failed to retrieve data.")
+                                    continue
+
+                                elif result == {}:
+                                    logger.info("No data retrieved.")
+                                    continue
+
+                                dataRetrieved = True
+                                if len(members) == 1:
+                                    productResults = {productIDs[0]: result}
+                                else:
+                                    productResults = splitFamilyResult(result)
+                                # Save the retrieved data in the result data frame of 
+                                # each processing code.
+                                for processingCode in reducerCodes:
+                                    procGroup = codeGroups[processingCode]
+                                    productID = procGroup["product_id"]
+                                    if not productID in productResults:
+                                        continue
+                                    reducer = procGroup["code_reducers"][processingCode]
+                                    codeResult = productResults[productID]
+                                    if isinstance(runReducer, list):
+                                        codeResult = selectStatistics(
+                                            codeResult, reducedBands, REDUCTION_SPECS[reducer]["sufix"], 
+                                            fusedStatistics([REDUCTION_SPECS[r]["sufix"] for r in runReducer]))
+                                    codeResult = splitResult(
+                                        codeResult, groupExcludedVars(procGroup, processingCode), 
+                                        REDUCTION_SPECS[reducer]["sufix"])
+                                    if result_sink is not None:
+                                        batch = LongResultBuffer()
+                                        appendSiteResults(
+                                            batch, siteDays, processingCode, codeResult, 
+                                            REDUCTION_SPECS[reducer]["sufix"], 
+                                            commonBandRenaming(productID) if append_mode else None)
+                                        if len(batch) > 0:
+                                            result_sink(batch.toDataFrame())
+                                        continue
+                                    with stageTimer("result_assembly", processing_code=processingCode):
+                                        if output_format in ["long", "cube"]:
+                                            appendSiteResults(
+                                                longResults if output_format == "long" else cube, 
+                                                siteDays, processingCode, codeResult, 
+                                                REDUCTION_SPECS[reducer]["sufix"], 
+                                                commonBandRenaming(productID) if append_mode else None)
+                                            continue
+                                        storeResult(
+                                            resultDFs_dictio[processingCode], 
+                                            codeResult, 
+                                            dayRows, 
+                                            str(processingCode) + "_" if nProcCodes > 1 and not append_mode else "",
+                                            commonBandRenaming(productID) if append_mode else None
+                                            )
+                                logger.info("Data successfully retrieved.")
+
+            if cube is not None:
+                cube.flush()
+            # In the batch mode, the sites with export tables are done only when 
+            # their tasks finish (see 'batchRetrieval').
+            if execution_mode != "batch" or not site in batchSites:
+                advanceProgress(len(siteAOI["sites"]))
+
+        if execution_mode == "batch" and batchTables != {}:
+            bindLogContext(site=None, processing_code=None)
+            if task_service is None:
+                task_service = EETaskService(batch_asset_root)
+            with stageTimer("batch"):
+                batchResults = batchRetrieval(
+                    batchTables, task_service, sites_per_task, max_concurrent_tasks, 
+                    on_site_done=lambda site: advanceProgress(len(batchSites[site])))
+            for code_i in range(nProcCodes):
+                processingCode = processing_codes[code_i]
+                for site, result in batchResults.get(processingCode, {}).items():
+                    if result == {}:
+                        continue
+                    dataRetrieved = True
+                    if result_sink is not None:
+                        batch = LongResultBuffer()
+                        appendSiteResults(
+                            batch, batchDays[site], processingCode, result, 
+                            REDUCTION_SPECS[reducers[code_i]]["sufix"], 
+                            commonBandRenaming(product_ids[code_i]) if append_mode else None)
+                        if len(batch) > 0:
+                            result_sink(batch.toDataFrame())
+                        continue
+                    with stageTimer("result_assembly", processing_code=processingCode):
+                        if output_format in ["long", "cube"]:
+                            appendSiteResults(
+                                longResults if output_format == "long" else cube, 
+                                batchDays[site], processingCode, result, 
+                                REDUCTION_SPECS[reducers[code_i]]["sufix"], 
+                                commonBandRenaming(product_ids[code_i]) if append_mode else None)
+                            continue
+                        storeResult(
+                            resultDFs_dictio[processingCode], result, 
+                            batchRows[site], 
+                            str(processingCode) + "_" if nProcCodes > 1 and not append_mode else "",
+                            commonBandRenaming(product_ids[code_i]) if append_mode else None
+                            )
+            failedCodes = [c for c in batchTables if not c in batchResults]
+            if failedCodes != []:
+                incrementCounter("failures", caller="specificDatesRetrieval")
+                logger.warning("(!) Failed to retrieve data for the processing codes " 
+                               + str(failedCodes) + ".")
+
+    finally:
+        if progressStarted:
+            finishProgress()
+        resetLogContext(logToken)
+        if cube is not None:
+            cube.close()
+    logger.info("Processing finished at " + str(pd.Timestamp.now()) + ".")
+
+    if graph_report_path != "":
+        try:
+            saveRunReport(graph_report_path)
+        except Exception as e:
+            logger.error("(!) Failed to save the request report to '" + graph_report_path + "'.")
+            logger.error(e)
         else:
-            dataDF = pd.concat([*resultDFs_dictio.values()], axis = 1, sort = False)
-            resultDF = pd.concat([resultDF_template, dataDF], axis = 1, sort = False)
-            # Remove empty rows (if in running mode 2):
-            if(running_mode == 2):
-                resultDF.dropna(subset = dataDF.columns, how = "all", inplace = True)
+            logger.info("Request report saved to file '" + graph_report_path + "'.")
+
+    if result_sink is not None:
+        resultDF = None
+    elif dataRetrieved and output_format == "cube":
+        resultDF = openCube(cube_path)
+        logger.info("Results saved to the cube '" + cube_path + "'.")
+    elif dataRetrieved and output_format == "long":
+        resultDF = longResults.toDataFrame()
+    elif dataRetrieved:
+        with stageTimer("result_assembly"):
+            logger.info("Consolidating results...")
+            resultDF = consolidateResults(resultDFs_dictio, resultDF_template, 
+                                          append_mode, running_mode)
+        if columns is not None:
+            missingColumns = [c for c in columns if not any(
+                col == c or str(col).endswith("_" + c) for col in resultDF.columns)]
+            if missingColumns != []:
+                logger.warning("(!) Requested columns not found in the results: " 
+                               + ", ".join(missingColumns) + ".")
     else:
         resultDF = None
     
-    return resultDF
\ No newline at end of file
+    return resultDF
+
+
+# Raised when a retrieval is cancelled (e.g. when an 'iterResults' iteration 
+# is closed).
+class RetrievalCancelled(Exception):
+    pass
+
+
+# Interrupt the retrieval if its stop event was set.
+def checkCancelled(stop_event):
+    if stop_event is not None and stop_event.is_set():
+        raise RetrievalCancelled()
+
+
+# Stream the results of 'specificDatesRetrieval' as they are retrieved.
+def iterResults(max_pending:int = 8, **kwargs):
+    """
+    Executa 'specificDatesRetrieval' em segundo plano (com os mesmos 
+    argumentos; a entrada continua sendo 'input_df') e produz cada resultado 
+    assim que a sua redução é concluída: um data frame pequeno no formato 
+    longo (ver 'LongResultBuffer') por local (ou locais com a mesma área de 
+    interesse) e código de processamento. Os resultados não são acumulados; 
+    no máximo 'max_pending' lotes aguardam o consumidor, e a recuperação 
+    espera enquanto a fila estiver cheia, de modo que a memória é constante.
+    Erros da recuperação são relançados no consumidor. Encerrar a iteração 
+    (por exemplo, com 'break') cancela a recuperação, que é interrompida 
+    antes do próximo local ou grupo de datas; o encerramento aguarda somente
+    a requisição em andamento, de modo que, ao retornar, o estado global do
+    módulo não é mais alterado pela recuperação cancelada.
+
+    Examples:
+        >>> for batch in iterResults(running_mode=1, aoi_mode="radius"):  # doctest: +SKIP
+        ...     batch.to_csv("resultados.csv", mode="a", header=False, index=False)
+    """
+    if kwargs.get("dry_run", False):
+        raise Exception("'dry_run' is not supported by 'iterResults'.")
+    batches = queue.Queue(maxsize=max_pending)
+    stopEvent = threading.Event()
+
+    def put(item):
+        while not stopEvent.is_set():
+            try:
+                batches.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def sink(batch):
+        if not put(("batch", batch)):
+            raise RetrievalCancelled()
+
+    def run():
+        try:
+            specificDatesRetrieval(result_sink=sink, stop_event=stopEvent, **kwargs)
+        except RetrievalCancelled:
+            logger.info("Retrieval cancelled.")
+            return
+        except BaseException as e:
+            put(("error", e))
+            return
+        put(("done", None))
+
+    thread = threading.Thread(target=run, name="geedar-retrieval", daemon=True)
+    thread.start()
+    try:
+        while True:
+            kind, item = batches.get()
+            if kind == "batch":
+                yield item
+            elif kind == "error":
+                raise item
+            else:
+                return
+    finally:
+        # The retrieval thread stops at its next check (see 'checkCancelled').
+        # Wait for it, as it writes the module globals (e.g. 'aoi') that a 
+        # following retrieval would use.
+        stopEvent.set()
+        thread.join()
\ No newline at end of file
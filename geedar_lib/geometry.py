@@ -0,0 +1,195 @@
+import math
+import json
+import hashlib
+
+# Decimal places of the coordinates compared when identifying identical AOIs
+# (about 1 cm).
+AOI_KEY_DECIMALS = 7
+
+# Approximate length (meters) of one degree of latitude.
+METERS_PER_DEGREE = 111320
+
+# Simplification tolerance, as a fraction of the product's nominal pixel size.
+SIMPLIFY_FACTOR = 0.25
+
+
+def _toLocalMeters(ring:list, lat0:float) -> list:
+    cosLat = math.cos(math.radians(lat0))
+    return [(p[0] * METERS_PER_DEGREE * cosLat, p[1] * METERS_PER_DEGREE) for p in ring]
+
+
+# Douglas-Peucker simplification of a line, returning the indices kept.
+def douglasPeuckerIndices(points:list, tolerance:float) -> list:
+    """
+    Retorna os índices dos vértices mantidos pela simplificação de
+    Douglas-Peucker de uma linha (lista de pares x, y).
+
+    Examples:
+        >>> douglasPeuckerIndices([(0, 0), (1, 0.05), (2, 0), (3, 5), (4, 0)], 0.1)
+        [0, 2, 3, 4]
+    """
+    n = len(points)
+    if n < 3:
+        return [*range(n)]
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+
+    while stack:
+        first, last = stack.pop()
+        x1, y1 = points[first]
+        x2, y2 = points[last]
+        dx = x2 - x1
+        dy = y2 - y1
+        segLen = math.hypot(dx, dy)
+        maxDist = -1
+        maxIndex = first
+        for i in range(first + 1, last):
+            px, py = points[i]
+            if segLen == 0:
+                dist = math.hypot(px - x1, py - y1)
+            else:
+                dist = abs(dy * px - dx * py + x2 * y1 - y2 * x1) / segLen
+            if dist > maxDist:
+                maxDist = dist
+                maxIndex = i
+        if maxDist > tolerance:
+            keep[maxIndex] = True
+            stack.append((first, maxIndex))
+            stack.append((maxIndex, last))
+
+    return [i for i in range(n) if keep[i]]
+
+
+# Planar area (square meters) of a ring of [long, lat] coordinates.
+def ringArea(ring:list) -> float:
+    """
+    Retorna a área aproximada, em metros quadrados, de um anel de coordenadas
+    [longitude, latitude].
+    """
+    if len(ring) < 3:
+        return 0.0
+    lat0 = sum(p[1] for p in ring) / len(ring)
+    pts = _toLocalMeters(ring, lat0)
+    area = 0.0
+    for i in range(len(pts)):
+        x1, y1 = pts[i]
+        x2, y2 = pts[(i + 1) % len(pts)]
+        area = area + x1 * y2 - x2 * y1
+    return abs(area) / 2
+
+
+# Simplify a closed ring of [long, lat] coordinates.
+def simplifyRing(ring:list, tolerance:float) -> list:
+    """
+    Simplifica um anel fechado de coordenadas [longitude, latitude] pelo
+    algoritmo de Douglas-Peucker, com tolerância em metros. O anel é dividido
+    no vértice mais distante do primeiro para que a simplificação preserve
+    sua forma fechada.
+    """
+    if len(ring) < 4:
+        return ring
+    closed = ring[0] == ring[-1]
+    openRing = ring[:-1] if closed else ring
+    lat0 = sum(p[1] for p in openRing) / len(openRing)
+    pts = _toLocalMeters(openRing, lat0)
+    far = max(range(len(pts)), key=lambda i: math.hypot(pts[i][0] - pts[0][0], pts[i][1] - pts[0][1]))
+    firstHalf = douglasPeuckerIndices(pts[:far + 1], tolerance)
+    secondHalf = douglasPeuckerIndices(pts[far:] + [pts[0]], tolerance)
+    indices = firstHalf + [far + i for i in secondHalf[1:-1]]
+    simplified = [openRing[i] for i in indices]
+    return simplified + [simplified[0]]
+
+
+# Simplify, quantize and clean a list of polygons.
+def simplifyPolygons(polygons:list, tolerance:float, decimals:int = None,
+                     min_area:float = None) -> list:
+    """
+    Simplifica polígonos (listas de anéis [longitude, latitude], como os
+    retornados por 'polygonFromKML') antes de enviá-los ao Earth Engine:
+    aplica Douglas-Peucker com a tolerância informada, arredonda as
+    coordenadas e descarta partes (polígonos ou buracos) menores que
+    'min_area'.
+
+    Args:
+        polygons: Lista de polígonos (anel externo seguido dos internos).
+        tolerance: Tolerância da simplificação, em metros.
+        decimals: Casas decimais das coordenadas. Se 'None', é derivado da
+            tolerância (cerca de um décimo dela).
+        min_area: Área mínima (m²) das partes mantidas. Se 'None', é o
+            quadrado da tolerância.
+
+    Returns:
+        A lista de polígonos simplificados.
+
+    Examples:
+        >>> square = [[0.0, 0.0], [0.0005, 0.00000001], [0.001, 0.0], [0.001, 0.001], [0.0, 0.001], [0.0, 0.0]]
+        >>> simplifyPolygons([[square]], tolerance=10)
+        [[[[0.0, 0.0], [0.001, 0.0], [0.001, 0.001], [0.0, 0.001], [0.0, 0.0]]]]
+    """
+    if decimals is None:
+        decimals = max(0, math.ceil(-math.log10(tolerance / 10 / METERS_PER_DEGREE)))
+    if min_area is None:
+        min_area = tolerance ** 2
+
+    result = []
+    for polygon in polygons:
+        rings = []
+        for ring_i in range(len(polygon)):
+            ring = simplifyRing(polygon[ring_i], tolerance)
+            ring = [[round(p[0], decimals), round(p[1], decimals)] for p in ring]
+            # Remove consecutive duplicates created by the rounding.
+            ring = [p for i, p in enumerate(ring) if i == 0 or p != ring[i - 1]]
+            if len(ring) < 4 or ringArea(ring) < min_area:
+                if ring_i == 0:
+                    break
+                continue
+            rings.append(ring)
+        if rings != []:
+            result.append(rings)
+    return result
+
+
+# Approximate area of a list of polygons.
+def polygonsArea(polygons:list) -> float:
+    """
+    Retorna a área aproximada, em metros quadrados, de uma lista de polígonos
+    (anel externo seguido dos internos), descontando os buracos.
+    """
+    return sum(ringArea(polygon[0]) - sum(ringArea(hole) for hole in polygon[1:])
+               for polygon in polygons if polygon != [])
+
+
+# Count the vertices of a list of polygons.
+def countVertices(polygons:list) -> int:
+    """
+    Retorna o número total de vértices de uma lista de polígonos.
+    """
+    return sum(len(ring) for polygon in polygons for ring in polygon)
+
+
+# Canonical key of a circular AOI (point and radius).
+def pointAOIKey(lat:float, long:float, radius:float, decimals:int = AOI_KEY_DECIMALS) -> str:
+    """
+    Retorna uma chave que identifica uma área de interesse circular: as
+    coordenadas arredondadas e o raio. Locais com a mesma chave têm a mesma
+    área de interesse.
+
+    Examples:
+        >>> pointAOIKey(-15.80000001, -47.9, 1000) == pointAOIKey(-15.8, -47.9, 1000.0)
+        True
+    """
+    return "point:{}:{}:{}".format(round(float(lat), decimals) + 0.0,
+                                   round(float(long), decimals) + 0.0, float(radius))
+
+
+# Canonical key of a polygonal AOI.
+def polygonAOIKey(polygons:list, decimals:int = AOI_KEY_DECIMALS) -> str:
+    """
+    Retorna uma chave (hash SHA-1 das coordenadas arredondadas) que
+    identifica uma área de interesse poligonal.
+    """
+    rounded = [[[[round(p[0], decimals) + 0.0, round(p[1], decimals) + 0.0] for p in ring]
+                for ring in polygon] for polygon in polygons]
+    return "polygon:" + hashlib.sha1(
+        json.dumps(rounded, separators=(",", ":")).encode("utf-8")).hexdigest()
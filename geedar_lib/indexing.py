@@ -0,0 +1,124 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+# Day 0 of the internal day numbers.
+EPOCH = date(1970, 1, 1)
+
+
+# Dates as int32 day numbers (days since 1970-01-01).
+def toDayNumbers(dates) -> np.ndarray:
+    """
+    Converte datas (textos 'yyyy-mm-dd', objetos 'date' ou 'datetime') em
+    números de dias desde 1970-01-01 ('int32'), a representação interna das
+    datas. Datas inválidas ou ausentes resultam em -2147483648.
+
+    Examples:
+        >>> toDayNumbers(pd.Series(["1970-01-02", "2020-01-01"])).tolist()
+        [1, 18262]
+    """
+    days = pd.to_datetime(pd.Series(dates), errors="coerce").to_numpy().astype("datetime64[D]")
+    numbers = days.astype(np.int64)
+    numbers[np.isnat(days)] = np.iinfo(np.int32).min
+    return numbers.astype(np.int32)
+
+
+# Day number of a 'yyyy-mm-dd' date.
+def dateToDay(text:str) -> int:
+    """
+    Examples:
+        >>> dateToDay("2020-01-01")
+        18262
+    """
+    return (date.fromisoformat(text) - EPOCH).days
+
+
+# 'yyyy-mm-dd' date of a day number.
+def dayToDate(day:int) -> str:
+    """
+    Examples:
+        >>> dayToDate(18262)
+        '2020-01-01'
+    """
+    return (EPOCH + timedelta(days=int(day))).isoformat()
+
+
+# Sites as categorical codes.
+def siteCodes(sites:pd.Series) -> tuple:
+    """
+    Converte os identificadores dos locais em códigos inteiros ('int32'),
+    na ordem de primeira ocorrência.
+
+    Returns:
+        Tupla (códigos, identificadores), em que 'identificadores[código]' é
+        o local.
+
+    Examples:
+        >>> codes, names = siteCodes(pd.Series(["b", "a", "b"]))
+        >>> codes.tolist(), names
+        ([0, 1, 0], ['b', 'a'])
+    """
+    codes, names = pd.factorize(pd.Series(sites), sort=False)
+    return codes.astype(np.int32), names.tolist()
+
+
+# Rows grouped by key (e.g. site code or day number).
+def groupRows(keys, rows) -> dict:
+    """
+    Agrupa os índices de linhas pelas chaves correspondentes, mantendo a
+    ordem das linhas em cada grupo.
+
+    Args:
+        keys: Chave de cada linha (por exemplo, o número do dia).
+        rows: Índices das linhas.
+
+    Returns:
+        Dicionário {chave: lista de índices}, na ordem das chaves.
+
+    Examples:
+        >>> groupRows([18263, 18262, 18263], [4, 7, 9])
+        {18262: [7], 18263: [4, 9]}
+    """
+    keys = np.asarray(keys)
+    rows = np.asarray(rows)
+    if len(keys) == 0:
+        return {}
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    rows = rows[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)]
+    return {keys[s].item(): rows[s:e].tolist() for s, e in zip(starts, ends)}
+
+
+# Sites grouped by the set of days requested for each.
+def groupSitesByDays(sites:list, siteRows:dict, dayNumbers) -> list:
+    """
+    Agrupa os locais (por exemplo, os que compartilham uma área de
+    interesse) pelo conjunto de dias (ver 'toDayNumbers') pedidos nas suas
+    linhas, mantendo a ordem dos locais.
+
+    Returns:
+        Lista de tuplas (locais, conjunto de dias).
+
+    Examples:
+        >>> days = np.array([18262, 18263, 18262, 18263])
+        >>> groupSitesByDays(["a", "b", "c"], {"a": [0, 1], "b": [2], "c": [3, 2]}, days)
+        [(['a', 'c'], {18262, 18263}), (['b'], {18262})]
+    """
+    groups = {}
+    for site in sites:
+        days = frozenset(np.asarray(dayNumbers)[siteRows[site]].tolist())
+        groups.setdefault(days, []).append(site)
+    return [(groupSites, set(days)) for days, groupSites in groups.items()]
+
+
+# Dates of a result {date: values} that are in a set of day numbers.
+def selectResultDays(result:dict, days:set) -> dict:
+    """
+    Examples:
+        >>> selectResultDays({"2020-01-01": {"a": 1}, "2020-01-02": {"a": 2}}, {18263})
+        {'2020-01-02': {'a': 2}}
+    """
+    return {date: values for date, values in result.items() if dateToDay(date) in days}
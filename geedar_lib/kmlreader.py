@@ -0,0 +1,138 @@
+import os
+import pickle
+import hashlib
+import zipfile
+import logging
+import xml.etree.ElementTree as ET
+
+logger = logging.getLogger("geedar")
+
+# Directory where the parsed polygons are cached.
+KML_CACHE_DIR = os.environ.get(
+    "GEEDAR_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "geedar")
+    )
+
+
+def _localName(tag:str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+# Convert the text of a KML 'coordinates' element to a list of [long, lat].
+def parseKMLCoordinates(text:str) -> list:
+    """
+    Converte o texto de um elemento 'coordinates' do KML em uma lista de
+    pares [longitude, latitude] (a altitude é descartada).
+
+    Examples:
+        >>> parseKMLCoordinates(" -45.1,-15.2,0 -45.3,-15.4,0\\n-45.1,-15.2 ")
+        [[-45.1, -15.2], [-45.3, -15.4], [-45.1, -15.2]]
+    """
+    coords = []
+    if text is None:
+        return coords
+    for point in text.split():
+        values = point.split(",")
+        if len(values) >= 2:
+            coords.append([float(values[0]), float(values[1])])
+    return coords
+
+
+def _ringCoordinates(boundary) -> list:
+    coordsElem = boundary.find(".//{*}coordinates")
+    return parseKMLCoordinates(None if coordsElem is None else coordsElem.text)
+
+
+# Read the polygons of a KML stream, one at a time.
+def iterKMLPolygons(source):
+    """
+    Lê, de forma incremental, os polígonos de um arquivo (ou stream) KML,
+    incluindo os contidos em 'MultiGeometry'. Cada polígono é retornado como
+    uma lista de anéis: o externo, seguido dos internos (buracos).
+    """
+    for event, elem in ET.iterparse(source, events=("end",)):
+        tag = _localName(elem.tag)
+        if tag == "Polygon":
+            outer = []
+            inners = []
+            for child in elem:
+                childTag = _localName(child.tag)
+                if childTag == "outerBoundaryIs":
+                    outer = _ringCoordinates(child)
+                elif childTag == "innerBoundaryIs":
+                    inner = _ringCoordinates(child)
+                    if inner != []:
+                        inners.append(inner)
+            if outer != []:
+                yield [outer] + inners
+            elem.clear()
+        elif tag == "Placemark":
+            elem.clear()
+
+
+# Read all polygons of a KML or KMZ file.
+def readKMLPolygons(path:str) -> list:
+    """
+    Retorna a lista de polígonos de um arquivo KML ou KMZ. Cada polígono é
+    uma lista de anéis (externo e internos) de pares [longitude, latitude],
+    no formato aceito por 'ee.Geometry.MultiPolygon'.
+    """
+    if path.lower().endswith(".kmz"):
+        with zipfile.ZipFile(path) as kmz:
+            kmlNames = [n for n in kmz.namelist() if n.lower().endswith(".kml")]
+            if kmlNames == []:
+                raise ValueError("No KML document was found in '" + path + "'.")
+            # By convention, the main document of a KMZ is 'doc.kml'.
+            kmlName = "doc.kml" if "doc.kml" in kmlNames else kmlNames[0]
+            with kmz.open(kmlName) as f:
+                return list(iterKMLPolygons(f))
+    with open(path, "rb") as f:
+        return list(iterKMLPolygons(f))
+
+
+# Get the polygons of a KML/KMZ file, using the on-disk cache when possible.
+def cachedKMLPolygons(path:str, cache_dir:str = None) -> list:
+    """
+    Retorna os polígonos de um arquivo KML ou KMZ, consultando antes um cache
+    em disco indexado pelo caminho, data de modificação e tamanho do arquivo.
+    Se o arquivo não estiver no cache, ou se o cache não puder ser carregado
+    (arquivo truncado, de outra versão, etc.), ele é lido e o resultado é
+    armazenado, substituindo o anterior.
+
+    Args:
+        path: Caminho do arquivo KML ou KMZ.
+        cache_dir: Diretório do cache. Se 'None', usa 'KML_CACHE_DIR'.
+
+    Returns:
+        A lista de polígonos do arquivo.
+    """
+    if cache_dir is None:
+        cache_dir = KML_CACHE_DIR
+    stat = os.stat(path)
+    key = hashlib.sha1((os.path.realpath(path) + "|" + str(stat.st_mtime_ns)
+                        + "|" + str(stat.st_size)).encode("utf-8")).hexdigest()
+    cacheFile = os.path.join(cache_dir, "kml", key + ".pkl")
+
+    try:
+        with open(cacheFile, "rb") as f:
+            polygons = pickle.load(f)
+        if isinstance(polygons, list):
+            return polygons
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        # Any failure to load the cache is a miss: the file is read again
+        # and the cache overwritten.
+        logger.debug("Ignoring the cached polygons of '" + path + "': " + str(e))
+
+    polygons = readKMLPolygons(path)
+
+    try:
+        os.makedirs(os.path.dirname(cacheFile), exist_ok=True)
+        tmpFile = cacheFile + "." + str(os.getpid()) + ".tmp"
+        with open(tmpFile, "wb") as f:
+            pickle.dump(polygons, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpFile, cacheFile)
+    except OSError as e:
+        logger.debug("Could not cache the polygons of '" + path + "': " + str(e))
+
+    return polygons
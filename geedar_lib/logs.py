@@ -0,0 +1,164 @@
+import sys
+import json
+import queue
+import atexit
+import logging
+import contextvars
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Name of the logger used by all GEEDaR modules.
+LOGGER_NAME = "geedar"
+
+# Default log file (JSON lines) and rotation parameters.
+LOG_FILE = "GEEDaR_log.jsonl"
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+# Fields (site, processing code, demand ID...) attached to the records
+# emitted in the current thread/task.
+_context = contextvars.ContextVar("geedar_log_context", default={})
+_listener = None
+_queueHandler = None
+
+# Library default: no output until an entry point (CLI, service) calls
+# 'setupLogging'.
+logging.getLogger(LOGGER_NAME).addHandler(logging.NullHandler())
+
+
+# Attach the current context fields to every record.
+class ContextFilter(logging.Filter):
+    def filter(self, record):
+        for k, v in _context.get().items():
+            if not hasattr(record, k):
+                setattr(record, k, v)
+        return True
+
+
+# Format records as JSON lines.
+class JSONLinesFormatter(logging.Formatter):
+    # Record attributes exported, besides the message, when present.
+    fields = ["site", "processing_code", "demand_id", "entry_type", "identifier"]
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "thread": record.threadName,
+            "message": record.getMessage()
+        }
+        for k in self.fields:
+            v = getattr(record, k, None)
+            if v is not None:
+                entry[k] = v
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+# Write records to the current standard output, which may be redirected
+# (e.g. by the progress display) after the logging is configured.
+class StdoutHandler(logging.StreamHandler):
+    def emit(self, record):
+        self.stream = sys.stdout
+        super().emit(record)
+
+
+# Bind fields to the records emitted in the current context.
+def bindLogContext(**fields) -> contextvars.Token:
+    """
+    Associa campos (por exemplo, 'site', 'processing_code' ou 'demand_id') aos
+    registros de log emitidos no contexto (thread ou tarefa) atual.
+
+    Returns:
+        Um token que pode ser passado a 'resetLogContext' para restaurar o
+        contexto anterior.
+    """
+    return _context.set({**_context.get(), **fields})
+
+
+# Restore the context fields that preceded a call to 'bindLogContext'.
+def resetLogContext(token:contextvars.Token):
+    """
+    Restaura os campos de contexto anteriores à chamada de 'bindLogContext'.
+    """
+    _context.reset(token)
+
+
+# Configure the GEEDaR logger.
+def setupLogging(level = "INFO", log_file:str = LOG_FILE,
+                 max_bytes:int = LOG_MAX_BYTES,
+                 backup_count:int = LOG_BACKUP_COUNT,
+                 console:bool = True) -> logging.Logger:
+    """
+    Configura o log do GEEDaR. Os registros são enfileirados e escritos por
+    uma thread própria: no console, somente a mensagem; no arquivo, em
+    formato JSON lines com rotação por tamanho. Chamadas repetidas
+    substituem a configuração anterior.
+
+    Args:
+        level: Nível mínimo dos registros ('DEBUG', 'INFO', 'WARNING', ...).
+        log_file: Arquivo de log. Se vazio, nenhum arquivo é escrito.
+        max_bytes: Tamanho máximo do arquivo antes da rotação.
+        backup_count: Número de arquivos antigos mantidos na rotação.
+        console: Se os registros devem ser exibidos no console.
+
+    Returns:
+        O logger do GEEDaR.
+    """
+    global _listener, _queueHandler
+    shutdownLogging()
+
+    handlers = []
+    if console:
+        consoleHandler = StdoutHandler(sys.stdout)
+        consoleHandler.setFormatter(logging.Formatter("%(message)s"))
+        handlers.append(consoleHandler)
+    if log_file:
+        fileHandler = RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count,
+            encoding="utf-8", delay=True)
+        fileHandler.setFormatter(JSONLinesFormatter())
+        handlers.append(fileHandler)
+
+    logQueue = queue.SimpleQueue()
+    _queueHandler = QueueHandler(logQueue)
+    _queueHandler.addFilter(ContextFilter())
+    _listener = QueueListener(logQueue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    logger.addHandler(_queueHandler)
+    logger.propagate = False
+    return logger
+
+
+# Configure the logger with the default parameters, unless already configured.
+def ensureLogging() -> logging.Logger:
+    """
+    Configura o log com os parâmetros padrão, caso ainda não esteja
+    configurado, e retorna o logger do GEEDaR.
+    """
+    if _listener is None:
+        return setupLogging()
+    return logging.getLogger(LOGGER_NAME)
+
+
+# Flush the pending records and stop the logging thread.
+def shutdownLogging():
+    """
+    Escreve os registros pendentes e encerra a thread de log.
+    """
+    global _listener, _queueHandler
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+    if _queueHandler is not None:
+        logging.getLogger(LOGGER_NAME).removeHandler(_queueHandler)
+        _queueHandler = None
+
+
+atexit.register(shutdownLogging)
@@ -0,0 +1,228 @@
+import os
+import json
+import logging
+import threading
+from time import perf_counter, time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets.
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600]
+
+# Description of the metrics, used in the Prometheus export.
+METRIC_HELP = {
+    "sites": "Sites processed.",
+    "deduplicated_sites": "Sites whose AOI was already processed for another site.",
+    "dates": "Site-dates requested.",
+    "requests": "Earth Engine requests issued.",
+    "retries": "Earth Engine requests retried.",
+    "failures": "Failed Earth Engine requests or retrievals.",
+    "tasks": "Earth Engine export tasks by state.",
+    "service_jobs": "Jobs received by the retrieval service.",
+    "service_units": "Site-code-date units of the service jobs, by coalescing.",
+    "throttled": "Earth Engine requests rejected for exceeding the rate or quota.",
+    "ratelimit_queue_depth": "Requests waiting for the rate limiter.",
+    "ratelimit_active_requests": "Earth Engine requests in progress.",
+    "ratelimit_qps": "Current request rate allowed by the rate limiter.",
+    "ratelimit_wait_seconds": "Time spent waiting for the rate limiter.",
+    "stage_seconds": "Time spent in each pipeline stage.",
+    "request_seconds": "Earth Engine server latency by caller."
+}
+
+logger = logging.getLogger("geedar")
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+_exporter = None
+
+
+def _key(name:str, labels:dict) -> tuple:
+    return (name, tuple(sorted((labels or {}).items())))
+
+
+# Increment a counter (e.g. 'requests', 'retries', 'failures').
+def incrementCounter(name:str, value:float = 1, **labels):
+    """
+    Incrementa um contador de métricas.
+
+    Args:
+        name: Nome do contador.
+        value: Valor a ser adicionado.
+        labels: Rótulos (por exemplo, o código de processamento) do contador.
+    """
+    k = _key(name, labels)
+    with _lock:
+        _counters[k] = _counters.get(k, 0) + value
+
+
+# Set the current value of a gauge (e.g. a queue depth).
+def setGauge(name:str, value:float, **labels):
+    """
+    Define o valor atual de um indicador (gauge) de métricas.
+    """
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+# Add an observation to a latency histogram.
+def observe(name:str, value:float, **labels):
+    """
+    Adiciona uma observação (em segundos) a um histograma de latência.
+    """
+    k = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(k)
+        if hist is None:
+            hist = {"buckets": [0] * len(LATENCY_BUCKETS), "count": 0, "sum": 0.0}
+            _histograms[k] = hist
+        for i in range(len(LATENCY_BUCKETS)):
+            if value <= LATENCY_BUCKETS[i]:
+                hist["buckets"][i] = hist["buckets"][i] + 1
+        hist["count"] = hist["count"] + 1
+        hist["sum"] = hist["sum"] + value
+
+
+# Time a block of code as a pipeline stage.
+@contextmanager
+def stageTimer(stage:str, **labels):
+    """
+    Mede o tempo de execução de um bloco de código e o registra no histograma
+    'stage_seconds' com o rótulo da etapa.
+
+    Examples:
+        >>> with stageTimer("example"):
+        ...     pass
+        >>> getMetrics()["histograms"]["stage_seconds"][0]["count"] >= 1
+        True
+    """
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        observe("stage_seconds", perf_counter() - start, stage=stage, **labels)
+
+
+# Clear all metrics.
+def resetMetrics():
+    """
+    Zera todos os contadores, indicadores e histogramas.
+    """
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+
+
+# Get a snapshot of the metrics as a dictionary.
+def getMetrics() -> dict:
+    """
+    Retorna uma cópia das métricas atuais, agrupadas por tipo e nome.
+    """
+    snapshot = {"timestamp": time(), "counters": {}, "gauges": {},
+                "histograms": {}, "buckets": LATENCY_BUCKETS}
+    with _lock:
+        for (name, labels), value in _counters.items():
+            snapshot["counters"].setdefault(name, []).append(
+                {"labels": dict(labels), "value": value})
+        for (name, labels), value in _gauges.items():
+            snapshot["gauges"].setdefault(name, []).append(
+                {"labels": dict(labels), "value": value})
+        for (name, labels), hist in _histograms.items():
+            snapshot["histograms"].setdefault(name, []).append(
+                {"labels": dict(labels), "buckets": list(hist["buckets"]),
+                 "count": hist["count"], "sum": hist["sum"]})
+    return snapshot
+
+
+def _formatLabels(labels:dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(k + '="' + str(v).replace('"', '\\"') + '"'
+                          for k, v in sorted(labels.items())) + "}"
+
+
+# Format the metrics in the Prometheus text exposition format.
+def toPrometheus(prefix:str = "geedar_") -> str:
+    """
+    Retorna as métricas atuais no formato texto do Prometheus.
+    """
+    snapshot = getMetrics()
+    lines = []
+    for mtype, group in [("counter", "counters"), ("gauge", "gauges")]:
+        for name, series in sorted(snapshot[group].items()):
+            fullName = prefix + name + ("_total" if mtype == "counter" else "")
+            if name in METRIC_HELP:
+                lines.append("# HELP " + fullName + " " + METRIC_HELP[name])
+            lines.append("# TYPE " + fullName + " " + mtype)
+            for s in series:
+                lines.append(fullName + _formatLabels(s["labels"]) + " " + str(s["value"]))
+    for name, series in sorted(snapshot["histograms"].items()):
+        fullName = prefix + name
+        if name in METRIC_HELP:
+            lines.append("# HELP " + fullName + " " + METRIC_HELP[name])
+        lines.append("# TYPE " + fullName + " histogram")
+        for s in series:
+            for i in range(len(LATENCY_BUCKETS)):
+                labels = {**s["labels"], "le": str(LATENCY_BUCKETS[i])}
+                lines.append(fullName + "_bucket" + _formatLabels(labels) + " " + str(s["buckets"][i]))
+            labels = {**s["labels"], "le": "+Inf"}
+            lines.append(fullName + "_bucket" + _formatLabels(labels) + " " + str(s["count"]))
+            lines.append(fullName + "_sum" + _formatLabels(s["labels"]) + " " + str(s["sum"]))
+            lines.append(fullName + "_count" + _formatLabels(s["labels"]) + " " + str(s["count"]))
+    return "\n".join(lines) + "\n"
+
+
+def _atomicWrite(path:str, text:str):
+    tmpPath = path + ".tmp"
+    with open(tmpPath, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmpPath, path)
+
+
+# Export the metrics as JSON and/or as a Prometheus textfile.
+def exportMetrics(json_path:str = "", prom_path:str = ""):
+    """
+    Salva as métricas atuais em um arquivo JSON e/ou em um arquivo texto no
+    formato do Prometheus (para o 'textfile collector'). Os arquivos são
+    substituídos atomicamente.
+    """
+    if json_path != "":
+        _atomicWrite(json_path, json.dumps(getMetrics(), indent=2))
+    if prom_path != "":
+        _atomicWrite(prom_path, toPrometheus())
+
+
+# Export the metrics periodically in a background thread.
+def startPeriodicExport(json_path:str = "", prom_path:str = "", interval:float = 60):
+    """
+    Exporta as métricas a cada 'interval' segundos, em segundo plano, até que
+    'stopPeriodicExport' seja chamada.
+    """
+    global _exporter
+    stopPeriodicExport()
+    stopEvent = threading.Event()
+
+    def run():
+        while not stopEvent.wait(interval):
+            try:
+                exportMetrics(json_path, prom_path)
+            except Exception as e:
+                logger.warning("(!) Failed to export the metrics: " + str(e))
+
+    thread = threading.Thread(target=run, name="geedar-metrics", daemon=True)
+    thread.start()
+    _exporter = (thread, stopEvent)
+
+
+# Stop the periodic export, if running.
+def stopPeriodicExport():
+    """
+    Interrompe a exportação periódica das métricas.
+    """
+    global _exporter
+    if _exporter is not None:
+        thread, stopEvent = _exporter
+        stopEvent.set()
+        thread.join()
+        _exporter = None
@@ -0,0 +1,376 @@
+import math
+import logging
+
+logger = logging.getLogger("geedar")
+
+# Separator of the date and the product ID in the result keys of a merged
+# product family (e.g. '2020-01-01/101').
+FAMILY_KEY_SEPARATOR = "/"
+
+
+# Group processing codes that can share the image processing.
+def planProcessing(processing_codes:list, product_ids:list, img_proc_algos:list,
+                   estimation_algos:list, reducers:list, estimation_vars:dict = None,
+                   share:bool = True) -> list:
+    """
+    Agrupa os códigos de processamento com o mesmo produto e o mesmo
+    algoritmo de processamento de imagens, de modo que a coleção processada
+    seja construída uma única vez por grupo e receba as bandas de todos os
+    algoritmos de estimação solicitados. Algoritmos que produzem variáveis
+    com o mesmo nome (por exemplo, 'SS_surf') são colocados em grupos
+    diferentes.
+
+    Args:
+        processing_codes, product_ids, img_proc_algos, estimation_algos,
+            reducers: Listas retornadas por 'unfoldProcessingCode'.
+        estimation_vars: Dicionário {algoritmo de estimação: nomes das
+            variáveis estimadas}. Se 'None', não há verificação de conflitos.
+        share: Se falso, cada código forma um grupo próprio.
+
+    Returns:
+        Lista de grupos, na ordem dos códigos, cada um com as chaves
+        'product_id', 'img_proc_algo', 'codes', 'estimation_algos' (sem
+        repetição), 'code_estimation_algos' e 'code_reducers' (por código).
+
+    Examples:
+        >>> plan = planProcessing([10110001, 10110111, 10210001], [101, 101, 102],
+        ...                       [1, 1, 1], [0, 11, 0], [1, 1, 1])
+        >>> [(g["product_id"], g["codes"], g["estimation_algos"]) for g in plan]
+        [(101, [10110001, 10110111], [0, 11]), (102, [10210001], [0])]
+    """
+    if estimation_vars is None:
+        estimation_vars = {}
+    groups = []
+    for i in range(len(processing_codes)):
+        code = processing_codes[i]
+        algo = estimation_algos[i]
+        algoVars = {v for v in estimation_vars.get(algo, []) if v != ""}
+        group = None
+        if share:
+            for g in groups:
+                if g["product_id"] != product_ids[i] or g["img_proc_algo"] != img_proc_algos[i]:
+                    continue
+                if code in g["codes"]:
+                    group = g
+                    break
+                groupVars = {v for a in g["estimation_algos"] if a != algo
+                             for v in estimation_vars.get(a, []) if v != ""}
+                if groupVars.isdisjoint(algoVars):
+                    group = g
+                    break
+        if group is None:
+            group = {"product_id": product_ids[i], "img_proc_algo": img_proc_algos[i],
+                     "codes": [], "estimation_algos": [],
+                     "code_estimation_algos": {}, "code_reducers": {}}
+            groups.append(group)
+        if code in group["codes"]:
+            continue
+        group["codes"].append(code)
+        group["code_estimation_algos"][code] = algo
+        group["code_reducers"][code] = reducers[i]
+        if not algo in group["estimation_algos"]:
+            group["estimation_algos"].append(algo)
+
+    if len(groups) < len(set(processing_codes)):
+        logger.debug("Processing codes grouped in " + str(len(groups)) + " pipelines: "
+                     + str([g["codes"] for g in groups]))
+    return groups
+
+
+# Remove from a result the variables estimated for other processing codes.
+def splitResult(result:dict, exclude_vars:list, suffixes:list) -> dict:
+    """
+    Retorna uma cópia de um resultado {data: {variável: valor}} sem as
+    variáveis de 'exclude_vars' (estimadas para outros códigos de
+    processamento do mesmo grupo), com ou sem os sufixos do redutor.
+
+    Examples:
+        >>> result = {"2020-01-01": {"chla_surf_median": 1.2, "SS_surf_median": 8.1,
+        ...                          "img_time": "10:30"}}
+        >>> splitResult(result, ["SS_surf"], ["median"])
+        {'2020-01-01': {'chla_surf_median': 1.2, 'img_time': '10:30'}}
+    """
+    excluded = set(exclude_vars)
+    excluded.update(v + "_" + s for v in exclude_vars for s in suffixes if s != "")
+    return {date: {k: v for k, v in values.items() if not k in excluded}
+            for date, values in result.items()}
+
+
+# Statistics computed by a fused reducer.
+def fusedStatistics(suffix_lists:list) -> list:
+    """
+    Retorna, sem repetição, as estatísticas (sufixos de 'REDUCTION_SPECS')
+    de vários redutores, que podem ser calculadas por um único redutor
+    combinado.
+
+    Examples:
+        >>> fusedStatistics([["median"], ["mean", "stdDev"], ["mean"]])
+        ['median', 'mean', 'stdDev']
+    """
+    stats = []
+    for suffixes in suffix_lists:
+        for s in suffixes:
+            if s != "" and not s in stats:
+                stats.append(s)
+    return stats
+
+
+# Keep only the statistics of one reducer in the result of a fused reduction.
+def selectStatistics(result:dict, reduced_bands:list, keep:list, statistics:list) -> dict:
+    """
+    Retorna uma cópia do resultado de uma redução combinada (ver
+    'fusedStatistics') apenas com as estatísticas 'keep' das bandas
+    reduzidas. As demais variáveis (propriedades das imagens) são mantidas.
+
+    Examples:
+        >>> result = {"2020-01-01": {"red_median": 0.1, "red_mean": 0.2,
+        ...                          "red_stdDev": 0.01, "img_time": "10:30"}}
+        >>> selectStatistics(result, ["red"], ["median"], ["median", "mean", "stdDev"])
+        {'2020-01-01': {'red_median': 0.1, 'img_time': '10:30'}}
+    """
+    dropped = {b + "_" + s for b in reduced_bands for s in statistics if not s in keep}
+    return {date: {k: v for k, v in values.items() if not k in dropped}
+            for date, values in result.items()}
+
+
+# Group the processing groups of products of the same family.
+def familyRuns(plan:list, families:dict = None) -> list:
+    """
+    Junta os grupos de processamento (ver 'planProcessing') de produtos de
+    uma mesma família (por exemplo, MOD09GA e MYD09GA) e com o mesmo
+    algoritmo de processamento de imagens, cujas coleções processadas podem
+    ser unidas e reduzidas em uma única requisição. Uma execução não tem
+    dois grupos do mesmo produto.
+
+    Args:
+        plan: Grupos retornados por 'planProcessing'.
+        families: Dicionário {família: lista de produtos}. Se 'None', cada
+            grupo forma uma execução própria.
+
+    Returns:
+        Lista de execuções (listas de grupos), na ordem dos grupos.
+
+    Examples:
+        >>> plan = planProcessing([10110001, 10210001, 30109001], [101, 102, 301],
+        ...                       [1, 1, 9], [0, 0, 0], [1, 1, 1])
+        >>> runs = familyRuns(plan, {"MODIS": [101, 102], "Landsat": [301, 302]})
+        >>> [[g["product_id"] for g in run] for run in runs]
+        [[101, 102], [301]]
+    """
+    if families is None:
+        families = {}
+    productFamily = {p: f for f, products in families.items() for p in products}
+    runs = []
+    for group in plan:
+        family = productFamily.get(group["product_id"])
+        run = None
+        if family is not None:
+            for r in runs:
+                if (productFamily.get(r[0]["product_id"]) == family
+                    and r[0]["img_proc_algo"] == group["img_proc_algo"]
+                    and not group["product_id"] in [g["product_id"] for g in r]):
+                    run = r
+                    break
+        if run is None:
+            run = []
+            runs.append(run)
+        run.append(group)
+
+    if len(runs) < len(plan):
+        logger.debug("Products merged by family: "
+                     + str([[g["product_id"] for g in r] for r in runs if len(r) > 1]))
+    return runs
+
+
+# Split the result of a merged product family by product.
+def splitFamilyResult(result:dict) -> dict:
+    """
+    Separa por produto o resultado da redução de uma coleção que une os
+    produtos de uma família, cujas chaves combinam a data e o produto
+    ('data/produto').
+
+    Returns:
+        Dicionário {produto: {data: {variável: valor}}}.
+
+    Examples:
+        >>> splitFamilyResult({"2020-01-01/101": {"red_median": 0.1},
+        ...                    "2020-01-01/102": {"red_median": 0.2}})
+        {101: {'2020-01-01': {'red_median': 0.1}}, 102: {'2020-01-01': {'red_median': 0.2}}}
+    """
+    products = {}
+    for key, values in result.items():
+        date, productID = key.rsplit(FAMILY_KEY_SEPARATOR, 1)
+        products.setdefault(int(productID), {})[date] = values
+    return products
+
+
+# Properties and bands needed to produce the requested output columns.
+def projectColumns(columns:list, properties:list, bands:list, suffixes:list) -> tuple:
+    """
+    Seleciona as propriedades das imagens e as bandas que precisam ser
+    reduzidas e transferidas para produzir as colunas de saída solicitadas.
+    As colunas podem incluir o prefixo do código de processamento (por
+    exemplo, '10110001_sur_refl_b01_median').
+
+    Args:
+        columns: Colunas de saída solicitadas. Se 'None', tudo é mantido.
+        properties: Propriedades das imagens ('export_vars').
+        bands: Bandas reduzidas (bandas do produto e variáveis estimadas).
+        suffixes: Sufixos do redutor (ver 'REDUCTION_SPECS').
+
+    Returns:
+        Tupla (propriedades, bandas) a serem mantidas, na ordem original.
+
+    Examples:
+        >>> projectColumns(["chla_surf_median", "qual_flag"],
+        ...                ["img_time", "qual_flag", "n_selected_pixels"],
+        ...                ["sur_refl_b01", "chla_surf"], ["median"])
+        (['qual_flag'], ['chla_surf'])
+    """
+    if columns is None:
+        return list(properties), list(bands)
+    wanted = set()
+    for column in columns:
+        prefix, _, rest = column.partition("_")
+        wanted.add(rest if prefix.isdigit() and rest != "" else column)
+    keptProperties = [p for p in properties if p in wanted]
+    keptBands = [b for b in bands
+                 if b in wanted or any(b + "_" + s in wanted for s in suffixes if s != "")]
+    return keptProperties, keptBands
+
+
+# Output columns named after common bands, also in product band names.
+def productColumns(columns:list, bandRenaming:list) -> list:
+    """
+    Acrescenta às colunas de saída solicitadas com os nomes comuns das
+    bandas (modo 'append', por exemplo 'red_median') as colunas equivalentes
+    com os nomes das bandas dos produtos, usados por 'projectColumns'.
+
+    Args:
+        columns: Colunas de saída solicitadas.
+        bandRenaming: Pares (banda do produto, nome comum) de todos os
+            produtos (ver 'commonBandRenaming').
+
+    Examples:
+        >>> productColumns(["red_median", "qual_flag"],
+        ...                [("sur_refl_b01", "red"), ("SR_B4", "red"), ("SR_B3", "green")])
+        ['red_median', 'qual_flag', 'sur_refl_b01_median', 'SR_B4_median']
+    """
+    expanded = list(columns)
+    for column in columns:
+        prefix, _, rest = column.partition("_")
+        name = rest if prefix.isdigit() and rest != "" else column
+        for real, common in bandRenaming:
+            if name == common or name.startswith(common + "_"):
+                productColumn = real + name[len(common):]
+                if not productColumn in expanded:
+                    expanded.append(productColumn)
+    return expanded
+
+
+# Estimate the requests and the pixels of a retrieval, without running it.
+def estimateRetrieval(aois:list, runs:list, rough_scales:dict, sim_imgs:dict,
+                      applicable:dict, max_n_proc_pixels:int = 25000,
+                      fuse_reducers:bool = True, execution_mode:str = "interactive",
+                      sites_per_task:int = 50) -> dict:
+    """
+    Estima, sem consultar as imagens, o número de requisições ('getInfo')
+    e de pixels processados de uma recuperação, repetindo a divisão em grupos
+    de datas de 'specificDatesRetrieval'. Como a disponibilidade das imagens
+    não é consultada, todas as datas são consideradas disponíveis (limite
+    superior).
+
+    Args:
+        aois: Lista de dicionários {"sites": número de locais, "dates":
+            número de datas, "area": área em m²}, um por área de interesse.
+        runs: Execuções retornadas por 'familyRuns'.
+        rough_scales: Dicionário {produto: resolução aproximada (m)}.
+        sim_imgs: Dicionário {algoritmo de processamento: imagens simultâneas}.
+        applicable: Dicionário {algoritmo de processamento: produtos aos
+            quais ele se aplica}.
+        max_n_proc_pixels, fuse_reducers, execution_mode, sites_per_task:
+            Parâmetros de 'specificDatesRetrieval'.
+
+    Returns:
+        Dicionário com as chaves 'sites', 'unique_aois', 'site_dates',
+        'getinfo_calls', 'export_tasks', 'runs' (códigos, grupos de datas e
+        requisições de cada execução) e 'codes' ({código: {'product_id',
+        'applicable', 'pixels'}}).
+
+    Examples:
+        >>> plan = planProcessing([10110001], [101], [1], [0], [1])
+        >>> report = estimateRetrieval([{"sites": 2, "dates": 30, "area": 2.5e6}],
+        ...                            familyRuns(plan), {101: 500}, {1: 500}, {1: [101]})
+        >>> report["runs"][0]["date_groups"], report["getinfo_calls"], report["codes"][10110001]["pixels"]
+        (1, 3, 300)
+    """
+    report = {"sites": sum(a["sites"] for a in aois), "unique_aois": len(aois),
+              "site_dates": sum(a["dates"] for a in aois), "getinfo_calls": 0,
+              "export_tasks": 0, "runs": [], "codes": {}}
+    for run in runs:
+        members = []
+        for group in run:
+            isApplicable = group["product_id"] in applicable[group["img_proc_algo"]]
+            for code in group["codes"]:
+                report["codes"][code] = {"product_id": group["product_id"],
+                                         "applicable": isApplicable, "pixels": 0}
+            if isApplicable:
+                members.append(group)
+        runReport = {"codes": [c for group in run for c in group["codes"]],
+                     "date_groups": 0, "getinfo_calls": 0}
+        report["runs"].append(runReport)
+        if members == []:
+            continue
+
+        reducers = {group["code_reducers"][c] for group in members for c in group["codes"]}
+        nReductions = len(reducers)
+        if fuse_reducers and len(reducers - {0}) > 1:
+            nReductions = 1 + (0 in reducers)
+        finestScale = min(rough_scales[group["product_id"]] for group in members)
+        for aoi in aois:
+            for group in members:
+                for code in group["codes"]:
+                    report["codes"][code]["pixels"] += round(
+                        aoi["dates"] * aoi["area"] / rough_scales[group["product_id"]] ** 2)
+            if execution_mode == "batch":
+                continue
+            nPixelsInAoI = max(aoi["area"] / finestScale ** 2, 1)
+            groupLen = min(math.ceil(max_n_proc_pixels / nPixelsInAoI),
+                           sim_imgs[members[0]["img_proc_algo"]])
+            nGroups = math.ceil(aoi["dates"] / groupLen)
+            runReport["date_groups"] += nGroups
+            # Availability, AOI size and one reduction per date group and reducer.
+            runReport["getinfo_calls"] += 2 + nGroups * nReductions
+
+        if execution_mode == "batch":
+            # One task per code and chunk of sites; at least one download request each.
+            nTasks = sum(len(group["codes"]) for group in members) * math.ceil(
+                len(aois) / sites_per_task)
+            report["export_tasks"] += nTasks
+            runReport["getinfo_calls"] = nTasks
+        report["getinfo_calls"] += runReport["getinfo_calls"]
+    return report
+
+
+# Human-readable summary of 'estimateRetrieval'.
+def formatPlanReport(report:dict) -> str:
+    """
+    Retorna o relatório de 'estimateRetrieval' como texto.
+    """
+    lines = [str(report["sites"]) + " sites (" + str(report["unique_aois"])
+             + " unique areas of interest), " + str(report["site_dates"]) + " site-dates.",
+             "Expected getInfo() calls: " + str(report["getinfo_calls"])
+             + ". Export tasks: " + str(report["export_tasks"]) + "."]
+    for run in report["runs"]:
+        lines.append("Codes " + ", ".join(str(c) for c in run["codes"]) + ": "
+                     + str(run["date_groups"]) + " date groups, "
+                     + str(run["getinfo_calls"]) + " getInfo() calls.")
+    for code, codeReport in report["codes"].items():
+        if codeReport["applicable"]:
+            lines.append("Code " + str(code) + " (product " + str(codeReport["product_id"])
+                         + "): ~" + str(codeReport["pixels"]) + " pixels processed.")
+        else:
+            lines.append("(!) Code " + str(code) + ": the image processing algorithm is not "
+                         + "applicable to the product " + str(codeReport["product_id"])
+                         + ". It will be skipped.")
+    return "\n".join(lines)
@@ -0,0 +1,218 @@
+import json
+import logging
+import threading
+from time import time
+from datetime import timedelta
+from contextlib import contextmanager
+
+from rich.progress import Progress, TextColumn, BarColumn, MofNCompleteColumn
+
+from metrics import getMetrics, _atomicWrite
+
+# Default interval (seconds) between two updates of the display and of the
+# progress file.
+PROGRESS_INTERVAL = 5
+
+logger = logging.getLogger("geedar")
+
+_lock = threading.Lock()
+_state = {}
+_writer = None
+
+
+def _counterTotal(snapshot:dict, name:str) -> float:
+    return sum(c["value"] for c in snapshot["counters"].get(name, []))
+
+
+# Start tracking the progress of a retrieval.
+def startProgress(sites_total:int):
+    """
+    Inicia o acompanhamento do progresso de uma recuperação com
+    'sites_total' locais. As requisições, repetições e falhas são contadas a
+    partir das métricas (ver 'metrics') desde este momento.
+    """
+    metrics = getMetrics()
+    now = time()
+    with _lock:
+        _state.clear()
+        _state.update({
+            "state": "running", "sites_total": sites_total, "sites_done": 0,
+            "groups_in_flight": 0, "groups_done": 0, "started_at": now,
+            "last_progress_at": now,
+            "baseline": {name: _counterTotal(metrics, name)
+                         for name in ["requests", "retries", "failures", "throttled"]}})
+
+
+# Count sites as done.
+def advanceProgress(sites:int = 1):
+    """
+    Registra a conclusão de 'sites' locais.
+    """
+    with _lock:
+        if _state == {}:
+            return
+        _state["sites_done"] = _state["sites_done"] + sites
+        _state["last_progress_at"] = time()
+
+
+# Track a date group (one round of processing and reduction requests).
+@contextmanager
+def trackGroup():
+    """
+    Conta um grupo de datas como 'em andamento' enquanto o bloco é executado.
+    Pode ser usado por várias threads ao mesmo tempo.
+    """
+    with _lock:
+        if _state != {}:
+            _state["groups_in_flight"] = _state["groups_in_flight"] + 1
+    try:
+        yield
+    finally:
+        with _lock:
+            if _state != {}:
+                _state["groups_in_flight"] = _state["groups_in_flight"] - 1
+                _state["groups_done"] = _state["groups_done"] + 1
+                _state["last_progress_at"] = time()
+
+
+# Mark the retrieval as finished.
+def finishProgress():
+    """
+    Marca a recuperação como concluída.
+    """
+    with _lock:
+        if _state != {}:
+            _state["state"] = "finished"
+            _state["last_progress_at"] = time()
+
+
+# Get a snapshot of the progress, with the throughput and the ETA.
+def getProgress() -> dict:
+    """
+    Retorna o progresso atual: locais concluídos e totais, grupos de datas
+    em andamento e concluídos, requisições, repetições e falhas, requisições
+    por minuto, taxa de repetição, tempo restante estimado ('eta_seconds',
+    extrapolado dos locais concluídos) e os instantes de início, da última
+    atualização e do último avanço ('last_progress_at'), que permitem
+    detectar uma execução parada.
+    """
+    metrics = getMetrics()
+    now = time()
+    with _lock:
+        if _state == {}:
+            return {"state": "idle", "updated_at": now}
+        progress = {k: v for k, v in _state.items() if k != "baseline"}
+        for name, value in _state["baseline"].items():
+            progress[name] = _counterTotal(metrics, name) - value
+    elapsed = now - progress["started_at"]
+    progress["updated_at"] = now
+    progress["elapsed_seconds"] = elapsed
+    progress["requests_per_minute"] = progress["requests"] / elapsed * 60 if elapsed > 0 else 0.0
+    progress["retry_rate"] = (progress["retries"] / progress["requests"]
+                              if progress["requests"] > 0 else 0.0)
+    remaining = progress["sites_total"] - progress["sites_done"]
+    if progress["state"] == "finished" or remaining <= 0:
+        progress["eta_seconds"] = 0.0
+    elif progress["sites_done"] > 0:
+        progress["eta_seconds"] = elapsed / progress["sites_done"] * remaining
+    else:
+        progress["eta_seconds"] = None
+    return progress
+
+
+# One-line summary of a progress snapshot.
+def formatProgress(progress:dict) -> str:
+    """
+    Retorna um resumo do progresso em uma linha.
+
+    Examples:
+        >>> formatProgress({"requests_per_minute": 42.0, "retry_rate": 0.025,
+        ...                 "groups_in_flight": 2, "eta_seconds": 3725})
+        '42.0 req/min, 2.5% retries, 2 groups in flight, ETA 1:02:05'
+    """
+    eta = progress.get("eta_seconds")
+    return (str(round(progress.get("requests_per_minute", 0.0), 1)) + " req/min, "
+            + str(round(100 * progress.get("retry_rate", 0.0), 1)) + "% retries, "
+            + str(progress.get("groups_in_flight", 0)) + " groups in flight, ETA "
+            + (str(timedelta(seconds=round(eta))) if eta is not None else "?"))
+
+
+# Save the progress as JSON.
+def writeProgress(path:str):
+    """
+    Salva o progresso atual em um arquivo JSON, substituído atomicamente.
+    """
+    _atomicWrite(path, json.dumps(getProgress(), indent=2))
+
+
+# Write the progress file periodically in a background thread.
+def startProgressFile(path:str, interval:float = PROGRESS_INTERVAL):
+    """
+    Atualiza o arquivo de progresso a cada 'interval' segundos, em segundo
+    plano, até que 'stopProgressFile' seja chamada.
+    """
+    global _writer
+    stopProgressFile()
+    stopEvent = threading.Event()
+
+    def run():
+        while not stopEvent.wait(interval):
+            try:
+                writeProgress(path)
+            except Exception as e:
+                logger.warning("(!) Failed to write the progress file: " + str(e))
+
+    thread = threading.Thread(target=run, name="geedar-progress", daemon=True)
+    thread.start()
+    _writer = (thread, stopEvent, path)
+
+
+# Stop the periodic progress file, writing it a last time.
+def stopProgressFile():
+    """
+    Interrompe a atualização periódica do arquivo de progresso, que é
+    escrito uma última vez.
+    """
+    global _writer
+    if _writer is not None:
+        thread, stopEvent, path = _writer
+        stopEvent.set()
+        thread.join()
+        _writer = None
+        writeProgress(path)
+
+
+# Live progress bar in the console.
+@contextmanager
+def progressDisplay(console = None, interval:float = 1):
+    """
+    Exibe, enquanto o bloco é executado, uma barra de progresso (locais
+    concluídos/total) com as requisições por minuto, a taxa de repetição, os
+    grupos em andamento e o tempo restante estimado. As mensagens do log
+    continuam sendo exibidas acima da barra.
+    """
+    with Progress(TextColumn("{task.description}"), BarColumn(), MofNCompleteColumn(),
+                  TextColumn("{task.fields[summary]}"), console=console,
+                  redirect_stdout=True, redirect_stderr=True) as display:
+        task = display.add_task("Sites", total=None, summary="")
+        stopEvent = threading.Event()
+
+        def update():
+            progress = getProgress()
+            if progress["state"] != "idle":
+                display.update(task, total=progress["sites_total"],
+                               completed=progress["sites_done"],
+                               summary=formatProgress(progress))
+
+        def run():
+            while not stopEvent.wait(interval):
+                update()
+
+        thread = threading.Thread(target=run, name="geedar-display", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stopEvent.set()
+            thread.join()
+            update()
@@ -0,0 +1,173 @@
+import logging
+import threading
+from time import monotonic
+from contextlib import contextmanager
+
+from metrics import incrementCounter, setGauge, observe
+
+# Default limits of the Earth Engine requests issued by this process:
+## qps: requests started per second;
+## concurrency: requests running at the same time.
+DEFAULT_QPS = 10
+DEFAULT_CONCURRENCY = 10
+
+# Adaptive rate: multiplicative decrease on throttling (429) responses and
+# additive increase (fraction of the configured rate) on each success.
+BACKOFF_FACTOR = 0.5
+RECOVERY_STEP = 0.05
+MIN_QPS = 0.2
+
+# Fragments of the error messages of throttled requests.
+THROTTLING_MESSAGES = ["429", "too many requests", "rate limit", "quota exceeded",
+                       "too many concurrent"]
+
+logger = logging.getLogger("geedar")
+
+
+# Check whether an exception corresponds to a throttled request.
+def isThrottlingError(error:Exception) -> bool:
+    """
+    Indica se a exceção corresponde a uma requisição recusada por excesso
+    de requisições (HTTP 429, cota excedida, etc.).
+
+    Examples:
+        >>> isThrottlingError(Exception("Too Many Requests: Request was rejected."))
+        True
+        >>> isThrottlingError(Exception("Computation timed out."))
+        False
+    """
+    message = str(error).lower()
+    return any(m in message for m in THROTTLING_MESSAGES)
+
+
+# Token bucket (requests per second) combined with a concurrency limit.
+class RateLimiter:
+    """
+    Limitador de requisições: um 'token bucket' limita o número de
+    requisições iniciadas por segundo e um contador limita as requisições
+    simultâneas. No modo adaptativo, a taxa é reduzida à metade a cada
+    requisição recusada pelo servidor e recuperada gradualmente a cada
+    requisição bem-sucedida.
+
+    Args:
+        qps: Requisições por segundo. Se menor ou igual a zero, sem limite.
+        concurrency: Requisições simultâneas. Se menor ou igual a zero, sem limite.
+        adaptive: Se a taxa deve se adaptar às respostas do servidor.
+    """
+    def __init__(self, qps:float = DEFAULT_QPS, concurrency:int = DEFAULT_CONCURRENCY,
+                 adaptive:bool = True):
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self.configure(qps, concurrency, adaptive)
+
+    def configure(self, qps:float = None, concurrency:int = None, adaptive:bool = None):
+        with self._cond:
+            if qps is not None:
+                self.qps = qps
+                self._rate = qps
+                self._tokens = max(1.0, qps)
+                self._updated = monotonic()
+            if concurrency is not None:
+                self.concurrency = concurrency
+            if adaptive is not None:
+                self.adaptive = adaptive
+            self._cond.notify_all()
+        self._updateGauges()
+
+    def _refill(self):
+        now = monotonic()
+        if self.qps > 0:
+            self._tokens = min(max(1.0, self._rate),
+                               self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def _updateGauges(self):
+        setGauge("ratelimit_queue_depth", self._waiting)
+        setGauge("ratelimit_active_requests", self._active)
+        setGauge("ratelimit_qps", self._rate if self.qps > 0 else 0)
+
+    def acquire(self):
+        """
+        Aguarda até que uma requisição possa ser iniciada.
+        """
+        start = monotonic()
+        with self._cond:
+            self._waiting = self._waiting + 1
+            self._updateGauges()
+            try:
+                while True:
+                    self._refill()
+                    concurrencyOK = self.concurrency <= 0 or self._active < self.concurrency
+                    rateOK = self.qps <= 0 or self._tokens >= 1
+                    if concurrencyOK and rateOK:
+                        if self.qps > 0:
+                            self._tokens = self._tokens - 1
+                        self._active = self._active + 1
+                        break
+                    timeout = None
+                    if concurrencyOK:
+                        timeout = (1 - self._tokens) / self._rate
+                    self._cond.wait(timeout)
+            finally:
+                self._waiting = self._waiting - 1
+                self._updateGauges()
+        observe("ratelimit_wait_seconds", monotonic() - start)
+
+    def release(self, throttled:bool = False):
+        """
+        Libera uma requisição concluída. 'throttled' indica que ela foi
+        recusada por excesso de requisições.
+        """
+        with self._cond:
+            self._active = self._active - 1
+            if self.adaptive and self.qps > 0:
+                if throttled:
+                    self._refill()
+                    self._rate = max(MIN_QPS, self._rate * BACKOFF_FACTOR)
+                    self._tokens = min(self._tokens, 0.0)
+                    logger.warning("(!) Earth Engine requests throttled. Rate reduced to "
+                                   + str(round(self._rate, 2)) + " requests/s.")
+                elif self._rate < self.qps:
+                    self._refill()
+                    self._rate = min(self.qps, self._rate + self.qps * RECOVERY_STEP)
+            self._cond.notify_all()
+            self._updateGauges()
+        if throttled:
+            incrementCounter("throttled")
+
+    @contextmanager
+    def limit(self):
+        """
+        Executa um bloco de código (uma requisição) respeitando os limites.
+        """
+        self.acquire()
+        throttled = False
+        try:
+            yield
+        except Exception as e:
+            throttled = isThrottlingError(e)
+            raise
+        finally:
+            self.release(throttled)
+
+
+# Limiter shared by all Earth Engine requests of the process.
+_limiter = RateLimiter()
+
+
+# Configure the shared limiter.
+def configureRateLimit(qps:float = None, concurrency:int = None, adaptive:bool = None):
+    """
+    Altera os limites do limitador compartilhado por todas as requisições
+    ao Earth Engine ('tracedGetInfo'). Parâmetros 'None' não são alterados.
+    """
+    _limiter.configure(qps, concurrency, adaptive)
+
+
+# Get the shared limiter.
+def getRateLimiter() -> RateLimiter:
+    """
+    Retorna o limitador compartilhado por todas as requisições.
+    """
+    return _limiter
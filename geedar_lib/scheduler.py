@@ -0,0 +1,201 @@
+import math
+
+# MODIS sinusoidal grid: sphere radius and tile size (meters).
+MODIS_SPHERE_RADIUS = 6371007.181
+MODIS_TILE_SIZE = 1111950.5197665554
+
+# WRS-2 (Landsat 4-9): number of paths and rows, inclination and ratio
+# between the orbital period and the length of the day.
+WRS2_PATHS = 233
+WRS2_ROWS = 248
+WRS2_INCLINATION = 98.2
+WRS2_PERIOD_RATIO = 98.884 / 1436.07
+# Approximate longitude of the descending node of path 1.
+WRS2_PATH1_LONGITUDE = -64.6
+
+# UTM/MGRS (WGS84).
+UTM_K0 = 0.9996
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+MGRS_BANDS = "CDEFGHJKLMNPQRSTUVWXX"
+MGRS_COLUMN_SETS = ["STUVWXYZ", "ABCDEFGH", "JKLMNPQR"]
+MGRS_ROWS = "ABCDEFGHJKLMNPQRSTUV"
+
+# Cell size (degrees) of the grid used for products without a tiling scheme.
+GRID_CELL_SIZE = 1.0
+
+
+# MODIS (and VIIRS) sinusoidal tile of a point.
+def modisTile(lat:float, long:float) -> str:
+    """
+    Retorna o tile (hXXvYY) da grade senoidal do MODIS que contém o ponto.
+
+    Examples:
+        >>> modisTile(-15.8, -47.9)
+        'h13v10'
+    """
+    x = MODIS_SPHERE_RADIUS * math.radians(long) * math.cos(math.radians(lat))
+    y = MODIS_SPHERE_RADIUS * math.radians(lat)
+    h = math.floor((x + 18 * MODIS_TILE_SIZE) / MODIS_TILE_SIZE)
+    v = math.floor((9 * MODIS_TILE_SIZE - y) / MODIS_TILE_SIZE)
+    return "h{:02d}v{:02d}".format(min(max(h, 0), 35), min(max(v, 0), 17))
+
+
+# Approximate Landsat WRS-2 path/row of a point.
+def wrs2PathRow(lat:float, long:float) -> str:
+    """
+    Retorna, de forma aproximada (a partir de uma órbita circular ideal), o
+    path/row da grade WRS-2 do Landsat (passagem descendente) que contém o
+    ponto. Perto das bordas, o resultado pode diferir do path/row oficial em
+    uma unidade, o que é suficiente para agrupar locais vizinhos.
+    """
+    inclination = math.radians(WRS2_INCLINATION)
+    ratio = max(-1.0, min(1.0, -math.sin(math.radians(lat)) / math.sin(inclination)))
+    # Angle along the orbit, from the descending node.
+    t = math.asin(ratio)
+    nodeOffset = math.degrees(math.atan2(math.cos(inclination) * math.sin(t), math.cos(t))
+                              - WRS2_PERIOD_RATIO * t)
+    nodeLong = long - nodeOffset
+    path = round((WRS2_PATH1_LONGITUDE - nodeLong) / (360 / WRS2_PATHS)) % WRS2_PATHS + 1
+    row = round(60 + t * WRS2_ROWS / (2 * math.pi))
+    return "{:03d}{:03d}".format(path, row)
+
+
+# UTM zone, easting and northing of a point.
+def utmCoordinates(lat:float, long:float) -> tuple:
+    """
+    Retorna a zona UTM e as coordenadas (leste, norte), em metros, de um
+    ponto. No hemisfério sul, o falso norte de 10 000 km é somado.
+    """
+    zone = int((long + 180) // 6) + 1
+    if 56 <= lat < 64 and 3 <= long < 12:
+        zone = 32
+    elif lat >= 72:
+        for z, (west, east) in {31: (0, 9), 33: (9, 21), 35: (21, 33), 37: (33, 42)}.items():
+            if west <= long < east:
+                zone = z
+    zone = min(zone, 60)
+
+    e2 = WGS84_F * (2 - WGS84_F)
+    ep2 = e2 / (1 - e2)
+    phi = math.radians(lat)
+    sinPhi = math.sin(phi)
+    cosPhi = math.cos(phi)
+    n = WGS84_A / math.sqrt(1 - e2 * sinPhi ** 2)
+    t = math.tan(phi) ** 2
+    c = ep2 * cosPhi ** 2
+    a = cosPhi * math.radians(long - (zone * 6 - 183))
+    m = WGS84_A * ((1 - e2 / 4 - 3 * e2 ** 2 / 64 - 5 * e2 ** 3 / 256) * phi
+                   - (3 * e2 / 8 + 3 * e2 ** 2 / 32 + 45 * e2 ** 3 / 1024) * math.sin(2 * phi)
+                   + (15 * e2 ** 2 / 256 + 45 * e2 ** 3 / 1024) * math.sin(4 * phi)
+                   - (35 * e2 ** 3 / 3072) * math.sin(6 * phi))
+    easting = UTM_K0 * n * (a + (1 - t + c) * a ** 3 / 6
+                            + (5 - 18 * t + t ** 2 + 72 * c - 58 * ep2) * a ** 5 / 120) + 500000
+    northing = UTM_K0 * (m + n * math.tan(phi) * (
+        a ** 2 / 2 + (5 - t + 9 * c + 4 * c ** 2) * a ** 4 / 24
+        + (61 - 58 * t + t ** 2 + 600 * c - 330 * ep2) * a ** 6 / 720))
+    if lat < 0:
+        northing = northing + 10000000
+    return zone, easting, northing
+
+
+# Sentinel-2 (MGRS) tile of a point.
+def mgrsTile(lat:float, long:float) -> str:
+    """
+    Retorna o tile MGRS (grade do Sentinel-2) que contém o ponto.
+
+    Examples:
+        >>> mgrsTile(40.7, -74.0)
+        '18TWL'
+    """
+    zone, easting, northing = utmCoordinates(lat, long)
+    band = MGRS_BANDS[min(max(int((lat + 80) // 8), 0), len(MGRS_BANDS) - 1)]
+    columns = MGRS_COLUMN_SETS[zone % 3]
+    column = columns[min(max(int(easting // 100000) - 1, 0), len(columns) - 1)]
+    row = MGRS_ROWS[(int(northing // 100000) + (5 if zone % 2 == 0 else 0)) % len(MGRS_ROWS)]
+    return "{:02d}{}{}{}".format(zone, band, column, row)
+
+
+# Tile of the acquisition grid of a product that contains a point.
+def siteTileKey(productID:int, lat:float, long:float) -> str:
+    """
+    Retorna o identificador do tile da grade de aquisição do produto (tile
+    senoidal do MODIS/VIIRS, tile MGRS do Sentinel-2 ou path/row WRS-2 do
+    Landsat) que contém o ponto. Para os demais produtos, retorna a célula de
+    uma grade regular de 'GRID_CELL_SIZE' graus.
+    """
+    family = productID // 100 if productID is not None else 0
+    if family == 1:
+        return "MODIS_" + modisTile(lat, long)
+    if family == 2:
+        return "MGRS_" + mgrsTile(lat, long)
+    if family == 3:
+        return "WRS2_" + wrs2PathRow(lat, long)
+    return "GRID_{}_{}".format(math.floor(lat / GRID_CELL_SIZE),
+                               math.floor(long / GRID_CELL_SIZE))
+
+
+# Z-order (Morton) key of a point, for locality-preserving sorting.
+def mortonKey(lat:float, long:float, bits:int = 16) -> int:
+    """
+    Retorna a chave de Morton (curva Z) de um ponto, que ordena pontos
+    próximos em posições próximas.
+
+    Examples:
+        >>> mortonKey(-90, -180), mortonKey(90, 180) == 4 ** 16 - 1
+        (0, True)
+    """
+    scale = (1 << bits) - 1
+    x = round((long + 180) / 360 * scale)
+    y = round((lat + 90) / 180 * scale)
+    key = 0
+    for i in range(bits):
+        key = key | ((x >> i) & 1) << (2 * i) | ((y >> i) & 1) << (2 * i + 1)
+    return key
+
+
+# Bounding box of a list of polygons.
+def polygonsBoundingBox(polygons:list) -> tuple:
+    """
+    Retorna o retângulo envolvente (longitude mínima, latitude mínima,
+    longitude máxima, latitude máxima) de uma lista de polígonos.
+    """
+    longs = [p[0] for polygon in polygons for p in polygon[0]]
+    lats = [p[1] for polygon in polygons for p in polygon[0]]
+    return min(longs), min(lats), max(longs), max(lats)
+
+
+# Group and order sites by acquisition tile and spatial proximity.
+def scheduleSites(boxes:dict, productID:int = None) -> list:
+    """
+    Agrupa os locais pelo tile da grade de aquisição do produto que contém o
+    centro de seus retângulos envolventes e os ordena ao longo de uma curva Z,
+    de modo que requisições consecutivas usem as mesmas cenas.
+
+    Args:
+        boxes: Dicionário local -> (long. mín., lat. mín., long. máx., lat. máx.).
+        productID: Produto cuja grade define os grupos. Se 'None', usa uma
+            grade regular.
+
+    Returns:
+        Lista de pares (tile, lista de locais), na ordem de processamento.
+
+    Examples:
+        >>> boxes = {"a": (-48, -16, -47.9, -15.9), "b": (10, 45, 10.1, 45.1),
+        ...          "c": (-47.9, -15.9, -47.8, -15.8)}
+        >>> scheduleSites(boxes, 101)
+        [('MODIS_h13v10', ['a', 'c']), ('MODIS_h18v04', ['b'])]
+    """
+    groups = {}
+    for site, (minLong, minLat, maxLong, maxLat) in boxes.items():
+        lat = (minLat + maxLat) / 2
+        long = (minLong + maxLong) / 2
+        key = siteTileKey(productID, lat, long)
+        groups.setdefault(key, []).append((mortonKey(lat, long), site))
+
+    schedule = []
+    for key, sites in groups.items():
+        sites.sort(key=lambda s: s[0])
+        schedule.append((sites[0][0], key, [s[1] for s in sites]))
+    schedule.sort(key=lambda g: g[0])
+    return [(key, sites) for _, key, sites in schedule]
@@ -0,0 +1,361 @@
+import json
+import math
+import uuid
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from metrics import incrementCounter, setGauge, toPrometheus
+
+logger = logging.getLogger("geedar")
+
+# Default address and number of worker processes of the service.
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+SERVER_WORKERS = 2
+
+# Maximum number of finished jobs kept for retrieval by the clients.
+JOB_RETENTION = 1000
+
+
+# Worker process initialization: import the pipeline (and so initialize the
+# Earth Engine session and the product catalog) once per process, and set the
+# process's share of the request limits. The service configures the logging
+# of its workers; library callers (see 'aio') keep their own configuration.
+def _initWorker(qps:float = None, concurrency:int = None, configure_logging:bool = True):
+    import geedar
+    from logs import ensureLogging
+    from ratelimit import configureRateLimit
+    if configure_logging:
+        ensureLogging()
+    configureRateLimit(qps, concurrency)
+
+
+# Pool of worker processes, each with its own Earth Engine session.
+def makeWorkerPool(workers:int = SERVER_WORKERS, qps:float = None,
+                   concurrency:int = None, configure_logging:bool = True) -> ProcessPoolExecutor:
+    """
+    Cria o pool de processos de trabalho. Os limites de requisições ('qps' e
+    'concurrency') são divididos entre os processos. Se 'configure_logging',
+    cada processo configura o log padrão (ver 'ensureLogging').
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers, initializer=_initWorker,
+        initargs=(None if qps is None else qps / workers,
+                  None if concurrency is None else max(1, concurrency // workers),
+                  configure_logging),
+        mp_context=multiprocessing.get_context("spawn"))
+
+
+# Retrieve the data of one site and processing code for a list of dates.
+def retrieveSiteCode(site:dict, processingCode:int, dates:list, aoi_mode:str = "radius",
+                     aoi_radius:int = 1000, input_dir:str = "") -> dict:
+    """
+    Executa o pipeline de recuperação para um local e um código de
+    processamento, nas datas informadas. Executada nos processos de trabalho
+    do serviço.
+
+    Args:
+        site: Dicionário com 'id' e, fora do modo 'kml', 'lat' e 'long'.
+        processingCode: Código de processamento.
+        dates: Datas ('yyyy-mm-dd').
+        aoi_mode: 'kml' ou 'radius'.
+        aoi_radius: Raio, em metros, da área de interesse no modo 'radius'.
+        input_dir: Diretório dos arquivos KML.
+
+    Returns:
+        Dicionário {data: {variável: valor}}.
+    """
+    import pandas as pd
+    import geedar
+    from utils import unfoldProcessingCode
+
+    codes, productIDs, imgProcAlgos, estimationAlgos, reducers = unfoldProcessingCode(processingCode)
+    inputDF = pd.DataFrame({"date": dates, "id": [site.get("id")] * len(dates)})
+    if aoi_mode != "kml":
+        inputDF["lat"] = site["lat"]
+        inputDF["long"] = site["long"]
+    geedar.input_df = inputDF
+    geedar.time_window = 0
+
+    resultDF = geedar.specificDatesRetrieval(
+        running_mode=1, input_dir=input_dir, aoi_mode=aoi_mode,
+        aoi_radius=aoi_radius, processing_codes=codes, product_ids=productIDs,
+        img_proc_algos=imgProcAlgos, estimation_algos=estimationAlgos,
+        reducers=reducers)
+
+    result = {}
+    if resultDF is None:
+        return result
+    dataCols = [c for c in resultDF.columns if not c in inputDF.columns]
+    for row in resultDF.to_dict("records"):
+        values = {c: row[c] for c in dataCols
+                  if not (isinstance(row[c], float) and math.isnan(row[c]))}
+        if values != {}:
+            result[str(row["date"])[:10]] = values
+    return result
+
+
+# Retrieval jobs, queued to a worker pool, with coalescing of identical
+# in-flight (site, processing code, date) requests.
+class RetrievalService:
+    """
+    Serviço de recuperação de dados. Cada trabalho (lista de linhas
+    data/local e lista de códigos de processamento) é dividido em unidades
+    (local, código de processamento, data). Unidades idênticas a outras ainda
+    em execução, de qualquer cliente, não são recalculadas: o trabalho passa a
+    aguardar o resultado da unidade em andamento.
+
+    Args:
+        workers: Número de processos de trabalho.
+        executor: Executor alternativo (por exemplo, um 'ThreadPoolExecutor'
+            em testes). Se 'None', usa um pool de processos.
+        retrieve: Função que recupera os dados de um local e código de
+            processamento (ver 'retrieveSiteCode').
+        qps: Requisições por segundo ao Earth Engine, divididas entre os
+            processos. Se 'None', usa o padrão de cada processo.
+        concurrency: Requisições simultâneas, divididas entre os processos.
+    """
+    def __init__(self, workers:int = SERVER_WORKERS, executor = None,
+                 retrieve = retrieveSiteCode, qps:float = None,
+                 concurrency:int = None):
+        if executor is None:
+            executor = makeWorkerPool(workers, qps, concurrency)
+        self.executor = executor
+        self.retrieve = retrieve
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._jobs = {}
+        self._queued = 0
+
+    # Identification of the area of interest of a row.
+    def _siteKey(self, row:dict, aoi_mode:str, aoi_radius:int) -> tuple:
+        if aoi_mode == "kml":
+            return ("kml", str(row["id"]))
+        return ("radius", float(row["lat"]), float(row["long"]), aoi_radius)
+
+    def submit(self, job:dict) -> str:
+        """
+        Registra um trabalho e retorna seu identificador. O trabalho é um
+        dicionário com 'rows' (lista de {'date', 'id', 'lat', 'long'}),
+        'processing_codes' e, opcionalmente, 'aoi_mode', 'aoi_radius' e
+        'input_dir'.
+        """
+        rows = job.get("rows", [])
+        codes = [int(c) for c in job.get("processing_codes", [])]
+        aoi_mode = job.get("aoi_mode", "radius")
+        aoi_radius = int(job.get("aoi_radius", 1000))
+        input_dir = job.get("input_dir", "")
+        if rows == [] or codes == []:
+            raise ValueError("A job must have 'rows' and 'processing_codes'.")
+        for row in rows:
+            if not "date" in row or (aoi_mode == "kml" and not "id" in row) or (
+                    aoi_mode != "kml" and not ("lat" in row and "long" in row)):
+                raise ValueError("Each row must have 'date' and either 'id' (kml mode) "
+                                 + "or 'lat' and 'long'.")
+
+        jobID = uuid.uuid4().hex
+        units = {}
+        newUnits = {}
+        shared = 0
+        with self._lock:
+            for row in rows:
+                siteKey = self._siteKey(row, aoi_mode, aoi_radius)
+                date = str(row["date"])[:10]
+                for code in codes:
+                    key = (siteKey, code, date)
+                    if key in units:
+                        continue
+                    future = self._inflight.get(key)
+                    if future is None:
+                        future = Future()
+                        self._inflight[key] = future
+                        newUnits.setdefault((siteKey, code), (row, []))[1].append(date)
+                    else:
+                        shared = shared + 1
+                    units[key] = future
+            self._jobs[jobID] = {"rows": rows, "codes": codes, "aoi_mode": aoi_mode,
+                                 "aoi_radius": aoi_radius, "units": units,
+                                 "shared_units": shared}
+            self._queued = self._queued + len(newUnits)
+            self._trimJobs()
+
+        incrementCounter("service_jobs")
+        incrementCounter("service_units", len(units) - shared, coalesced="false")
+        incrementCounter("service_units", shared, coalesced="true")
+
+        for (siteKey, code), (row, dates) in newUnits.items():
+            site = {k: row[k] for k in ["id", "lat", "long"] if k in row}
+            try:
+                task = self.executor.submit(self.retrieve, site, code, dates,
+                                            aoi_mode, aoi_radius, input_dir)
+            except Exception as e:
+                task = Future()
+                task.set_exception(e)
+            task.add_done_callback(
+                lambda t, siteKey=siteKey, code=code, dates=dates:
+                    self._resolve(t, siteKey, code, dates))
+        self._updateGauges()
+        logger.info("Job " + jobID + ": " + str(len(units)) + " units ("
+                    + str(shared) + " shared with running jobs).")
+        return jobID
+
+    def _resolve(self, task:Future, siteKey:tuple, code:int, dates:list):
+        error = task.exception()
+        result = {} if error is not None else task.result()
+        with self._lock:
+            futures = [self._inflight.pop((siteKey, code, d)) for d in dates]
+            self._queued = self._queued - 1
+        if error is not None:
+            incrementCounter("failures", caller="RetrievalService")
+            logger.warning("(!) Retrieval failed for " + str(siteKey) + ", "
+                           + str(code) + ": " + str(error))
+        for d, future in zip(dates, futures):
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result.get(d, {}))
+        self._updateGauges()
+
+    def _trimJobs(self):
+        if len(self._jobs) > JOB_RETENTION:
+            finished = [k for k, j in self._jobs.items()
+                        if all(f.done() for f in j["units"].values())]
+            for k in finished[:len(self._jobs) - JOB_RETENTION]:
+                self._jobs.pop(k)
+
+    def _updateGauges(self):
+        setGauge("service_queue_depth", self._queued)
+        setGauge("service_inflight_units", len(self._inflight))
+
+    def status(self, job_id:str) -> dict:
+        """
+        Retorna o estado de um trabalho ('running' ou 'done') e, quando
+        concluído, suas linhas de resultado (com as colunas de cada código de
+        processamento prefixadas pelo código, se houver mais de um) e os erros.
+        Retorna 'None' se o trabalho não existir.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        units = job["units"]
+        nDone = sum(f.done() for f in units.values())
+        status = {"job_id": job_id, "units": len(units), "done_units": nDone,
+                  "shared_units": job["shared_units"]}
+        if nDone < len(units):
+            status["status"] = "running"
+            return status
+
+        resultRows = []
+        errors = {}
+        multipleCodes = len(job["codes"]) > 1
+        for row in job["rows"]:
+            resultRow = dict(row)
+            siteKey = self._siteKey(row, job["aoi_mode"], job["aoi_radius"])
+            date = str(row["date"])[:10]
+            for code in job["codes"]:
+                future = units[(siteKey, code, date)]
+                if future.exception() is not None:
+                    errors[str(code)] = str(future.exception())
+                    continue
+                prefix = str(code) + "_" if multipleCodes else ""
+                for k, v in future.result().items():
+                    resultRow[prefix + k] = v
+            resultRows.append(resultRow)
+        status["status"] = "done"
+        status["result"] = resultRows
+        status["errors"] = errors
+        return status
+
+    def health(self) -> dict:
+        with self._lock:
+            return {"status": "ok", "jobs": len(self._jobs),
+                    "queued_units": self._queued, "inflight_units": len(self._inflight)}
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+# HTTP/JSON interface of the retrieval service.
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def _send(self, code:int, body, content_type:str = "application/json"):
+        data = (json.dumps(body, default=str) if content_type == "application/json"
+                else body).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        if path == "/health":
+            self._send(200, self.service.health())
+        elif path == "/metrics":
+            self._send(200, toPrometheus(), "text/plain; version=0.0.4")
+        elif path.startswith("/jobs/"):
+            status = self.service.status(path[len("/jobs/"):])
+            if status is None:
+                self._send(404, {"error": "Job not found."})
+            else:
+                self._send(200, status)
+        else:
+            self._send(404, {"error": "Not found."})
+
+    def do_POST(self):
+        if self.path.split("?")[0].rstrip("/") != "/jobs":
+            self._send(404, {"error": "Not found."})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            job = json.loads(self.rfile.read(length) or b"{}")
+            jobID = self.service.submit(job)
+        except (ValueError, TypeError, KeyError) as e:
+            self._send(400, {"error": str(e)})
+        else:
+            self._send(202, {"job_id": jobID, "status": "running"})
+
+    def log_message(self, format, *args):
+        logger.debug("HTTP " + self.address_string() + " " + (format % args))
+
+
+# Create the HTTP server of a retrieval service.
+def makeServer(service:RetrievalService, host:str = SERVER_HOST,
+               port:int = SERVER_PORT) -> ThreadingHTTPServer:
+    """
+    Cria o servidor HTTP do serviço. Rotas: 'POST /jobs' (submete um
+    trabalho), 'GET /jobs/<id>' (estado e resultado), 'GET /health' e
+    'GET /metrics' (formato do Prometheus).
+    """
+    handler = type("Handler", (ServiceRequestHandler,), {"service": service})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+# Run the retrieval service until interrupted.
+def serve(host:str = SERVER_HOST, port:int = SERVER_PORT, workers:int = SERVER_WORKERS,
+          qps:float = None, concurrency:int = None):
+    """
+    Inicia o serviço de recuperação e atende requisições até ser
+    interrompido (Ctrl+C).
+    """
+    service = RetrievalService(workers, qps=qps, concurrency=concurrency)
+    # Start the worker processes now, so that the first job does not pay for
+    # the Earth Engine initialization.
+    for _ in range(workers):
+        service.executor.submit(int)
+    server = makeServer(service, host, port)
+    logger.info("GEEDaR service listening on http://" + host + ":" + str(port)
+                + " (" + str(workers) + " workers).")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+        logger.info("GEEDaR service stopped.")
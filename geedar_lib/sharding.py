@@ -0,0 +1,131 @@
+import hashlib
+import logging
+
+import pandas as pd
+
+logger = logging.getLogger("geedar")
+
+# Column with the position of each row in the original input file.
+INPUT_ROW_COL = "input_row"
+
+
+# Parse a shard specification ('i/N').
+def parseShard(shard:str) -> tuple:
+    """
+    Converte a especificação de partição 'i/N' (partição 'i' de 'N',
+    começando em 1) em uma tupla (i, N).
+
+    Examples:
+        >>> parseShard("2/8")
+        (2, 8)
+    """
+    try:
+        i, n = [int(v) for v in shard.split("/")]
+    except ValueError:
+        raise Exception("The shard must be in the form 'i/N' (e.g. '1/4'): '" + shard + "'.")
+    if n < 1 or not 1 <= i <= n:
+        raise Exception("Invalid shard '" + shard + "': 'i' must be between 1 and N.")
+    return i, n
+
+
+# Shard (1 to N) of a site, by a stable hash of its key.
+def siteShard(siteKey:str, n:int) -> int:
+    """
+    Retorna a partição (de 1 a 'n') de um local, calculada por um hash
+    estável (MD5) de sua chave, de modo que o resultado seja o mesmo em
+    qualquer processo ou máquina.
+
+    Examples:
+        >>> siteShard("site_1", 1)
+        1
+    """
+    digest = hashlib.md5(str(siteKey).encode("utf-8")).hexdigest()
+    return int(digest[:16], 16) % n + 1
+
+
+# Key of the site of each row: the 'id' column or the coordinates.
+def siteKeys(input_df:pd.DataFrame) -> pd.Series:
+    """
+    Retorna a chave do local de cada linha do data frame de entrada: o valor
+    da coluna 'id' ou, na sua ausência, a concatenação de 'lat' e 'long'.
+    """
+    colnames = [c.lower() for c in [*input_df.columns]]
+    if "id" in colnames:
+        return input_df.iloc[:, colnames.index("id")].astype(str)
+    if "lat" in colnames and "long" in colnames:
+        return (input_df.iloc[:, colnames.index("lat")].astype(str)
+                + input_df.iloc[:, colnames.index("long")].astype(str))
+    raise Exception("The input must have an 'id' column or 'lat' and 'long' columns to be sharded.")
+
+
+# Rows of the input that belong to a shard.
+def selectShard(input_df:pd.DataFrame, shard:int, n:int) -> pd.DataFrame:
+    """
+    Seleciona as linhas do data frame de entrada cujos locais pertencem à
+    partição 'shard' de 'n'. A coluna 'input_row', com a posição de cada linha
+    na entrada original, é acrescentada para que 'mergeShards' possa
+    restaurar a ordem.
+    """
+    shardDF = input_df.copy()
+    shardDF[INPUT_ROW_COL] = range(shardDF.shape[0])
+    keys = siteKeys(shardDF)
+    shards = {k: siteShard(k, n) for k in keys.unique()}
+    selected = keys.map(shards) == shard
+    logger.info("Shard " + str(shard) + "/" + str(n) + ": "
+                + str(int(selected.sum())) + " of " + str(shardDF.shape[0]) + " input rows, "
+                + str(sum(v == shard for v in shards.values())) + " of "
+                + str(len(shards)) + " sites.")
+    return shardDF[selected].reset_index(drop=True)
+
+
+# Output of a shard without input rows.
+def saveEmptyShard(shardDF:pd.DataFrame, path:str):
+    """
+    Salva o resultado de uma partição sem linhas de entrada (por exemplo,
+    com poucos locais e muitas partições): um arquivo CSV só com o
+    cabeçalho, incluindo 'input_row', de modo que 'mergeShards' encontre a
+    saída de todas as partições.
+    """
+    logger.info("No input rows in this shard. Saving an empty result.")
+    shardDF.iloc[:0].to_csv(path, index = False)
+
+
+# Combine the outputs of the shards in the order of the original input.
+def mergeShards(paths:list, keep_input_row:bool = False) -> pd.DataFrame:
+    """
+    Junta os arquivos de resultado das partições, restaurando a ordem das
+    linhas da entrada original (coluna 'input_row'). Linhas derivadas de uma
+    mesma linha de entrada mantêm sua ordem relativa.
+
+    Args:
+        paths: Arquivos CSV de resultado das partições.
+        keep_input_row: Se a coluna 'input_row' deve ser mantida.
+
+    Returns:
+        O data frame de resultados combinado.
+    """
+    frames = []
+    for path in paths:
+        frame = pd.read_csv(path)
+        if not INPUT_ROW_COL in frame.columns:
+            raise Exception("The file '" + path + "' has no '" + INPUT_ROW_COL
+                            + "' column. Was it produced with the 'shard' option?")
+        frames.append(frame)
+    if frames == []:
+        raise Exception("No shard output to be merged.")
+
+    # Each input row belongs to a single shard.
+    owners = {}
+    for path, frame in zip(paths, frames):
+        for row in frame[INPUT_ROW_COL].unique():
+            if owners.setdefault(row, path) != path:
+                raise Exception("Input row " + str(row) + " appears in '" + owners[row]
+                                + "' and in '" + path + "'. The shards overlap.")
+
+    # Empty shard outputs (see 'saveEmptyShard') have no rows to merge.
+    merged = pd.concat([f for f in frames if f.shape[0] > 0] or frames,
+                       ignore_index=True, sort=False)
+    merged = merged.sort_values(INPUT_ROW_COL, kind="mergesort").reset_index(drop=True)
+    if not keep_input_row:
+        merged = merged.drop(columns=INPUT_ROW_COL)
+    return merged
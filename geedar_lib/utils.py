@@ -1,9 +1,12 @@
-from fastkml import kml
-import pandas as pd
+import logging
 import ee
 
+from kmlreader import readKMLPolygons, cachedKMLPolygons
+
 ee.Initialize() #realmente necessário?
 
+logger = logging.getLogger("geedar")
+
 # Dictionary for the GEEDaR products.
 ## Product ID format: FP
 ### F: sensor "Family" (1 = MODIS, 2 = Sentinel, 3 = Landsat, 4 = VIIRS...)
@@ -444,6 +447,19 @@ PRODUCT_SPECS = {
 }
 AVAILABLE_PRODUCTS = [*PRODUCT_SPECS]
 
+# Products of the same sensor family (different platforms) whose processed
+# collections can be merged and reduced in a single request.
+PRODUCT_FAMILIES = {
+    "MODIS_GA": [101, 102],
+    "MODIS_GQ": [103, 104],
+    "MODIS_GA_GQ": [105, 106],
+    "MODIS_A1": [111, 112],
+    "MODIS_Q1": [113, 114],
+    "MODIS_A1_Q1": [115, 116],
+    "LANDSAT_C1": [301, 302, 303],
+    "LANDSAT_C2": [311, 312, 313, 314, 315]
+}
+
 
 # Image processing (atmospheric correction and unwanted pixels' exclusion) algorithms:
 IMG_PROC_ALGO_SPECS = {
@@ -692,68 +708,35 @@ def which(self):
 
 def writeToLogFile(lines, entryType, identifier):
     """
-    Essa função escreve um log file
+    Essa função escreve mensagens no log file (JSON lines) do GEEDaR
     """
-
-    log_file = "GEEDaR_log.txt"
+    level = logging.ERROR if str(entryType).lower() == "error" else logging.INFO
 
     if not isinstance(lines, list):
         lines = [lines]
-    try:
-        dateAndTime = pd.Timestamp.now().strftime("%Y-%m-%d %H:%M")
-        f = open(log_file, "a")
-        for line in lines:
-            f.write(dateAndTime + "," + str(entryType) + "," + str(identifier) + "," + line + "\n")
-        f.close()
-    except:
-        print("(!)")
-        print("The message(s) below could not be written to the log file (" + log_file + "):")
-        for line in lines:
-            print(line)
-        print("(.)")
+    for line in lines:
+        logger.log(level, line, extra={"entry_type": str(entryType), 
+                                       "identifier": str(identifier)})
 
-def polygonFromKML(kmlFile):
+def polygonFromKML(kmlFile:str, cache:bool = True) -> list:
     """
-    Essa função extrai um polygono (gee object) a partir de um kml
+    Extrai os polígonos (anéis externos e internos) de um arquivo KML ou KMZ,
+    no formato aceito por 'ee.Geometry.MultiPolygon'.
+
+    Args:
+        kmlFile: Caminho do arquivo KML ou KMZ.
+        cache: Se o cache em disco dos polígonos já lidos deve ser usado.
+    
+    Returns:
+        A lista de polígonos, ou uma lista vazia se o arquivo não puder ser lido.
     """
     try:
-        # Read the file as a string.
-        with open(kmlFile, 'rt', encoding="utf-8") as file:
-            doc = file.read()   
-        # Create the KML object to store the parsed result.
-        k = kml.KML()
-        # Read the KML string.
-        k.from_string(doc)
-        structDict = {0: list(k.features())}
-    except:
+        if cache:
+            return cachedKMLPolygons(kmlFile)
+        return readKMLPolygons(kmlFile)
+    except Exception as e:
+        logger.warning("(!) Could not read the file '" + kmlFile + "': " + str(e))
         return []
-    
-    # Search for polygons.
-    polygons = []
-    idList = [0]
-    curID = 0
-    lastID = 0
-    try:
-        while curID <= lastID:
-            curFeatures = structDict[curID]
-            for curFeature in curFeatures:
-                if "_features" in [*vars(curFeature)]:
-                    lastID = idList[-1] + 1
-                    idList.append(lastID)
-                    structDict[lastID] = list(curFeature.features())
-                elif "_geometry" in [*vars(curFeature)]:
-                    geom = curFeature.geometry
-                    if geom.geom_type == "Polygon":
-                        coords = [list(point[0:2]) for point in geom.exterior.coords]
-                        if coords == []:
-                            coords = [list(point[0:2]) for point in geom.interiors.coords]
-                        if coords != []:
-                            polygons.append([coords])
-            curID = curID + 1
-    except:
-        pass
-    
-    return polygons
 
 # Unfold the processing code into the IDs of the product and of the pixel selection and inversion algorithms.
 def unfoldProcessingCode(fullCode:int, silent:bool = False):
@@ -803,23 +786,23 @@ def unfoldProcessingCode(fullCode:int, silent:bool = False):
             code = int(strCode)
         except:
             if not silent:
-                print("(!)")
-                raise Exception("Unrecognized processing code: '" 
+                message = ("Unrecognized processing code: '" 
                     + strCode 
                     + "'. It should be an integer in the form PPPSSRRA '"
                     + "'(PPP is one of the product IDs listed by '-h:products';'"
                     + "' SS is the code of the pixel selection algorithm; RR, '"
-                    + "' the code of the processing algorithm; and A, the code of the reducer.)."
-                    )
+                    + "' the code of the processing algorithm; and A, the code of the reducer.).")
+                logger.error("(!) " + message)
+                raise Exception(message)
             else:
                 return failValues
         if code < 10000000:
             if not silent:
-                print("(!)")
-                raise Exception("Unrecognized processing code: '" 
+                message = ("Unrecognized processing code: '" 
                     + strCode 
-                    + "'."
-                    )
+                    + "'.")
+                logger.error("(!) " + message)
+                raise Exception(message)
             else:
                 return failValues
         
@@ -828,13 +811,13 @@ def unfoldProcessingCode(fullCode:int, silent:bool = False):
         productID = int(strCode[0:3])
         if not productID in AVAILABLE_PRODUCTS:
             if not silent:
-                print("(!)")
-                raise Exception("The product ID '" 
+                message = ("The product ID '" 
                     + str(productID) 
                     + "' derived from the processing code '" 
                     + strCode 
-                    + "' was not recognized."
-                    )
+                    + "' was not recognized.")
+                logger.error("(!) " + message)
+                raise Exception(message)
             else:
                 return failValues
         productIDs.append(productID)
@@ -842,13 +825,13 @@ def unfoldProcessingCode(fullCode:int, silent:bool = False):
         imgProcAlgo = int(strCode[3:5])
         if not imgProcAlgo in IMG_PROC_ALGO_LIST:
             if not silent:
-                print("(!)")
-                raise Exception("The image processing algorithm ID '" 
+                message = ("The image processing algorithm ID '" 
                     + str(imgProcAlgo) 
                     + "' derived from the processing code '" 
                     + strCode 
-                    + "' was not recognized."
-                    )
+                    + "' was not recognized.")
+                logger.error("(!) " + message)
+                raise Exception(message)
             else:
                 return failValues
         imgProcAlgos.append(imgProcAlgo)
@@ -856,13 +839,13 @@ def unfoldProcessingCode(fullCode:int, silent:bool = False):
         estimationAlgo = int(strCode[5:7])
         if not estimationAlgo in ESTIMATION_ALGO_LIST:
             if not silent:
-                print("(!)")
-                raise Exception("The estimation algorithm ID '" 
+                message = ("The estimation algorithm ID '" 
                     + str(estimationAlgo) 
                     + "' derived from the processing code '" 
                     + strCode 
-                    + "' was not recognized."
-                    )
+                    + "' was not recognized.")
+                logger.error("(!) " + message)
+                raise Exception(message)
             else:
                 return failValues
         estimationAlgos.append(estimationAlgo)       
@@ -870,14 +853,14 @@ def unfoldProcessingCode(fullCode:int, silent:bool = False):
 
         if not reducer in range(len(REDUCER_LIST)):
             if not silent:
-                print("(!)")
-                raise Exception("The reducer code '" 
+                message = ("The reducer code '" 
                     + str(reducer) 
                     + "' in the processing code '" 
                     + strCode 
                     + "' was not recognized. The reducer code must correspond to an index of the reducer list: " 
-                    + str(REDUCER_LIST) + "."
-                    )
+                    + str(REDUCER_LIST) + ".")
+                logger.error("(!) " + message)
+                raise Exception(message)
             
             else:
                 return failValues
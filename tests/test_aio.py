@@ -0,0 +1,81 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from geedar_lib.aio import AsyncRetriever
+
+
+def test_recuperacoes_simultaneas_limitadas():
+    lock = threading.Lock()
+    running = []
+    peak = []
+
+    def retrieve(inputDF, time_window, kwargs):
+        with lock:
+            running.append(inputDF)
+            peak.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.remove(inputDF)
+        return inputDF * 10
+
+    async def main():
+        async with AsyncRetriever(executor=ThreadPoolExecutor(max_workers=8),
+                                  max_running=2, retrieve=retrieve) as retriever:
+            return await asyncio.gather(*[retriever.retrieve(i) for i in range(6)])
+
+    assert asyncio.run(main()) == [0, 10, 20, 30, 40, 50]
+    assert max(peak) == 2
+
+
+def test_cancelar_recuperacao_em_espera():
+    started = []
+    release = threading.Event()
+
+    def retrieve(inputDF, time_window, kwargs):
+        started.append(inputDF)
+        release.wait(5)
+        return inputDF
+
+    async def main():
+        async with AsyncRetriever(executor=ThreadPoolExecutor(max_workers=2),
+                                  max_running=1, retrieve=retrieve) as retriever:
+            first = asyncio.ensure_future(retriever.retrieve("a"))
+            second = asyncio.ensure_future(retriever.retrieve("b"))
+            await asyncio.sleep(0.05)
+            second.cancel()
+            release.set()
+            assert await first == "a"
+            assert second.cancelled()
+
+    asyncio.run(main())
+    assert started == ["a"]
+
+
+class RecordingExecutor:
+    # Registra as chamadas em vez de executá-las.
+    def __init__(self):
+        self.calls = []
+
+    def submit(self, fn, *args):
+        self.calls.append((fn.__name__, args))
+        future = Future()
+        future.set_result([])
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def test_datas_disponiveis_recebem_o_local():
+    executor = RecordingExecutor()
+    site = {"id": "site_1", "lat": -15.8, "long": -47.9}
+
+    async def main():
+        async with AsyncRetriever(executor=executor) as retriever:
+            return await retriever.availableDates(site, 101, ["2020-01-01"], aoi_radius=500)
+
+    assert asyncio.run(main()) == []
+    assert executor.calls == [
+        ("availableDates", (site, 101, ["2020-01-01"], "radius", 500, ""))]
@@ -0,0 +1,60 @@
+import threading
+
+from geedar_lib.batch import LocalTaskService, runTasks
+
+
+def test_executar_tarefas_com_concorrencia_limitada():
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+
+    def runner(collection):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        try:
+            if collection == "falha":
+                raise RuntimeError("Computation timed out.")
+            return [{"site": collection, "img_date": "2020-01-01", "B1": 0.1}]
+        finally:
+            with lock:
+                running[0] -= 1
+
+    service = LocalTaskService(runner, workers=4)
+    jobs = [(i, "site_" + str(i), "job_" + str(i)) for i in range(6)]
+    jobs.append(("x", "falha", "job_x"))
+
+    done = []
+    results = runTasks(service, jobs, max_concurrent=2, poll_interval=0.01,
+                       on_done=done.append)
+    service.shutdown()
+
+    assert peak[0] <= 2
+    assert results["x"] is None
+    assert results[3] == [{"site": "site_3", "img_date": "2020-01-01", "B1": 0.1}]
+    assert len(results) == 7
+    assert sorted(map(str, done)) == sorted(map(str, results))
+
+
+def test_assets_de_execucoes_diferentes_nao_colidem(monkeypatch):
+    import ee
+    from geedar_lib.batch import EETaskService
+
+    class FakeTask:
+        def __init__(self, assetId):
+            self.id = assetId
+            self.assetId = assetId
+
+        def start(self):
+            pass
+
+    monkeypatch.setattr(ee.batch.Export.table, "toAsset",
+                        lambda collection, description, assetId: FakeTask(assetId))
+
+    first = EETaskService("projects/p/assets/geedar/")
+    second = EETaskService("projects/p/assets/geedar")
+
+    assets = [first.submit(None, "geedar_101_0"), second.submit(None, "geedar_101_0")]
+
+    assert assets[0] != assets[1]
+    assert all(a.startswith("projects/p/assets/geedar/geedar_101_0_") for a in assets)
@@ -0,0 +1,74 @@
+import numpy as np
+
+from geedar_lib.buffers import ResultBuffer, LongResultBuffer, LONG_COLUMNS
+
+
+def test_colunas_tipadas_com_valores_ausentes():
+    buffer = ResultBuffer(4)
+    buffer.set([0, 1], "10110001_sur_refl_b01_median", 0.1)
+    buffer.set([0], "10110001_qual_flag", 2)
+    buffer.set([1, 2], "10110001_img_time", "10:30")
+    buffer.set([3], "10110001_n_selected_pixels", None)
+
+    df = buffer.toDataFrame()
+
+    assert df.columns.tolist() == ["10110001_sur_refl_b01_median", "10110001_qual_flag",
+                                   "10110001_img_time", "10110001_n_selected_pixels"]
+    assert df["10110001_sur_refl_b01_median"].dtype == np.float64
+    assert str(df["10110001_qual_flag"].dtype) == "Int8"
+    assert df["10110001_qual_flag"].isna().tolist() == [False, True, True, True]
+    assert df["10110001_img_time"].tolist() == [None, "10:30", "10:30", None]
+    assert df["10110001_n_selected_pixels"].isna().all()
+
+
+def test_promover_coluna_quando_o_valor_nao_cabe():
+    buffer = ResultBuffer(3)
+    buffer.set([0], "qual_flag", 1)
+    buffer.set([1], "qual_flag", 1.5)
+    buffer.set([0], "red_median", 0.2)
+    buffer.set([2], "red_median", "n/a")
+
+    df = buffer.toDataFrame()
+
+    assert df["qual_flag"].dtype == np.float64
+    assert df["qual_flag"].tolist()[:2] == [1.0, 1.5] and np.isnan(df["qual_flag"][2])
+    assert df["red_median"].tolist()[0] == 0.2
+    assert df["red_median"].tolist()[2] == "n/a"
+
+
+def test_formato_longo_sem_valores_ausentes():
+    buffer = LongResultBuffer()
+    result = {"2020-01-01": {"sur_refl_b02_mean": 0.3, "sur_refl_b02_stdDev": None},
+              "2020-01-02": {"sur_refl_b02_mean": 0.4, "sur_refl_b02_stdDev": 0.01}}
+    buffer.append(["a", "b"], 10110003, result, ["mean", "stdDev"],
+                  [("sur_refl_b02", "NIR"), ("sur_refl_b02", "wl800")])
+
+    df = buffer.toDataFrame()
+
+    assert df.columns.tolist() == LONG_COLUMNS
+    assert len(buffer) == 12
+    assert set(df["variable"]) == {"NIR", "wl800"}
+    assert df[df["statistic"] == "stdDev"]["date"].unique().tolist() == ["2020-01-02"]
+
+
+def test_valores_escritos_sem_perda_de_precisao():
+    buffer = ResultBuffer(2)
+    buffer.set([0], "chla_surf_mean", 1234.5678)
+    buffer.set([1], "chla_surf_mean", 0.123456789)
+
+    csv = buffer.toDataFrame().to_csv(index=False)
+
+    assert csv.splitlines()[1:] == ["1234.5678", "0.123456789"]
+
+
+def test_precisao_simples_opcional():
+    buffer = ResultBuffer(1000, float_dtype="float32")
+    buffer.set(list(range(1000)), "chla_surf_mean", 0.1)
+    buffer.set([0], "sur_refl_b01_count", 12)
+
+    df = buffer.toDataFrame()
+
+    assert df["chla_surf_mean"].dtype == np.float32
+    assert df["chla_surf_mean"].nbytes == 4000
+    assert abs(df["chla_surf_mean"][0] - 0.1) < 1e-7
+    assert str(df["sur_refl_b01_count"].dtype) == "Int32"
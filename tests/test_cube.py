@@ -0,0 +1,44 @@
+import numpy as np
+
+from geedar_lib.cube import CubeWriter, openCube
+
+
+def test_serie_de_um_local_sem_carregar_o_cubo(tmp_path):
+    cube = CubeWriter(str(tmp_path), ["a", "b", "c"], [18264, 18262, 18263])
+    cube.append(["a", "c"], 10110001, {
+        "2020-01-01": {"sur_refl_b01_median": 0.1, "img_time": "10:30", "qual_flag": 2},
+        "2020-01-03": {"sur_refl_b01_median": 0.3, "qual_flag": None},
+        "2021-01-01": {"sur_refl_b01_median": 9.9}}, ["median"])
+    cube.append(["b"], 10210001, {"2020-01-02": {"chla_mean": 5.0}}, ["mean"],
+                bandRenaming=[("chla", "clorofila")])
+    cube.close()
+
+    reader = openCube(str(tmp_path))
+    assert reader.dates == ["2020-01-01", "2020-01-02", "2020-01-03"]
+    assert sorted(reader.variables) == ["10110001_qual_flag", "10110001_sur_refl_b01_median",
+                                        "10210001_clorofila_mean"]
+    series = reader.siteSeries("c", ["10110001_sur_refl_b01_median", "10110001_qual_flag"])
+    np.testing.assert_allclose(series["10110001_sur_refl_b01_median"], [0.1, np.nan, 0.3], rtol=1e-6)
+    assert series["10110001_qual_flag"].tolist()[0] == 2
+    assert np.isnan(reader.siteSeries("a")["10210001_clorofila_mean"]).all()
+    assert reader.siteSeries("b")["10210001_clorofila_mean"].tolist()[1] == 5.0
+    assert reader.read("10210001_clorofila_mean").shape == (3, 3)
+
+
+def test_somente_blocos_com_dados_sao_criados(tmp_path):
+    days = list(range(18262, 18262 + 10))
+    cube = CubeWriter(str(tmp_path), ["s" + str(i) for i in range(5)], days,
+                      chunk_sites=2, chunk_days=4)
+    cube.append(["s4"], 1, {"2020-01-09": {"B1_median": 0.9}}, ["median"])
+    cube.append(["s1"], 1, {"2020-01-04": {"B1_median": 0.4}, "2020-01-05": {"B1_median": 0.5}},
+                ["median"])
+    cube.close()
+
+    assert sorted(p.name for p in (tmp_path / "1_B1_median").iterdir()) == [
+        "0.0.npy", "0.1.npy", "2.2.npy"]
+    reader = openCube(str(tmp_path))
+    series = reader.siteSeries("s1")["1_B1_median"]
+    np.testing.assert_allclose(series.iloc[3:5], [0.4, 0.5], rtol=1e-6)
+    assert series.isna().sum() == 8
+    assert reader.siteSeries("s4")["1_B1_median"].tolist()[8] == np.float32(0.9)
+    assert reader.siteSeries("s0")["1_B1_median"].isna().all()
@@ -0,0 +1,40 @@
+from geedar_lib.diagnostics import (
+    tracedGetInfo, getRunReport, resetRunReport, enableRunReport)
+
+
+class FakeObject:
+    def serialize(self):
+        return ('{"result": "0", "values": {"0": {"functionInvocationValue": '
+                '{"functionName": "Collection.iterate", "arguments": {}}}}}')
+
+    def getInfo(self):
+        return [1, 2]
+
+
+def test_registrar_requisicao_no_relatorio():
+    resetRunReport()
+    enableRunReport()
+
+    try:
+        result = tracedGetInfo(FakeObject(), "reduction", product_id=101)
+    finally:
+        enableRunReport(False)
+
+    report = getRunReport()
+    assert result == [1, 2]
+    assert report["requests"][0]["loops"] == 1
+    assert report["summary"]["reduction"]["requests"] == 1
+
+
+class UnserializableObject(FakeObject):
+    def serialize(self):
+        raise AssertionError("serialize() não deveria ser chamado")
+
+
+def test_relatorio_desabilitado_nao_registra_nem_serializa():
+    resetRunReport()
+
+    result = tracedGetInfo(UnserializableObject(), "reduction")
+
+    assert result == [1, 2]
+    assert getRunReport()["requests"] == []
@@ -1,3 +1,11 @@
+import math
+import threading
+
+import ee
+import pandas as pd
+import pytest
+
+from geedar_lib import geedar
 from geedar_lib.geedar import (
     getCollection, getSpectralBands)
  
@@ -14,3 +22,81 @@ def test_retornar_regioes_espectrais():
     result = getSpectralBands(productID)
 
     assert result
+
+def test_reduzir_somente_propriedades_retorna_dicionario():
+    geedar.aoi = ee.Geometry.Point([-47.9, -15.8]).buffer(1000)
+    geedar.output_columns = ["img_time", "qual_flag"]
+    try:
+        geedar.imageProcessing(10, 101, ["2020-07-01", "2020-07-02"])
+        geedar.estimation([0], 101)
+        result = geedar.reduction(1, 101)
+    finally:
+        geedar.output_columns = None
+
+    assert isinstance(result, dict)
+    assert all(set(values) <= {"img_time", "qual_flag"} for values in result.values())
+
+
+def simularRecuperacao(monkeypatch, onReduction):
+    # Image processing, estimation and reduction replaced by local stand-ins;
+    # 'onReduction' is called once per site (AOI).
+    dates = []
+    def imageProcessing(imgProcAlgo, productID, dateList, clip = True):
+        geedar.bands = {"sur_refl_b01": "sur_refl_b01"}
+        dates[:] = dateList
+    def reduction(reducer, productID):
+        onReduction()
+        return {d: {"sur_refl_b01_median": 0.1} for d in dates}
+    monkeypatch.setattr(geedar, "bands", {})
+    monkeypatch.setattr(geedar, "imageProcessing", imageProcessing)
+    monkeypatch.setattr(geedar, "estimation", lambda *args, **kwargs: None)
+    monkeypatch.setattr(geedar, "reduction", reduction)
+    monkeypatch.setattr(geedar, "getAvailableDates", lambda productID, dateList: dateList)
+    monkeypatch.setattr(geedar, "tracedGetInfo", lambda *args, **kwargs: 10)
+    monkeypatch.setattr(geedar, "input_df", pd.DataFrame({
+        "date": ["2020-01-02"] * 3, "id": ["a", "b", "c"],
+        "lat": [-15.0, -16.0, -17.0], "long": [-47.0] * 3}))
+    monkeypatch.setattr(geedar, "time_window", 0)
+
+ARGUMENTOS = dict(running_mode=1, aoi_mode="radius", processing_codes=[10110001],
+                  product_ids=[101], img_proc_algos=[1], estimation_algos=[0], reducers=[1])
+
+def test_cancelar_recuperacao_fecha_cubo_progresso_e_contexto(monkeypatch, tmp_path):
+    # Mesmos módulos usados por 'geedar' (importados sem o pacote).
+    import logs
+    import progress
+    stopEvent = threading.Event()
+    calls = []
+    def onReduction():
+        calls.append(1)
+        stopEvent.set()
+    simularRecuperacao(monkeypatch, onReduction)
+    cubePath = str(tmp_path / "resultado.cube")
+
+    with pytest.raises(geedar.RetrievalCancelled):
+        geedar.specificDatesRetrieval(output_format="cube", cube_path=cubePath,
+                                      stop_event=stopEvent, **ARGUMENTOS)
+
+    assert len(calls) == 1
+    series = geedar.openCube(cubePath).siteSeries("a")["10110001_sur_refl_b01_median"]
+    assert series.tolist() == [pytest.approx(0.1)]
+    assert progress.getProgress()["state"] == "finished"
+    assert logs._context.get() == {}
+
+def test_encerrar_iterResults_aguarda_a_recuperacao(monkeypatch):
+    calls = []
+    simularRecuperacao(monkeypatch, lambda: calls.append(1))
+
+    for batch in geedar.iterResults(max_pending=1, **ARGUMENTOS):
+        break
+    callsAtClose = len(calls)
+
+    assert batch["site"].tolist() == ["a"]
+    assert not any(t.name == "geedar-retrieval" for t in threading.enumerate())
+    assert len(calls) == callsAtClose < 3
+
+def test_area_de_interesse_de_um_local():
+    geometry = geedar.siteGeometry({"id": "site_1", "lat": -15.8, "long": -47.9},
+                                   aoi_radius=100)
+
+    assert geometry.area(1).getInfo() == pytest.approx(math.pi * 100 ** 2, rel=0.02)
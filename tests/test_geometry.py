@@ -0,0 +1,46 @@
+import math
+
+from geedar_lib.geometry import simplifyPolygons, countVertices, ringArea, polygonsArea
+
+
+def circle(n, radius=0.05, lat=-15.0, long=-45.0):
+    ring = [[long + radius * math.cos(2 * math.pi * i / n),
+             lat + radius * math.sin(2 * math.pi * i / n)] for i in range(n)]
+    return ring + [ring[0]]
+
+
+def test_simplificar_reduz_vertices_e_preserva_area():
+    ring = circle(20000)
+    simplified = simplifyPolygons([[ring]], tolerance=7.5)
+
+    assert countVertices(simplified) < 500
+    ring_s = simplified[0][0]
+    assert ring_s[0] == ring_s[-1]
+    assert abs(ringArea(ring_s) - ringArea(ring)) / ringArea(ring) < 0.005
+
+
+def test_descartar_partes_pequenas():
+    big = circle(100)
+    hole = circle(10, radius=0.00001)
+    tiny = circle(10, radius=0.00001, long=-44.0)
+    simplified = simplifyPolygons([[big, hole], [tiny]], tolerance=30)
+
+    assert len(simplified) == 1
+    assert len(simplified[0]) == 1
+
+
+def test_chave_de_aoi_identica_para_poligonos_iguais():
+    from geedar_lib.geometry import polygonAOIKey, pointAOIKey
+
+    ring = circle(50)
+    same = [[p[0] + 1e-10, p[1]] for p in ring]
+    assert polygonAOIKey([[ring]]) == polygonAOIKey([[same]])
+    assert polygonAOIKey([[ring]]) != polygonAOIKey([[circle(50, lat=-15.1)]])
+    assert pointAOIKey(-15.8, -47.9, 1000) != pointAOIKey(-15.8, -47.9, 500)
+
+
+def test_area_desconta_buracos():
+    outer = circle(100)
+    hole = circle(100, radius=0.01)
+
+    assert polygonsArea([[outer, hole]]) == ringArea(outer) - ringArea(hole)
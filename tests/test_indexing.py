@@ -0,0 +1,47 @@
+from datetime import date
+
+import pandas as pd
+
+from geedar_lib.buffers import LongResultBuffer
+from geedar_lib.indexing import (toDayNumbers, dateToDay, dayToDate, siteCodes, groupRows,
+                                 groupSitesByDays, selectResultDays)
+
+
+def test_numeros_dos_dias_ida_e_volta():
+    days = toDayNumbers(pd.Series([date(2020, 2, 29), "2020-03-01", None]))
+
+    assert days.dtype == "int32"
+    assert days[:2].tolist() == [dateToDay("2020-02-29"), dateToDay("2020-03-01")]
+    assert dayToDate(days[1]) == "2020-03-01"
+    assert days[2] < 0
+
+
+def test_linhas_por_local_e_por_dia():
+    sites = pd.Series(["b", "a", "b", "a", "b"])
+    days = toDayNumbers(pd.Series(["2020-01-02", "2020-01-01", "2020-01-01",
+                                   "2020-01-01", "2020-01-02"]))
+    codes, names = siteCodes(sites)
+    siteRows = {names[c]: rows for c, rows in groupRows(codes, range(5)).items()}
+
+    assert [*siteRows] == ["b", "a"]
+    assert siteRows == {"b": [0, 2, 4], "a": [1, 3]}
+    dayRows = groupRows(days[siteRows["b"]], siteRows["b"])
+    assert [dayToDate(d) for d in dayRows] == ["2020-01-01", "2020-01-02"]
+    assert dayRows[dateToDay("2020-01-02")] == [0, 4]
+
+
+def test_locais_com_a_mesma_aoi_recebem_somente_as_suas_datas():
+    # 'a' e 'b' compartilham a área de interesse, mas pediram datas diferentes;
+    # a redução cobre a união das datas.
+    days = toDayNumbers(pd.Series(["2020-01-01", "2020-01-02", "2020-01-03"]))
+    siteRows = {"a": [0, 1], "b": [2]}
+    result = {"2020-01-01": {"red_median": 0.1}, "2020-01-02": {"red_median": 0.2},
+              "2020-01-03": {"red_median": 0.3}}
+
+    buffer = LongResultBuffer()
+    for sites, siteDays in groupSitesByDays(["a", "b"], siteRows, days):
+        buffer.append(sites, 10110001, selectResultDays(result, siteDays), ["median"])
+
+    df = buffer.toDataFrame()
+    assert df[["site", "date", "value"]].values.tolist() == [
+        ["a", "2020-01-01", 0.1], ["a", "2020-01-02", 0.2], ["b", "2020-01-03", 0.3]]
@@ -0,0 +1,81 @@
+import zipfile
+
+import pytest
+
+from geedar_lib import kmlreader
+from geedar_lib.kmlreader import readKMLPolygons, cachedKMLPolygons
+
+KML = """<?xml version="1.0" encoding="UTF-8"?>
+<kml xmlns="http://www.opengis.net/kml/2.2"><Document><Placemark>
+<MultiGeometry>
+<Polygon>
+<outerBoundaryIs><LinearRing><coordinates>
+0,0,0 4,0,0 4,4,0 0,4,0 0,0,0
+</coordinates></LinearRing></outerBoundaryIs>
+<innerBoundaryIs><LinearRing><coordinates>
+1,1,0 2,1,0 2,2,0 1,1,0
+</coordinates></LinearRing></innerBoundaryIs>
+</Polygon>
+<Polygon>
+<outerBoundaryIs><LinearRing><coordinates>
+10,10 11,10 11,11 10,10
+</coordinates></LinearRing></outerBoundaryIs>
+</Polygon>
+</MultiGeometry>
+</Placemark></Document></kml>
+"""
+
+
+def test_ler_multigeometria_com_aneis_internos(tmp_path):
+    kml_file = tmp_path / "site.kml"
+    kml_file.write_text(KML)
+
+    polygons = readKMLPolygons(str(kml_file))
+
+    assert len(polygons) == 2
+    assert len(polygons[0]) == 2
+    assert polygons[0][1][0] == [1.0, 1.0]
+    assert polygons[1] == [[[10.0, 10.0], [11.0, 10.0], [11.0, 11.0], [10.0, 10.0]]]
+
+
+def test_ler_kmz(tmp_path):
+    kmz_file = tmp_path / "site.kmz"
+    with zipfile.ZipFile(kmz_file, "w") as kmz:
+        kmz.writestr("doc.kml", KML)
+
+    polygons = readKMLPolygons(str(kmz_file))
+
+    assert len(polygons) == 2
+
+
+def test_usar_o_cache_enquanto_o_arquivo_nao_muda(tmp_path, monkeypatch):
+    kml_file = tmp_path / "site.kml"
+    kml_file.write_text(KML)
+    cache_dir = tmp_path / "cache"
+
+    first = cachedKMLPolygons(str(kml_file), str(cache_dir))
+
+    def notCalled(path):
+        raise AssertionError("The KML file was parsed again.")
+
+    monkeypatch.setattr(kmlreader, "readKMLPolygons", notCalled)
+    second = cachedKMLPolygons(str(kml_file), str(cache_dir))
+
+    assert first == second
+    assert len(list((cache_dir / "kml").iterdir())) == 1
+
+
+@pytest.mark.parametrize("content", [b"\x80\x05K", b"cbuiltins\nnao_existe\n.", b"N."])
+def test_cache_invalido_e_reconstruido(tmp_path, content):
+    kml_file = tmp_path / "site.kml"
+    kml_file.write_text(KML)
+    cache_dir = tmp_path / "cache"
+    cachedKMLPolygons(str(kml_file), str(cache_dir))
+    cache_file = next((cache_dir / "kml").iterdir())
+    cache_file.write_bytes(content)
+
+    polygons = cachedKMLPolygons(str(kml_file), str(cache_dir))
+
+    assert len(polygons) == 2
+    assert cachedKMLPolygons(str(kml_file), str(cache_dir)) == polygons
+    assert cache_file.read_bytes() != content
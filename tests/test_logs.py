@@ -0,0 +1,47 @@
+import json
+import logging
+
+from geedar_lib.logs import (
+    setupLogging, shutdownLogging, bindLogContext, resetLogContext)
+
+
+def test_escrever_registros_em_json_lines_com_contexto(tmp_path):
+    log_file = tmp_path / "GEEDaR_log.jsonl"
+    logger = setupLogging(log_file=str(log_file), console=False)
+    token = bindLogContext(site="Tres Marias", processing_code=10110001)
+
+    logger.info("Requesting data")
+    logger.error("Failed", extra={"demand_id": 7})
+    resetLogContext(token)
+    shutdownLogging()
+
+    records = [json.loads(line) for line in log_file.read_text().splitlines()]
+    assert records[0]["message"] == "Requesting data"
+    assert records[0]["site"] == "Tres Marias"
+    assert records[0]["processing_code"] == 10110001
+    assert records[1]["level"] == "ERROR"
+    assert records[1]["demand_id"] == 7
+
+
+def test_filtrar_registros_pelo_nivel(tmp_path):
+    log_file = tmp_path / "GEEDaR_log.jsonl"
+    logger = setupLogging(level="WARNING", log_file=str(log_file), console=False)
+
+    logger.info("ignored")
+    logger.warning("kept")
+    shutdownLogging()
+
+    lines = log_file.read_text().splitlines()
+    assert len(lines) == 1
+    logging.getLogger("geedar").setLevel(logging.INFO)
+
+
+def test_biblioteca_sem_configuracao_nao_cria_arquivo(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    shutdownLogging()
+    logger = logging.getLogger("geedar")
+
+    logger.warning("sem handlers configurados")
+
+    assert any(isinstance(h, logging.NullHandler) for h in logger.handlers)
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,17 @@
+from geedar_lib.metrics import (
+    incrementCounter, observe, resetMetrics, getMetrics, toPrometheus)
+
+
+def test_exportar_metricas_no_formato_prometheus():
+    resetMetrics()
+    incrementCounter("requests", caller="reduction")
+    incrementCounter("requests", caller="reduction")
+    observe("request_seconds", 0.3, caller="reduction")
+
+    text = toPrometheus()
+
+    assert getMetrics()["counters"]["requests"][0]["value"] == 2
+    assert 'geedar_requests_total{caller="reduction"} 2' in text
+    assert 'geedar_request_seconds_bucket{caller="reduction",le="0.25"} 0' in text
+    assert 'geedar_request_seconds_bucket{caller="reduction",le="0.5"} 1' in text
+    assert 'geedar_request_seconds_count{caller="reduction"} 1' in text
@@ -0,0 +1,120 @@
+from geedar_lib.planner import (planProcessing, splitResult, fusedStatistics,
+                                 selectStatistics, familyRuns, splitFamilyResult,
+                                 projectColumns, productColumns, estimateRetrieval)
+
+ESTIMATION_VARS = {0: [""], 2: ["SS_surf"], 3: ["SS_surf"], 12: ["chla_surf"]}
+
+
+def test_agrupar_por_produto_e_algoritmo_de_processamento():
+    plan = planProcessing(
+        [10109001, 10109121, 10109022, 30109001],
+        [101, 101, 101, 301], [9, 9, 9, 9], [0, 12, 2, 0], [1, 2, 2, 1],
+        ESTIMATION_VARS)
+
+    assert [g["codes"] for g in plan] == [[10109001, 10109121, 10109022], [30109001]]
+    assert plan[0]["estimation_algos"] == [0, 12, 2]
+    assert plan[0]["code_reducers"] == {10109001: 1, 10109121: 2, 10109022: 2}
+
+
+def test_separar_algoritmos_com_variaveis_de_mesmo_nome():
+    plan = planProcessing(
+        [10109021, 10109031], [101, 101], [9, 9], [2, 3], [1, 1], ESTIMATION_VARS)
+
+    assert [g["codes"] for g in plan] == [[10109021], [10109031]]
+
+
+def test_sem_compartilhamento():
+    plan = planProcessing(
+        [10109001, 10109121], [101, 101], [9, 9], [0, 12], [1, 1],
+        ESTIMATION_VARS, share=False)
+
+    assert len(plan) == 2
+
+
+def test_separar_resultado_por_codigo():
+    result = {"2020-01-01": {"chla_surf_mean": 3.0, "chla_surf_stdDev": 0.5,
+                             "sur_refl_b01_mean": 0.1}}
+
+    split = splitResult(result, ["chla_surf"], ["mean", "stdDev"])
+
+    assert split == {"2020-01-01": {"sur_refl_b01_mean": 0.1}}
+    assert "chla_surf_mean" in result["2020-01-01"]
+
+
+def test_selecionar_estatisticas_de_reducao_combinada():
+    stats = fusedStatistics([["median"], ["mean", "stdDev"], ["min", "max"]])
+    result = {"2020-01-01": {"red_median": 0.1, "red_mean": 0.2, "red_stdDev": 0.01,
+                             "red_min": 0.0, "red_max": 0.4, "n_selected_pixels": 12}}
+
+    selected = selectStatistics(result, ["red"], ["min", "max"], stats)
+
+    assert stats == ["median", "mean", "stdDev", "min", "max"]
+    assert selected == {"2020-01-01": {"red_min": 0.0, "red_max": 0.4, "n_selected_pixels": 12}}
+
+
+def test_juntar_produtos_da_mesma_familia():
+    plan = planProcessing(
+        [10109001, 10209001, 30109001, 30309001, 10201001],
+        [101, 102, 301, 303, 102], [9, 9, 9, 9, 1], [0, 0, 0, 0, 0], [1, 1, 1, 1, 1])
+
+    runs = familyRuns(plan, {"MODIS_GA": [101, 102], "LANDSAT_C1": [301, 302, 303]})
+
+    assert [[g["codes"] for g in run] for run in runs] == [
+        [[10109001], [10209001]], [[30109001], [30309001]], [[10201001]]]
+    assert len(familyRuns(plan)) == len(plan)
+
+
+def test_separar_resultado_da_familia_por_produto():
+    result = {"2020-01-01/301": {"B3_median": 0.1}, "2020-01-03/303": {"B4_median": 0.2}}
+
+    assert splitFamilyResult(result) == {301: {"2020-01-01": {"B3_median": 0.1}},
+                                         303: {"2020-01-03": {"B4_median": 0.2}}}
+
+
+def test_projetar_colunas_de_saida():
+    properties, bands = projectColumns(
+        ["10110001_sur_refl_b01_mean", "sur_refl_b02_stdDev", "img_time"],
+        ["img_time", "n_selected_pixels"], ["sur_refl_b01", "sur_refl_b02", "sur_refl_b03"],
+        ["mean", "stdDev"])
+
+    assert properties == ["img_time"]
+    assert bands == ["sur_refl_b01", "sur_refl_b02"]
+    assert projectColumns(None, ["img_time"], ["red"], ["median"]) == (["img_time"], ["red"])
+
+
+def test_projetar_colunas_com_nomes_comuns_das_bandas():
+    columns = productColumns(["red_median", "img_time"],
+                             [("sur_refl_b01", "red"), ("sur_refl_b02", "NIR")])
+
+    properties, bands = projectColumns(
+        columns, ["img_time", "qual_flag"], ["sur_refl_b01", "sur_refl_b02"], ["median"])
+
+    assert properties == ["img_time"]
+    assert bands == ["sur_refl_b01"]
+
+
+def test_projetar_somente_propriedades():
+    properties, bands = projectColumns(
+        ["img_time", "qual_flag"], ["img_time", "qual_flag", "n_selected_pixels"],
+        ["sur_refl_b01", "sur_refl_b02"], ["median"])
+
+    assert properties == ["img_time", "qual_flag"]
+    assert bands == []
+
+
+def test_estimar_recuperacao():
+    plan = planProcessing(
+        [10109001, 10109002, 20101001], [101, 101, 201], [9, 9, 1], [0, 0, 0], [1, 2, 1])
+    aois = [{"sites": 1, "dates": 10, "area": 1e6}, {"sites": 2, "dates": 4, "area": 1e6}]
+    args = ({101: 500, 201: 10}, {1: 500, 9: 40}, {1: [101], 9: [101]})
+
+    report = estimateRetrieval(aois, familyRuns(plan), *args)
+    batch = estimateRetrieval(aois, familyRuns(plan), *args,
+                              execution_mode="batch", sites_per_task=1)
+
+    assert report["sites"] == 3 and report["site_dates"] == 14
+    # Two reducers fused: availability, AOI size and one reduction per AOI.
+    assert report["runs"][0]["getinfo_calls"] == 6
+    assert not report["codes"][20101001]["applicable"]
+    assert report["runs"][1]["getinfo_calls"] == 0
+    assert batch["export_tasks"] == 4
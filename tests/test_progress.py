@@ -0,0 +1,33 @@
+import json
+
+from geedar_lib.progress import (startProgress, advanceProgress, trackGroup,
+                                 finishProgress, getProgress, writeProgress)
+
+
+def test_acompanhar_progresso_e_estimar_tempo_restante():
+    startProgress(4)
+
+    with trackGroup():
+        assert getProgress()["groups_in_flight"] == 1
+    advanceProgress()
+    progress = getProgress()
+
+    assert progress["sites_done"] == 1 and progress["groups_done"] == 1
+    assert progress["groups_in_flight"] == 0
+    assert progress["eta_seconds"] is not None
+
+    finishProgress()
+    assert getProgress()["eta_seconds"] == 0.0
+
+
+def test_salvar_arquivo_de_progresso(tmp_path):
+    startProgress(2)
+    advanceProgress(2)
+    path = str(tmp_path / "progress.json")
+
+    writeProgress(path)
+
+    with open(path) as f:
+        progress = json.load(f)
+    assert progress["state"] == "running"
+    assert progress["sites_done"] == progress["sites_total"] == 2
@@ -0,0 +1,51 @@
+import threading
+from time import monotonic, sleep
+
+from geedar_lib.ratelimit import RateLimiter
+
+
+def test_limitar_taxa_de_requisicoes():
+    limiter = RateLimiter(qps=20, concurrency=0)
+    start = monotonic()
+    for _ in range(30):
+        with limiter.limit():
+            pass
+    # 20 tokens available at once, then 10 more at 20 per second.
+    assert monotonic() - start >= 0.45
+
+
+def test_limitar_requisicoes_simultaneas():
+    limiter = RateLimiter(qps=0, concurrency=2)
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+
+    def request():
+        with limiter.limit():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            sleep(0.02)
+            with lock:
+                running[0] -= 1
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert peak[0] == 2
+
+
+def test_reduzir_taxa_ao_receber_429():
+    limiter = RateLimiter(qps=10, concurrency=0)
+    try:
+        with limiter.limit():
+            raise Exception("HTTP Error 429: Too Many Requests")
+    except Exception:
+        pass
+    assert limiter._rate == 5
+
+    with limiter.limit():
+        pass
+    assert 5 < limiter._rate < 10
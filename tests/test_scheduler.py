@@ -0,0 +1,27 @@
+from geedar_lib.scheduler import siteTileKey, wrs2PathRow, scheduleSites
+
+
+def test_path_row_wrs2_de_locais_conhecidos():
+    assert wrs2PathRow(-15.8, -47.9) == "221071"
+    assert wrs2PathRow(40.7, -74.0) == "014032"
+    assert wrs2PathRow(-33.9, 151.2) == "089084"
+
+
+def test_chave_do_tile_por_familia_de_produto():
+    assert siteTileKey(101, -15.8, -47.9) == "MODIS_h13v10"
+    assert siteTileKey(201, 40.7, -74.0) == "MGRS_18TWL"
+    assert siteTileKey(301, -15.8, -47.9) == "WRS2_221071"
+
+
+def test_agrupar_locais_intercalados_pelo_tile():
+    boxes = {}
+    for i in range(6):
+        # Alternate between two distant regions.
+        lat, long = (-15.8, -47.9) if i % 2 == 0 else (-3.1, -60.0)
+        boxes["site_" + str(i)] = (long + i * 0.001, lat, long + i * 0.001, lat)
+
+    schedule = scheduleSites(boxes, 301)
+
+    assert len(schedule) == 2
+    assert sorted(len(sites) for _, sites in schedule) == [3, 3]
+    assert sorted(s for _, sites in schedule for s in sites) == sorted(boxes)
@@ -0,0 +1,58 @@
+import json
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from geedar_lib.server import RetrievalService, makeServer
+
+
+def test_coalescer_unidades_identicas_em_execucao():
+    release = threading.Event()
+    calls = []
+
+    def retrieve(site, code, dates, aoi_mode, aoi_radius, input_dir):
+        calls.append((code, tuple(dates)))
+        release.wait(5)
+        return {d: {"B1_median": 0.1} for d in dates}
+
+    executor = ThreadPoolExecutor(max_workers=4)
+    service = RetrievalService(executor=executor, retrieve=retrieve)
+    rows = [{"date": "2020-01-01", "id": "a", "lat": -15.8, "long": -47.9},
+            {"date": "2020-01-02", "id": "a", "lat": -15.8, "long": -47.9}]
+    job1 = service.submit({"rows": rows, "processing_codes": [10110001]})
+    job2 = service.submit({"rows": rows[1:], "processing_codes": [10110001, 10210001]})
+
+    assert service.status(job1)["status"] == "running"
+    release.set()
+    executor.shutdown(wait=True)
+
+    assert len(calls) == 2
+    status2 = service.status(job2)
+    assert status2["status"] == "done"
+    assert status2["shared_units"] == 1
+    assert status2["result"][0]["10110001_B1_median"] == 0.1
+    assert status2["result"][0]["10210001_B1_median"] == 0.1
+    assert service.status(job1)["result"][0]["B1_median"] == 0.1
+
+
+def test_api_http():
+    executor = ThreadPoolExecutor(max_workers=1)
+    service = RetrievalService(
+        executor=executor, retrieve=lambda site, code, dates, *args: {})
+    server = makeServer(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = "http://127.0.0.1:" + str(server.server_address[1])
+    try:
+        request = urllib.request.Request(
+            url + "/jobs", method="POST", data=json.dumps(
+                {"rows": [{"date": "2020-01-01", "lat": 0, "long": 0}],
+                 "processing_codes": [10110001]}).encode("utf-8"))
+        with urllib.request.urlopen(request) as response:
+            jobID = json.load(response)["job_id"]
+        executor.shutdown(wait=True)
+        with urllib.request.urlopen(url + "/jobs/" + jobID) as response:
+            assert json.load(response)["status"] == "done"
+    finally:
+        server.shutdown()
+        server.server_close()
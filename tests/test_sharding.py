@@ -0,0 +1,63 @@
+import pandas as pd
+import pytest
+
+from geedar_lib.sharding import parseShard, selectShard, saveEmptyShard, mergeShards
+
+
+def entrada():
+    return pd.DataFrame({
+        "date": ["2020-01-" + str(i % 28 + 1).zfill(2) for i in range(50)],
+        "id": ["site_" + str(i % 11) for i in range(50)],
+    })
+
+
+def test_particoes_disjuntas_e_completas():
+    df = entrada()
+    shards = [selectShard(df, i, 4) for i in range(1, 5)]
+
+    rows = sorted(r for s in shards for r in s["input_row"])
+    assert rows == list(range(50))
+    sites = [set(s["id"]) for s in shards]
+    assert all(sites[a].isdisjoint(sites[b]) for a in range(4) for b in range(a + 1, 4))
+
+
+def test_juntar_na_ordem_original(tmp_path):
+    df = entrada()
+    paths = []
+    for i in range(1, 4):
+        shard = selectShard(df, i, 3)
+        shard["valor"] = shard["input_row"] * 10
+        path = tmp_path / ("shard" + str(i) + ".csv")
+        shard.to_csv(path, index=False)
+        paths.append(str(path))
+
+    merged = mergeShards(paths)
+
+    assert list(merged["valor"]) == [i * 10 for i in range(50)]
+    assert list(merged["id"]) == list(df["id"])
+    assert not "input_row" in merged.columns
+
+
+def test_particao_vazia_salva_e_juntada(tmp_path):
+    df = entrada().iloc[:3]
+    paths = []
+    for i in range(1, 9):
+        shard = selectShard(df, i, 8)
+        path = tmp_path / ("shard" + str(i) + ".csv")
+        if shard.shape[0] == 0:
+            saveEmptyShard(shard, path)
+        else:
+            shard["valor"] = shard["input_row"] * 10
+            shard.to_csv(path, index=False)
+        paths.append(str(path))
+
+    merged = mergeShards(paths)
+
+    assert any(pd.read_csv(p).shape[0] == 0 for p in paths)
+    assert list(merged["valor"]) == [0, 10, 20]
+    assert list(merged["id"]) == list(df["id"])
+
+
+def test_especificacao_invalida():
+    with pytest.raises(Exception):
+        parseShard("5/4")